@@ -1,30 +1,90 @@
 # app.py
 
 import os
+import time
 import logging
+from datetime import datetime
 
 from file_manager import (
     create_tmp_directory,
     create_transcripts_directory,
     create_raw_transcripts_directory,
-    get_unique_filename,
+    create_cache_directory,
+    create_job_directory,
+    clean_job_directory,
+    create_reports_directory,
+    reserve_unique_filename,
 )
-from audio_splitter import split_audio
-from audio_transcriber import transcribe_audio_files
-from transcript_processor import process_transcript
+from response_cache import ResponseCache, DEFAULT_CACHE_MAX_BYTES
+from job_manifest import JobManifest, MANIFEST_FILENAME
+from audio_splitter import iter_audio_chunks, collect_audio_chunks, DEFAULT_ENCODING, CUT_SEARCH_SECONDS
+from audio_transcriber import iter_transcriptions
+from transcript_processor import process_transcript, OUTPUT_TOKEN_RATIO
+from prompt_templates import DEFAULT_PROMPT
+from segment_store import SegmentStore, export_segments
+from rate_limiter import RateLimitedClient
+from metrics import Metrics
 
 class TranscriberApp:
-    def __init__(self, client):
+    def __init__(self, client, max_workers=1, fail_fast=True, gpt_workers=1, encoding=DEFAULT_ENCODING,
+                 cut_search_seconds=CUT_SEARCH_SECONDS, drop_silence_seconds=None,
+                 use_cache=True, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES, resume=False,
+                 api_executor=None, split_executor=None, output_ratio=OUTPUT_TOKEN_RATIO, stream=False, echo=False,
+                 export_formats=(), start_seconds=None, end_seconds=None, incremental=False, prometheus=False,
+                 in_memory=False, max_buffers=None, keep_chunks=False, cache=None, cleanup=True, prompt=DEFAULT_PROMPT):
+        # Requests are paced and retried by the client wrapper; wrap a plain client with the default policy
+        if not isinstance(client, RateLimitedClient):
+            client = RateLimitedClient(client)
         self.client = client
+        self.api_executor = api_executor  # Shared thread pool for API requests across files, if any
+        self.split_executor = split_executor  # Process pool to split audio in, if any
+        self.resume = resume
+        self.encoding = encoding
+        self.cut_search_seconds = cut_search_seconds
+        self.drop_silence_seconds = drop_silence_seconds
+        self.max_workers = max_workers
+        self.fail_fast = fail_fast
+        self.gpt_workers = gpt_workers
+        self.output_ratio = output_ratio
+        self.stream = stream
+        self.echo = echo
+        self.export_formats = tuple(export_formats)  # Timestamped formats to export; requests segment timestamps
+        self.start_seconds = start_seconds  # Time range of the audio to transcribe; None for the whole file
+        self.end_seconds = end_seconds
+        self.incremental = incremental  # Continue the previous run of a growing recording after its last chunk
+        self.prometheus = prometheus  # Also write each run's metrics in the Prometheus text format
+        self.in_memory = in_memory  # Encode chunks into memory and upload them from there instead of from files
+        self.max_buffers = max_buffers or 2 * max(1, max_workers)  # Chunks held in memory at once when in_memory
+        self.keep_chunks = keep_chunks  # Keep the chunk files of finished jobs instead of deleting them
+        self.cleanup = cleanup  # Process audio transcripts with GPT-4o-mini; False stops at the raw transcript
+        self.prompt = prompt  # Name of the prompt template, or path of a prompt file, for GPT-4o-mini
         self.tmp_dir = create_tmp_directory()
         self.transcripts_dir = create_transcripts_directory()
         self.raw_transcripts_dir = create_raw_transcripts_directory()
         logging.info(f"Temporary files will be stored in '{self.tmp_dir}'")
         logging.info(f"Transcripts will be saved in '{self.transcripts_dir}'")
         logging.info(f"Raw transcripts will be saved in '{self.raw_transcripts_dir}'")
+        self.cache = None
+        if use_cache and cache is not None:
+            self.cache = cache  # Shared with other apps, e.g. by the transcription service
+        elif use_cache:
+            cache_dir = create_cache_directory()
+            self.cache = ResponseCache(cache_dir, cache_max_bytes)
+            logging.info(f"API responses will be cached in '{cache_dir}'")
 
-    def process_transcript_file(self, transcript_path):
+    def process_transcript_file(self, transcript_path, metrics=None):
+        """
+        Processes an existing transcript file with GPT-4o-mini.
+
+        Parameters:
+        - transcript_path: Path to the transcript file.
+        - metrics: Optional Metrics to record the job in.
+
+        Returns:
+        - Dictionary with the job's status, output path and stage durations in seconds.
+        """
         logging.info(f"Transcript file path: '{transcript_path}'")
+        result = new_job_result(transcript_path)
 
         # Read the transcript
         try:
@@ -33,70 +93,349 @@ class TranscriberApp:
             logging.info(f"Using provided transcript from '{transcript_path}'")
         except Exception:
             logging.exception(f"Failed to read transcript file '{transcript_path}'.")
-            return
+            return finish_job_result(result)
 
         # Prepare the base output file name
         base_name = os.path.splitext(os.path.basename(transcript_path))[0]
+        job_dir = create_job_directory(self.tmp_dir, transcript_path)
+        manifest = JobManifest.open(job_dir, transcript_path, {}, self.resume)
 
-        # Determine the unique output file name
-        output_filename = get_unique_filename(base_name, ".txt", self.transcripts_dir)
-        output_file_path = os.path.join(self.transcripts_dir, output_filename)
+        # Determine the unique output file name, or reuse the one from the run being resumed
+        output_file_path = manifest.data["output_path"]
+        if not output_file_path:
+            output_filename = reserve_unique_filename(base_name, ".txt", self.transcripts_dir)
+            output_file_path = os.path.join(self.transcripts_dir, output_filename)
+            manifest.set_output_paths(output_path=output_file_path)
 
         # Process the transcript with GPT-4o-mini
+        stage_start = time.monotonic()
         try:
-            process_transcript(self.client, combined_transcript, output_file_path)
+            process_transcript(
+                self.client,
+                combined_transcript,
+                output_file_path,
+                max_workers=self.gpt_workers,
+                cache=self.cache,
+                completed=manifest.completed_processing(),
+                on_result=manifest.record_processing,
+                executor=self.api_executor,
+                output_ratio=self.output_ratio,
+                stream=self.stream,
+                echo=self.echo,
+                metrics=metrics,
+                prompt=self.prompt,
+            )
         except Exception:
             logging.exception("Failed to process transcript with GPT-4o-mini.")
-            return
+            return finish_job_result(result)
+        result["durations"]["process"] = time.monotonic() - stage_start
 
+        manifest.mark_complete()
         logging.info(f"Final transcript saved to '{output_file_path}'")
+        result["output_path"] = output_file_path
+        return finish_job_result(result, "succeeded")
+
+    def split_audio_file(self, audio_file_path, job_dir, manifest, metrics):
+        """
+        Splits the audio file into chunks in the job directory, recording each chunk in the manifest.
+
+        Chunks recorded by the run being resumed are reused, and splitting continues after the last of them.
+        Only the audio in the app's time range is split; the source is opened at
+        the start of the range rather than decoded from the beginning.
+        This is a generator, so each chunk can be transcribed while the next one is being encoded.
+        With `in_memory`, new chunks are encoded into memory and never written to
+        the job directory. They are split on this thread rather than in the
+        process pool, so that no more chunks are encoded than the transcription
+        takes in.
+
+        Yields:
+        - Paths to the audio chunks, or AudioChunks encoded in memory, in order.
+        """
+        chunks = manifest.split_chunks()
+        if manifest.data["split_complete"]:
+            logging.info(f"Reusing {len(chunks)} audio chunk(s) from the previous run.")
+        for chunk in chunks:
+            yield chunk["path"]
+        if manifest.data["split_complete"]:
+            return
+
+        args = (audio_file_path, job_dir, self.encoding)
+        kwargs = {
+            "cut_search_seconds": self.cut_search_seconds,
+            "drop_silence_seconds": self.drop_silence_seconds,
+            "start_frame": chunks[-1]["end_frame"] if chunks else 0,
+            "first_index": len(chunks),
+            "start_seconds": None if chunks else self.start_seconds,
+            "end_seconds": self.end_seconds,
+            "in_memory": self.in_memory,
+        }
+        time_chunks = True
+        if self.split_executor is not None and not self.in_memory:
+            # Splitting and encoding are CPU bound, so run them in the process pool
+            new_chunks = self.split_in_pool(args, kwargs, metrics)
+            time_chunks = False
+        else:
+            new_chunks = iter_audio_chunks(*args, **kwargs)
+
+        # Time each chunk from resuming the splitter until it yields the next one
+        chunk_start = time.monotonic()
+        for chunk in new_chunks:
+            if time_chunks:
+                metrics.record_span("split_chunk", chunk_start, time.monotonic() - chunk_start, chunk=chunk.index)
+            metrics.increment("audio_chunks")
+            metrics.increment("chunk_bytes", chunk.size)
+            metrics.increment("audio_seconds_split", (chunk.end_frame - chunk.start_frame) / chunk.frame_rate)
+            manifest.record_chunk(chunk)
+            yield chunk if self.in_memory else chunk.path
+            chunk = None  # Only the transcription keeps a chunk encoded in memory
+            chunk_start = time.monotonic()
+        manifest.mark_split_complete()
+
+    def split_in_pool(self, args, kwargs, metrics):
+        """
+        Splits the audio in the process pool one chunk per task, yielding each chunk as soon as its task completes.
 
-    def process_audio_file(self, audio_file_path):
+        Each task resumes the split at the end of the previous chunk. The next
+        task is submitted before a chunk is yielded, so the pool splits ahead
+        while the chunk is transcribed. The chunks are timed in the process that
+        split them.
+
+        Parameters:
+        - args, kwargs: Arguments for iter_audio_chunks, for the first chunk.
+        - metrics: Metrics collector for the split_chunk spans.
+
+        Yields:
+        - AudioChunk for each chunk, in order.
+        """
+        kwargs = dict(kwargs)
+        future = self.split_executor.submit(collect_audio_chunks, *args, max_chunks=1, **kwargs)
+        try:
+            while True:
+                timed_chunks = future.result()
+                split_end = time.monotonic()
+                if not timed_chunks:
+                    return
+                chunk, _, seconds = timed_chunks[0]
+                metrics.record_span("split_chunk", split_end - seconds, seconds, chunk=chunk.index)
+                kwargs.update(start_frame=chunk.end_frame, first_index=chunk.index + 1, start_seconds=None)
+                future = self.split_executor.submit(collect_audio_chunks, *args, max_chunks=1, **kwargs)
+                yield chunk
+        finally:
+            future.cancel()  # Nothing more is split once the consumer stops
+
+    def process_audio_file(self, audio_file_path, metrics=None):
+        """
+        Splits, transcribes and processes an audio file.
+
+        The three stages run as a pipeline: each chunk is uploaded for
+        transcription as soon as it has been encoded, and the transcript text is
+        chunked and sent to GPT-4o-mini as soon as enough of it has arrived.
+
+        In incremental mode, a recording that has grown since its last run is
+        only split and transcribed after the last chunk of that run. The raw and
+        processed transcripts are extended from the recorded results, so only the
+        new audio and the post-processing chunks it changes are sent to the API.
+
+        Parameters:
+        - audio_file_path: Path to the audio file.
+        - metrics: Optional Metrics to record the job in.
+
+        Returns:
+        - Dictionary with the job's status, output path, audio duration, and the
+          time in seconds from the start until each stage finished and until the
+          first processed text was written.
+        """
         logging.info(f"Audio file path: '{audio_file_path}'")
+        result = new_job_result(audio_file_path)
+        if metrics is None:
+            metrics = Metrics()
 
         # Prepare the base output file name
         base_name = os.path.splitext(os.path.basename(audio_file_path))[0]
+        job_dir = create_job_directory(self.tmp_dir, audio_file_path)
+        settings = {
+            "encoding": self.encoding,
+            "cut_search_seconds": self.cut_search_seconds,
+            "drop_silence_seconds": self.drop_silence_seconds,
+            "timestamps": bool(self.export_formats),
+            "start_seconds": self.start_seconds,
+            "end_seconds": self.end_seconds,
+        }
+        manifest = JobManifest.open(job_dir, audio_file_path, settings, self.resume or self.incremental, self.incremental)
 
-        # Split the audio file if necessary
-        try:
-            audio_chunks = split_audio(audio_file_path, self.tmp_dir)
-        except Exception:
-            logging.exception("Failed to split audio file.")
-            return
+        # Determine the unique output file names, or reuse the ones from the run being resumed
+        raw_transcript_path = manifest.data["raw_transcript_path"]
+        if not raw_transcript_path:
+            raw_transcript_filename = reserve_unique_filename(base_name, ".txt", self.raw_transcripts_dir)
+            raw_transcript_path = os.path.join(self.raw_transcripts_dir, raw_transcript_filename)
+        output_file_path = manifest.data["output_path"]
+        if not output_file_path and self.cleanup:
+            output_filename = reserve_unique_filename(base_name, ".txt", self.transcripts_dir)
+            output_file_path = os.path.join(self.transcripts_dir, output_filename)
+        manifest.set_output_paths(raw_transcript_path=raw_transcript_path, output_path=output_file_path)
 
-        # Transcribe audio files
-        try:
-            combined_transcript = transcribe_audio_files(self.client, audio_chunks, self.tmp_dir)
-        except Exception:
-            logging.exception("Failed to transcribe audio files.")
-            return
+        durations = result["durations"]
+        pipeline_start = time.monotonic()
 
-        # Save the combined raw transcript in raw_transcripts directory
-        raw_transcript_filename = get_unique_filename(base_name, ".txt", self.raw_transcripts_dir)
-        raw_transcript_path = os.path.join(self.raw_transcripts_dir, raw_transcript_filename)
-        try:
-            with open(raw_transcript_path, "w", encoding="utf-8") as f:
-                f.write(combined_transcript)
-            logging.info(f"Combined raw transcript saved to '{raw_transcript_path}'")
-        except Exception:
-            logging.exception(f"Failed to save combined raw transcript to '{raw_transcript_path}'.")
-            return
+        def timed(stage, items):
+            for item in items:
+                yield item
+            durations[stage] = time.monotonic() - pipeline_start
 
-        # Determine the unique output file name for processed transcript
-        output_filename = get_unique_filename(base_name, ".txt", self.transcripts_dir)
-        output_file_path = os.path.join(self.transcripts_dir, output_filename)
+        def on_processed(index, key, content):
+            durations.setdefault("first_output", time.monotonic() - pipeline_start)
+            manifest.record_processing(index, key, content)
 
-        # Process the transcript with GPT-4o-mini
+        # Segment times are relative to their chunk; rebase them onto the source audio
+        segments = SegmentStore()
+
+        def on_segments(index, chunk_segments):
+            chunk = manifest.data["chunks"][index]
+            segments.add_chunk(chunk_segments, chunk["start_frame"], chunk["frame_rate"], chunk["removed_silences"])
+
+        # Drop the chunks that must be split again before reading the recorded transcriptions,
+        # so a transcription is never reused for a chunk whose boundaries may move
+        manifest.split_chunks()
+
+        # Split, transcribe and process the audio, saving the raw transcript as it arrives
         try:
-            process_transcript(self.client, combined_transcript, output_file_path)
+            with open(raw_transcript_path, "w", encoding="utf-8") as raw_transcript_file:
+                audio_chunks = timed("split", self.split_audio_file(audio_file_path, job_dir, manifest, metrics))
+                transcript_pieces = timed("transcribe", iter_transcriptions(
+                    self.client,
+                    audio_chunks,
+                    job_dir,
+                    max_workers=self.max_workers,
+                    fail_fast=self.fail_fast,
+                    cache=self.cache,
+                    completed=manifest.completed_transcriptions(),
+                    on_result=manifest.record_transcription,
+                    executor=self.api_executor,
+                    timestamps=bool(self.export_formats),
+                    on_segments=on_segments,
+                    metrics=metrics,
+                    max_in_flight=self.max_buffers if self.in_memory else None,
+                ))
+                transcript_pieces = write_through(transcript_pieces, raw_transcript_file)
+                if not self.cleanup:
+                    # The raw transcript is cleaned up later, e.g. through the Batch API
+                    for _ in transcript_pieces:
+                        pass
+                else:
+                    process_transcript(
+                        self.client,
+                        transcript_pieces,
+                        output_file_path,
+                        max_workers=self.gpt_workers,
+                        cache=self.cache,
+                        completed=manifest.completed_processing(),
+                        on_result=on_processed,
+                        executor=self.api_executor,
+                        output_ratio=self.output_ratio,
+                        stream=self.stream,
+                        echo=self.echo,
+                        metrics=metrics,
+                        prompt=self.prompt,
+                    )
         except Exception:
-            logging.exception("Failed to process transcript with GPT-4o-mini.")
-            return
+            logging.exception("Failed to transcribe and process audio file.")
+            return finish_job_result(result)
+        if self.cleanup:
+            durations["process"] = time.monotonic() - pipeline_start
+        result["raw_transcript_path"] = raw_transcript_path
+        result["audio_seconds"] = sum(
+            (chunk["end_frame"] - chunk["start_frame"]) / chunk["frame_rate"] for chunk in manifest.data["chunks"]
+        )
+        logging.info(f"Combined raw transcript saved to '{raw_transcript_path}'")
 
-        logging.info(f"Final transcript saved to '{output_file_path}'")
+        if self.export_formats:
+            try:
+                for path in export_segments(segments, os.path.splitext(raw_transcript_path)[0], self.export_formats):
+                    logging.info(f"{len(segments)} timestamped segment(s) saved to '{path}'")
+            except Exception:
+                logging.exception("Failed to export the timestamped segments.")
+                return finish_job_result(result)
+
+        manifest.mark_complete()
+        if not self.keep_chunks:
+            # Every chunk is transcribed and recorded in the manifest, so the chunk files are no longer needed
+            try:
+                freed = clean_job_directory(job_dir, keep=(MANIFEST_FILENAME,))
+                logging.info(f"Deleted the job's temporary files from '{job_dir}' ({freed / (1024 * 1024):.2f} MB).")
+            except OSError:
+                logging.exception(f"Failed to delete the temporary files in '{job_dir}'.")
+        if self.cleanup:
+            logging.info(f"Final transcript saved to '{output_file_path}'")
+            result["output_path"] = output_file_path
+        return finish_job_result(result, "succeeded")
 
     def run(self, input_file_path, is_transcript):
+        metrics = Metrics()
         if is_transcript:
-            self.process_transcript_file(input_file_path)
+            result = self.process_transcript_file(input_file_path, metrics)
         else:
-            self.process_audio_file(input_file_path)
\ No newline at end of file
+            result = self.process_audio_file(input_file_path, metrics)
+        result["report_path"] = self.write_run_report(result, metrics)
+        return result
+
+    def write_run_report(self, result, metrics):
+        """
+        Saves the job result and its metrics as a JSON run report in the reports directory.
+
+        With `prometheus`, the counters and histograms are also written in the
+        Prometheus text format next to the report. A report that cannot be
+        written is logged and does not fail the job.
+
+        Returns:
+        - Path of the JSON report, or None if it could not be written.
+        """
+        try:
+            reports_dir = create_reports_directory()
+            base_name = os.path.splitext(os.path.basename(result["input"]))[0]
+            report_name = reserve_unique_filename(f"run_{base_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}", ".json", reports_dir)
+            report_path = os.path.join(reports_dir, report_name)
+
+            # Throughput is seconds of audio processed per second of wall-clock time
+            elapsed = result["durations"].get("total")
+            throughput = result["audio_seconds"] / elapsed if result["audio_seconds"] and elapsed else None
+            metrics.write_json(report_path, result=result, throughput=throughput)
+            logging.info(f"Run report saved to '{report_path}'")
+
+            if self.prometheus:
+                prometheus_path = os.path.splitext(report_path)[0] + ".prom"
+                metrics.write_prometheus(prometheus_path, {"input": base_name})
+                logging.info(f"Run metrics saved to '{prometheus_path}'")
+            return report_path
+        except Exception:
+            logging.exception("Failed to write the run report.")
+            return None
+
+def write_through(pieces, f):
+    """
+    Writes each text piece to an open file as it passes through, and yields it on.
+    """
+    for piece in pieces:
+        f.write(piece)
+        f.flush()
+        yield piece
+
+def new_job_result(input_file_path):
+    """
+    Returns the initial result dictionary of a job, before any stage has run.
+    """
+    return {
+        "input": input_file_path,
+        "status": "failed",
+        "output_path": None,
+        "audio_seconds": None,
+        "durations": {},
+        "started": time.monotonic(),
+    }
+
+def finish_job_result(result, status="failed"):
+    """
+    Sets the final status and total duration of a job result and returns it.
+    """
+    result["status"] = status
+    result["durations"]["total"] = time.monotonic() - result.pop("started")
+    return result
@@ -0,0 +1,142 @@
+# audio_silence.py
+
+import numpy as np
+
+SILENCE_WINDOW_SECONDS = 0.02  # Length of the windows the signal level is measured over
+SILENCE_THRESHOLD_DBFS = -40.0  # Windows quieter than this count as silence
+SILENCE_PADDING_SECONDS = 0.25  # Silence kept on each side of a removed stretch
+LEVEL_BLOCK_WINDOWS = 3000  # Windows converted to samples at a time, to bound memory use
+
+def pcm_to_samples(data, sample_width):
+    """
+    Converts raw little-endian PCM data into an array of signed integer samples.
+
+    Parameters:
+    - data: Raw PCM bytes.
+    - sample_width: Bytes per sample (1, 2, 3 or 4).
+
+    Returns:
+    - samples: NumPy array of samples, interleaved across channels.
+    - full_scale: The largest possible sample magnitude.
+    """
+    if sample_width == 1:
+        # 8-bit WAV is unsigned
+        return np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128, 128
+    if sample_width == 2:
+        return np.frombuffer(data, dtype='<i2'), 2 ** 15
+    if sample_width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        return (samples << 8) >> 8, 2 ** 23  # Sign-extend from 24 bits
+    if sample_width == 4:
+        return np.frombuffer(data, dtype='<i4'), 2 ** 31
+    raise ValueError(f"Unsupported sample width: {sample_width}")
+
+def window_levels(data, sample_width, channels, window_frames):
+    """
+    Computes the RMS level of each consecutive window of frames, in dBFS.
+
+    Parameters:
+    - data: Raw PCM frames.
+    - sample_width: Bytes per sample.
+    - channels: Number of interleaved channels.
+    - window_frames: Number of frames per window. A trailing partial window is ignored.
+
+    Returns:
+    - NumPy array with one level per window.
+    """
+    frame_width = sample_width * channels
+    window_bytes = window_frames * frame_width
+    n_windows = len(data) // window_bytes
+    levels = np.empty(n_windows, dtype=np.float64)
+
+    view = memoryview(data)
+    for first in range(0, n_windows, LEVEL_BLOCK_WINDOWS):
+        count = min(LEVEL_BLOCK_WINDOWS, n_windows - first)
+        block = view[first * window_bytes:(first + count) * window_bytes]
+        samples, full_scale = pcm_to_samples(block, sample_width)
+        squares = samples.astype(np.float64).reshape(count, window_frames * channels) ** 2
+        levels[first:first + count] = 10 * np.log10(squares.mean(axis=1) / full_scale ** 2 + 1e-12)
+    return levels
+
+def find_quietest_frame(data, sample_width, channels, frame_rate, search_seconds):
+    """
+    Finds the quietest point in the last `search_seconds` of the data, to use as a chunk boundary.
+
+    At most the second half of the data is searched, so a search window as long
+    as the data cannot cut a chunk off right after its start.
+
+    Parameters:
+    - data: Raw PCM frames.
+    - sample_width: Bytes per sample.
+    - channels: Number of interleaved channels.
+    - frame_rate: Frames per second.
+    - search_seconds: How far back from the end of the data to search, up to half its length.
+
+    Returns:
+    - Frame index at the centre of the quietest window, or the total frame count if
+      the data is too short to search.
+    """
+    frame_width = sample_width * channels
+    total_frames = len(data) // frame_width
+    window_frames = max(1, int(frame_rate * SILENCE_WINDOW_SECONDS))
+    search_frames = min(int(frame_rate * search_seconds), total_frames // 2)
+    search_start = total_frames - search_frames
+
+    levels = window_levels(memoryview(data)[search_start * frame_width:], sample_width, channels, window_frames)
+    if len(levels) == 0:
+        return total_frames
+
+    # Prefer the latest of equally quiet windows, to keep chunks as long as possible
+    quietest = len(levels) - 1 - int(np.argmin(levels[::-1]))
+    return search_start + quietest * window_frames + window_frames // 2
+
+def remove_long_silences(data, sample_width, channels, frame_rate, min_silence_seconds, threshold_dbfs=SILENCE_THRESHOLD_DBFS):
+    """
+    Removes stretches of silence longer than `min_silence_seconds`, keeping a short pad on each side.
+
+    Parameters:
+    - data: Raw PCM frames.
+    - sample_width: Bytes per sample.
+    - channels: Number of interleaved channels.
+    - frame_rate: Frames per second.
+    - min_silence_seconds: Minimum length of a silence to remove.
+    - threshold_dbfs: Level below which a window counts as silence.
+
+    Returns:
+    - trimmed: The PCM data with the long silences removed.
+    - removed: List of (start_frame, n_frames) tuples for the removed stretches,
+      in frames of the original data.
+    """
+    frame_width = sample_width * channels
+    window_frames = max(1, int(frame_rate * SILENCE_WINDOW_SECONDS))
+    min_windows = max(1, int(min_silence_seconds / SILENCE_WINDOW_SECONDS))
+    padding_frames = int(frame_rate * SILENCE_PADDING_SECONDS)
+
+    silent = window_levels(data, sample_width, channels, window_frames) < threshold_dbfs
+    if not silent.any():
+        return data, []
+
+    # Find the start and end windows of each run of silent windows
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    long_runs = (run_ends - run_starts) >= min_windows
+
+    removed = []
+    for start, end in zip(run_starts[long_runs], run_ends[long_runs]):
+        start_frame = int(start) * window_frames + padding_frames
+        end_frame = int(end) * window_frames - padding_frames
+        if end_frame > start_frame:
+            removed.append((start_frame, end_frame - start_frame))
+    if not removed:
+        return data, []
+
+    view = memoryview(data)
+    kept = []
+    position = 0
+    for start_frame, n_frames in removed:
+        kept.append(view[position * frame_width:start_frame * frame_width])
+        position = start_frame + n_frames
+    kept.append(view[position * frame_width:])
+    return b"".join(kept), removed
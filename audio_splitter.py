@@ -1,70 +1,400 @@
+import io
 import os
+import time
+import wave
 import logging
-from pydub import AudioSegment
+import subprocess
+from collections import namedtuple
 
-def split_audio(file_path, tmp_dir):
+from audio_stream import open_audio_stream, find_executable
+from audio_silence import find_quietest_frame, remove_long_silences
+
+# Define maximum chunk size with a safety margin (24 MB instead of 25 MB)
+MAX_CHUNK_SIZE_BYTES = 24 * 1024 * 1024  # 24 MB
+# Keep compressed chunks short enough for each request to finish in reasonable time
+MAX_CHUNK_SECONDS = 30 * 60
+# Chunk boundaries are moved back to the quietest point within this many seconds of the planned cut
+CUT_SEARCH_SECONDS = 10
+# A quiet point that would leave a shorter chunk than this is not used; Whisper rejects very short audio
+MIN_CHUNK_SECONDS = 1.0
+WAV_HEADER_SIZE = 44  # Size of the canonical PCM WAV header written by the `wave` module
+
+EncodingProfile = namedtuple('EncodingProfile', [
+    'extension',         # File extension of the encoded chunks
+    'container',         # ffmpeg output format, for encoding chunks into memory
+    'frame_rate',        # Output sample rate, or None to keep the source rate
+    'channels',          # Output channel count, or None to keep the source channels
+    'codec_args',        # ffmpeg codec arguments, or None to write PCM WAV directly
+    'bytes_per_second',  # Upper estimate of the encoded size per second, or None for exact PCM size
+    'header_size',       # Allowance for the container header and metadata, in bytes
+])
+
+# Whisper resamples everything to mono 16 kHz, so the compressed profiles encode at that rate.
+# Compressed estimates include a margin over the nominal bitrate for container overhead.
+ENCODING_PROFILES = {
+    'wav': EncodingProfile('.wav', 'wav', None, None, None, None, WAV_HEADER_SIZE),
+    'flac': EncodingProfile('.flac', 'flac', 16000, 1, ['-c:a', 'flac'], 16000 * 2 * 1.05, 8192),
+    'opus': EncodingProfile('.webm', 'webm', 16000, 1, ['-c:a', 'libopus', '-b:a', '24k', '-vbr', 'constrained', '-application', 'voip'], 24000 / 8 * 1.25, 16384),
+    'mp3': EncodingProfile('.mp3', 'mp3', 16000, 1, ['-c:a', 'libmp3lame', '-b:a', '32k'], 32000 / 8 * 1.1, 16384),
+}
+DEFAULT_ENCODING = 'flac'
+
+# ffmpeg raw PCM formats by sample width in bytes
+PCM_FORMATS = {1: 'u8', 2: 's16le', 3: 's24le', 4: 's32le'}
+
+PlannedChunk = namedtuple('PlannedChunk', ['start_frame', 'end_frame', 'predicted_size'])
+
+class AudioChunk(namedtuple('AudioChunk', ['index', 'path', 'start_frame', 'end_frame', 'frame_rate', 'removed_silences', 'data'],
+                            defaults=(None,))):
+    """
+    A chunk of the source audio written to disk, with its position in the source.
+
+    `removed_silences` holds (start_frame, n_frames) tuples, relative to
+    `start_frame`, for any silences removed from the chunk before it was written.
+    A chunk encoded in memory holds its encoded bytes in `data` instead, and
+    nothing is written to `path`; the path only names the chunk.
+    """
+    __slots__ = ()
+
+    @property
+    def size(self):
+        """
+        Size of the encoded chunk in bytes.
+        """
+        return len(self.data) if self.data is not None else os.path.getsize(self.path)
+
+    @property
+    def seconds(self):
+        """
+        Duration of the encoded chunk in seconds, without the removed silences.
+        """
+        removed = sum(n_frames for _, n_frames in self.removed_silences)
+        return (self.end_frame - self.start_frame - removed) / self.frame_rate
+
+    @property
+    def start_ms(self):
+        return self.start_frame * 1000 // self.frame_rate
+
+    @property
+    def end_ms(self):
+        return self.end_frame * 1000 // self.frame_rate
+
+def split_audio(file_path, tmp_dir, encoding=DEFAULT_ENCODING, cut_search_seconds=CUT_SEARCH_SECONDS, drop_silence_seconds=None):
     """
     Splits the audio file into chunks less than 24 MB and saves them in the tmp directory.
 
     Parameters:
     - file_path: Path to the audio file.
     - tmp_dir: Directory to save the split audio chunks.
+    - encoding: Name of the encoding profile in ENCODING_PROFILES used for the chunks.
+    - cut_search_seconds: How far before each planned cut to look for a quiet boundary.
+    - drop_silence_seconds: If set, silences longer than this are removed before upload.
 
     Returns:
-    - chunks: List of paths to the audio files (original file or split chunks).
+    - chunks: List of paths to the chunk files, in order. Even audio under the size limit is written as a chunk.
+    """
+    chunks = iter_audio_chunks(file_path, tmp_dir, encoding, cut_search_seconds, drop_silence_seconds)
+    return [chunk.path for chunk in chunks]
+
+def collect_audio_chunks(*args, max_chunks=None, **kwargs):
+    """
+    Runs iter_audio_chunks and returns the AudioChunks with the time each took to split.
+
+    This is a module-level function so that splitting can run in a process pool.
+    The chunks only reach the caller once the call returns, so each one is
+    timed here, in the process that split it.
+
+    Parameters:
+    - max_chunks: If set, splitting stops after this many chunks; resume from the last chunk's `end_frame`.
+    - Any other arguments are passed to iter_audio_chunks.
+
+    Returns:
+    - List of (AudioChunk, seconds from the start of the split until the chunk was started, seconds spent on the chunk).
+      An empty list means that there is no audio left to split.
+    """
+    timed_chunks = []
+    chunks = iter_audio_chunks(*args, **kwargs)
+    try:
+        split_start = chunk_start = time.monotonic()
+        for chunk in chunks:
+            now = time.monotonic()
+            timed_chunks.append((chunk, chunk_start - split_start, now - chunk_start))
+            chunk_start = now
+            if max_chunks is not None and len(timed_chunks) >= max_chunks:
+                break
+    finally:
+        chunks.close()  # Closes the source now rather than when the generator is collected
+    return timed_chunks
+
+def plan_chunks(total_frames, frame_rate, bytes_per_second, header_size=WAV_HEADER_SIZE,
+                max_chunk_size_bytes=MAX_CHUNK_SIZE_BYTES, max_chunk_seconds=MAX_CHUNK_SECONDS):
+    """
+    Computes the frame ranges of every chunk up front so that each one fits under the size limit.
+
+    The size of a chunk is predicted as `header_size` plus its duration times
+    `bytes_per_second`. For PCM WAV output this is exact; for compressed output
+    `bytes_per_second` is an estimate from the target bitrate. The audio is
+    divided into equally long chunks rather than maximal chunks and a short
+    remainder.
+
+    Parameters:
+    - total_frames: Number of frames in the source audio.
+    - frame_rate: Frames per second of the source audio.
+    - bytes_per_second: Size of one second of encoded output, in bytes.
+    - header_size: Fixed size of the container header, in bytes.
+    - max_chunk_size_bytes: Maximum size of an encoded chunk, in bytes.
+    - max_chunk_seconds: Maximum duration of a chunk, in seconds.
+
+    Returns:
+    - List of PlannedChunk tuples, in order.
+    """
+    max_chunk_frames = get_max_chunk_frames(frame_rate, bytes_per_second, header_size, max_chunk_size_bytes, max_chunk_seconds)
+
+    if total_frames <= 0:
+        # Unknown length: plan a single full-size chunk and let the reader extend it
+        total_frames = max_chunk_frames
+
+    chunk_count = -(-total_frames // max_chunk_frames)
+    chunk_frames = -(-total_frames // chunk_count)
+
+    plan = []
+    for start_frame in range(0, total_frames, chunk_frames):
+        end_frame = min(start_frame + chunk_frames, total_frames)
+        predicted_size = header_size + int(-(-(end_frame - start_frame) * bytes_per_second // frame_rate))
+        plan.append(PlannedChunk(start_frame, end_frame, predicted_size))
+    return plan
+
+def get_max_chunk_frames(frame_rate, bytes_per_second, header_size=WAV_HEADER_SIZE,
+                         max_chunk_size_bytes=MAX_CHUNK_SIZE_BYTES, max_chunk_seconds=MAX_CHUNK_SECONDS):
+    """
+    Returns the largest number of frames whose encoded chunk fits under the size and duration limits.
+    """
+    max_chunk_frames = int((max_chunk_size_bytes - header_size) * frame_rate // bytes_per_second)
+    max_chunk_frames = min(max_chunk_frames, int(max_chunk_seconds * frame_rate))
+    if max_chunk_frames < frame_rate:
+        raise ValueError("Cannot split audio into chunks of at least one second under the size limit.")
+    return max_chunk_frames
+
+def log_chunk_plan(plan, frame_rate, first_index=0):
+    """
+    Logs the chunk plan: the number of chunks and each chunk's duration and predicted size.
+    """
+    total_size = sum(chunk.predicted_size for chunk in plan)
+    logging.info(f"Chunk plan: {len(plan)} chunk(s), {total_size / (1024 * 1024):.2f} MB in total")
+    for index, chunk in enumerate(plan, start=first_index + 1):
+        duration = (chunk.end_frame - chunk.start_frame) / frame_rate
+        logging.info(f"  Part {index}: {chunk.start_frame / frame_rate / 60:.2f}-{chunk.end_frame / frame_rate / 60:.2f} min "
+                     f"({duration / 60:.2f} min, ~{chunk.predicted_size / (1024 * 1024):.2f} MB)")
+
+def iter_audio_chunks(file_path, tmp_dir, encoding='wav', cut_search_seconds=CUT_SEARCH_SECONDS, drop_silence_seconds=None,
+                      start_frame=0, first_index=0, start_seconds=None, end_seconds=None, in_memory=False):
+    """
+    Decodes the audio file incrementally and writes it out as chunks less than 24 MB.
+
+    The chunk boundaries are planned before any chunk is written, and each chunk
+    is written exactly once. Each boundary is moved back to the quietest point in
+    the `cut_search_seconds` before the planned cut, so that words are not split
+    between chunks. Only one chunk of audio is held in memory at a time, so peak
+    memory is bounded by the chunk size rather than the length of the recording.
+
+    Parameters:
+    - file_path: Path to the audio file.
+    - tmp_dir: Directory to save the split audio chunks.
+    - encoding: Name of the encoding profile in ENCODING_PROFILES used for the chunks.
+    - cut_search_seconds: How far before each planned cut to look for a quiet boundary. 0 cuts at the planned frame.
+    - drop_silence_seconds: If set, silences longer than this are removed from the chunks before they are written.
+    - start_frame: Frame of the source to start splitting from, to resume an interrupted split.
+    - first_index: Index of the first chunk produced, to resume an interrupted split.
+    - start_seconds: Alternatively to `start_frame`, the time in seconds to start splitting from.
+      The source is opened at that point, so the audio before it is never decoded.
+    - end_seconds: If set, splitting stops at this time in seconds.
+    - in_memory: If True, each chunk is encoded into memory and returned in its `data` instead of being
+      written to `tmp_dir`. The generator only encodes the next chunk when it is resumed, so the consumer
+      bounds how many chunks are held in memory at once.
+
+    Yields:
+    - AudioChunk for each chunk, in order, as soon as it has been written.
     """
     try:
-        # Define maximum chunk size with a safety margin (24 MB instead of 25 MB)
-        max_chunk_size_bytes = 24 * 1024 * 1024  # 24 MB
-
-        # Load the audio file
-        audio = AudioSegment.from_file(file_path)
-        total_length_ms = len(audio)
-        logging.info(f"Total audio length: {total_length_ms / 60000:.2f} minutes")
-
-        # Get audio properties
-        frame_rate = audio.frame_rate
-        sample_width = audio.sample_width  # in bytes
-        channels = audio.channels
-        frame_width = audio.frame_width  # sample_width * channels
-        bytes_per_second = frame_rate * frame_width
-        logging.info(f"Audio properties - Frame rate: {frame_rate}, Sample width: {sample_width}, Channels: {channels}")
-
-        # Calculate maximum chunk length to be under 24 MB
-        max_chunk_length_sec = max_chunk_size_bytes / bytes_per_second
-        max_chunk_length_ms = int(max_chunk_length_sec * 1000)
-        logging.info(f"Maximum chunk length: {max_chunk_length_ms / 60000:.2f} minutes")
-
-        base_name = os.path.splitext(os.path.basename(file_path))[0]
-        chunks = []
-        i = 0
-        part_num = 1
-        while i < total_length_ms:
-            chunk_length_ms = max_chunk_length_ms
+        profile = ENCODING_PROFILES[encoding]
+
+        # Sources decoded by ffmpeg are resampled to the profile's rate and channels while decoding
+        with open_audio_stream(file_path, profile.frame_rate, profile.channels, start_frame, start_seconds) as stream:
+            logging.info(f"Total audio length: {stream.duration_seconds / 60:.2f} minutes")
+
+            # Get audio properties
+            frame_rate = stream.frame_rate
+            frame_width = stream.frame_width  # sample_width * channels
+            start_frame = stream.start_frame
+            logging.info(f"Audio properties - Frame rate: {frame_rate}, Sample width: {stream.sample_width}, Channels: {stream.channels}")
+
+            # Only split up to the end of the requested time range
+            total_frames = stream.total_frames
+            end_frame = None
+            if end_seconds is not None:
+                end_frame = int(end_seconds * frame_rate)
+                if end_frame <= start_frame:
+                    if start_seconds is None and start_frame:
+                        return  # A resumed split that had already reached the end of the range
+                    raise ValueError(f"The end of the time range ({end_seconds}s) is not after its start ({start_frame / frame_rate}s).")
+                total_frames = min(total_frames, end_frame) if total_frames > 0 else end_frame
+
+            # Plan the chunks so that each encoded file stays under 24 MB
+            bytes_per_second = profile.bytes_per_second or frame_rate * frame_width
+            logging.info(f"Encoding chunks as '{encoding}' (~{bytes_per_second / 1024:.1f} KB per second of audio)")
+            plan = plan_chunks(total_frames - start_frame, frame_rate, bytes_per_second, profile.header_size)
+            if start_frame:
+                logging.info(f"Starting the split at {start_frame / frame_rate / 60:.2f} minutes.")
+                plan = [PlannedChunk(start + start_frame, end + start_frame, size) for start, end, size in plan]
+            log_chunk_plan(plan, frame_rate, first_index)
+            max_chunk_frames = get_max_chunk_frames(frame_rate, bytes_per_second, profile.header_size)
+
+            base_name = os.path.splitext(os.path.basename(file_path))[0]
+            buffer = b""  # Frames read past the previous boundary
+            part_num = 1
             while True:
-                chunk = audio[i:i+chunk_length_ms]
-                # Export the chunk to a temporary file to get its actual size
-                chunk_filename = f"{base_name}_part{part_num}.wav"
-                chunk_path = os.path.join(tmp_dir, chunk_filename)
-                chunk.export(chunk_path, format='wav')
-
-                chunk_size = os.path.getsize(chunk_path)
-                if chunk_size > max_chunk_size_bytes:
-                    # Reduce the chunk length by 10% and retry
-                    logging.warning(f"Chunk '{chunk_filename}' is too large ({chunk_size / (1024 * 1024):.2f} MB). Reducing chunk length.")
-                    os.remove(chunk_path)
-                    chunk_length_ms = int(chunk_length_ms * 0.9)
-                    if chunk_length_ms <= 1000:  # Prevent infinite loop
-                        logging.error("Cannot split audio into small enough chunks under the size limit.")
-                        raise ValueError("Chunk size exceeds limit even after reduction.")
+                # Read up to the planned end of this chunk, never past the size limit
+                if part_num <= len(plan):
+                    target_end = plan[part_num - 1].end_frame
                 else:
-                    logging.info(f"Exported '{chunk_filename}' ({chunk_size / (1024 * 1024):.2f} MB)")
-                    chunks.append(chunk_path)
+                    target_end = start_frame + max_chunk_frames
+                chunk_end = min(max(target_end, start_frame + 1), start_frame + max_chunk_frames)
+                if end_frame is not None:
+                    chunk_end = min(chunk_end, end_frame)
+                want_frames = chunk_end - start_frame - len(buffer) // frame_width
+                data = stream.read(want_frames) if want_frames > 0 else b""
+                at_end = len(data) < want_frames * frame_width or chunk_end == end_frame
+                buffer += data
+                if not buffer:
                     break
-            i += chunk_length_ms
-            part_num += 1
-        return chunks
+                if part_num > len(plan):
+                    # The stream runs past the plan, either because boundaries moved back or
+                    # because a compressed source decodes to more frames than probed
+                    logging.info(f"Audio continues past the planned {len(plan)} chunk(s). Adding part {first_index + part_num}.")
+
+                # Cut at the quietest point before the planned boundary, unless this is the end of the audio
+                is_last = at_end or (part_num >= len(plan) and chunk_end >= plan[-1].end_frame)
+                n_frames = len(buffer) // frame_width
+                if cut_search_seconds and not is_last:
+                    # Neither this chunk nor the audio left after it may end up shorter than the minimum
+                    min_frames = int(MIN_CHUNK_SECONDS * frame_rate)
+                    search_frames = n_frames
+                    if total_frames > 0:
+                        search_frames = min(search_frames, total_frames - start_frame - min_frames)
+                    quiet_frame = find_quietest_frame(memoryview(buffer)[:max(0, search_frames) * frame_width], stream.sample_width,
+                                                      stream.channels, frame_rate, cut_search_seconds)
+                    if quiet_frame >= min_frames:
+                        n_frames = quiet_frame
+                chunk_data, buffer = buffer[:n_frames * frame_width], buffer[n_frames * frame_width:]
+
+                removed = []
+                if drop_silence_seconds:
+                    chunk_data, removed = remove_long_silences(chunk_data, stream.sample_width, stream.channels, frame_rate, drop_silence_seconds)
+                    if removed:
+                        removed_seconds = sum(length for _, length in removed) / frame_rate
+                        logging.info(f"Removed {len(removed)} silence(s) totalling {removed_seconds:.1f}s from part {first_index + part_num}")
+
+                chunk_index = first_index + part_num - 1
+                chunk_filename = f"{base_name}_part{chunk_index + 1}{profile.extension}"
+                chunk_path = os.path.join(tmp_dir, chunk_filename)
+                encoded = None
+                if in_memory:
+                    encoded = encode_chunk(chunk_data, stream, profile)
+                    chunk_size = len(encoded)
+                else:
+                    write_chunk(chunk_path, chunk_data, stream, profile)
+                    chunk_size = os.path.getsize(chunk_path)
+                del chunk_data
+
+                if chunk_size > MAX_CHUNK_SIZE_BYTES:
+                    raise ValueError(f"Chunk '{chunk_filename}' is {chunk_size / (1024 * 1024):.2f} MB, over the size limit.")
+                logging.info(f"{'Encoded' if in_memory else 'Exported'} '{chunk_filename}' "
+                             f"({chunk_size / (1024 * 1024):.2f} MB, {n_frames / frame_rate / 60:.2f} min)")
+                yield AudioChunk(chunk_index, chunk_path, start_frame, start_frame + n_frames, frame_rate, tuple(removed), encoded)
+                encoded = None  # Drop this generator's reference, so the consumer alone decides how long the chunk is kept
+
+                start_frame += n_frames
+                part_num += 1
 
     except Exception as e:
         logging.exception("An error occurred while splitting the audio file.")
-        raise
\ No newline at end of file
+        raise
+
+def write_chunk(chunk_path, data, stream, profile):
+    """
+    Encodes raw PCM frames from `stream` into a chunk file using the given encoding profile.
+
+    PCM WAV output in the source format is written directly with the `wave`
+    module; any other output is encoded by piping the frames through ffmpeg.
+
+    Parameters:
+    - chunk_path: Path of the chunk file to write.
+    - data: Raw PCM frames in the stream's format.
+    - stream: The audio stream the frames were read from.
+    - profile: EncodingProfile for the output.
+    """
+    frame_rate = profile.frame_rate or stream.frame_rate
+    channels = profile.channels or stream.channels
+    if profile.codec_args is None and frame_rate == stream.frame_rate and channels == stream.channels:
+        with wave.open(chunk_path, 'wb') as chunk_file:
+            chunk_file.setnchannels(stream.channels)
+            chunk_file.setsampwidth(stream.sample_width)
+            chunk_file.setframerate(stream.frame_rate)
+            chunk_file.writeframes(data)
+        return
+
+    command = [
+        find_executable("ffmpeg"), "-v", "error", "-y",
+        "-f", PCM_FORMATS[stream.sample_width], "-ar", str(stream.frame_rate), "-ac", str(stream.channels),
+        "-i", "pipe:0",
+        "-ar", str(frame_rate), "-ac", str(channels),
+        *(profile.codec_args or ["-c:a", "pcm_s16le"]),
+        chunk_path,
+    ]
+    result = subprocess.run(command, input=data, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        error = result.stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"ffmpeg failed to encode '{chunk_path}' (exit code {result.returncode}): {error}")
+
+def encode_chunk(data, stream, profile):
+    """
+    Encodes raw PCM frames from `stream` into memory using the given encoding profile.
+
+    PCM WAV output in the source format is written with the `wave` module; any
+    other output is encoded by piping the frames through ffmpeg and reading the
+    result from its standard output. ffmpeg cannot seek back in a pipe, so
+    containers that record their length in the header (e.g. the FLAC stream
+    info) leave it unset; the audio itself is the same.
+
+    Parameters:
+    - data: Raw PCM frames in the stream's format.
+    - stream: The audio stream the frames were read from.
+    - profile: EncodingProfile for the output.
+
+    Returns:
+    - The encoded chunk as bytes.
+    """
+    frame_rate = profile.frame_rate or stream.frame_rate
+    channels = profile.channels or stream.channels
+    if profile.codec_args is None and frame_rate == stream.frame_rate and channels == stream.channels:
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as chunk_file:
+            chunk_file.setnchannels(stream.channels)
+            chunk_file.setsampwidth(stream.sample_width)
+            chunk_file.setframerate(stream.frame_rate)
+            chunk_file.writeframes(data)
+        return buffer.getvalue()
+
+    command = [
+        find_executable("ffmpeg"), "-v", "error",
+        "-f", PCM_FORMATS[stream.sample_width], "-ar", str(stream.frame_rate), "-ac", str(stream.channels),
+        "-i", "pipe:0",
+        "-ar", str(frame_rate), "-ac", str(channels),
+        *(profile.codec_args or ["-c:a", "pcm_s16le"]),
+        "-f", profile.container, "pipe:1",
+    ]
+    result = subprocess.run(command, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        error = result.stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"ffmpeg failed to encode a chunk in memory (exit code {result.returncode}): {error}")
+    return result.stdout
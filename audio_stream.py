@@ -0,0 +1,201 @@
+# audio_stream.py
+
+import json
+import wave
+import shutil
+import logging
+import subprocess
+
+class WaveAudioStream:
+    """
+    Reads PCM frames from a WAV file incrementally using the `wave` module.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._wav = wave.open(file_path, 'rb')
+        self.frame_rate = self._wav.getframerate()
+        self.sample_width = self._wav.getsampwidth()
+        self.channels = self._wav.getnchannels()
+        self.total_frames = self._wav.getnframes()
+        self.start_frame = 0
+
+    def seek(self, start_frame):
+        """
+        Moves the read position to `start_frame`.
+        """
+        self.start_frame = min(start_frame, self.total_frames)
+        self._wav.setpos(self.start_frame)
+
+    @property
+    def frame_width(self):
+        return self.sample_width * self.channels
+
+    @property
+    def duration_seconds(self):
+        return self.total_frames / self.frame_rate
+
+    def read(self, n_frames):
+        """
+        Returns up to `n_frames` frames of raw PCM data, or an empty bytes object at the end of the stream.
+        """
+        return self._wav.readframes(n_frames)
+
+    def close(self):
+        self._wav.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class FFmpegAudioStream:
+    """
+    Decodes any audio file ffmpeg understands into 16-bit PCM frames, read incrementally from a pipe.
+
+    The output keeps the native rate and channels of the source unless
+    `frame_rate` or `channels` are given, in which case ffmpeg resamples or
+    downmixes while decoding.
+    """
+
+    sample_width = 2  # Decoded as signed 16-bit little-endian PCM
+
+    def __init__(self, file_path, frame_rate=None, channels=None, start_frame=0, start_seconds=None):
+        self.file_path = file_path
+        ffmpeg = find_executable("ffmpeg")
+
+        # Probe the source properties
+        info = probe_audio(file_path)
+        self.frame_rate = frame_rate or info["frame_rate"]
+        self.channels = channels or info["channels"]
+        self.total_frames = int(info["duration"] * self.frame_rate)
+        if start_seconds:
+            start_frame = int(start_seconds * self.frame_rate)
+        self.start_frame = start_frame
+
+        # Seek on the input side so ffmpeg skips decoding everything before the start
+        seek = ["-ss", f"{start_frame / self.frame_rate:.6f}"] if start_frame else []
+        command = [
+            ffmpeg, "-v", "error", "-nostdin",
+            *seek, "-i", file_path,
+            "-vn", "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ar", str(self.frame_rate), "-ac", str(self.channels),
+            "-",
+        ]
+        self._process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    @property
+    def frame_width(self):
+        return self.sample_width * self.channels
+
+    @property
+    def duration_seconds(self):
+        return self.total_frames / self.frame_rate
+
+    def read(self, n_frames):
+        """
+        Returns up to `n_frames` frames of raw PCM data, or an empty bytes object at the end of the stream.
+        """
+        data = self._process.stdout.read(n_frames * self.frame_width)
+        if not data:
+            self._check_exit()
+        return data
+
+    def _check_exit(self):
+        returncode = self._process.wait()
+        if returncode != 0:
+            error = self._process.stderr.read().decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"ffmpeg failed to decode '{self.file_path}' (exit code {returncode}): {error}")
+
+    def close(self):
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        self._process.stdout.close()
+        self._process.stderr.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def open_audio_stream(file_path, frame_rate=None, channels=None, start_frame=0, start_seconds=None):
+    """
+    Opens an audio file for incremental reading without loading it into memory.
+
+    PCM WAV files already in the requested format are read directly with the
+    `wave` module; everything else is decoded through an ffmpeg pipe, resampled
+    to `frame_rate` and `channels` if given.
+
+    Parameters:
+    - file_path: Path to the audio file.
+    - frame_rate: Preferred output sample rate for decoded sources, or None for the native rate.
+    - channels: Preferred output channel count for decoded sources, or None for the native channels.
+    - start_frame: Frame, at the output rate, to start reading from.
+    - start_seconds: Alternatively, the time in seconds to start reading from, for when the output rate is not known yet.
+
+    Returns:
+    - A stream object with `frame_rate`, `sample_width`, `channels`, `frame_width`,
+      `total_frames`, `start_frame` and a `read(n_frames)` method.
+    """
+    try:
+        stream = WaveAudioStream(file_path)
+    except (wave.Error, EOFError):
+        logging.info(f"'{file_path}' is not a PCM WAV file. Decoding it with ffmpeg.")
+        return FFmpegAudioStream(file_path, frame_rate, channels, start_frame, start_seconds)
+
+    if (frame_rate or stream.frame_rate) == stream.frame_rate and (channels or stream.channels) == stream.channels:
+        if start_seconds:
+            start_frame = int(start_seconds * stream.frame_rate)
+        if start_frame:
+            stream.seek(start_frame)
+        return stream
+
+    # Resample while decoding so that only the smaller converted frames are buffered
+    stream.close()
+    return FFmpegAudioStream(file_path, frame_rate, channels, start_frame, start_seconds)
+
+def probe_audio(file_path):
+    """
+    Reads the sample rate, channel count and duration of the first audio stream with ffprobe.
+
+    Parameters:
+    - file_path: Path to the audio file.
+
+    Returns:
+    - Dictionary with `frame_rate`, `channels` and `duration` (in seconds).
+    """
+    ffprobe = find_executable("ffprobe")
+    command = [
+        ffprobe, "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "stream=sample_rate,channels,duration:format=duration",
+        "-of", "json",
+        file_path,
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed to read '{file_path}': {result.stderr.strip()}")
+
+    info = json.loads(result.stdout)
+    streams = info.get("streams") or []
+    if not streams:
+        raise ValueError(f"No audio stream found in '{file_path}'.")
+    stream = streams[0]
+    duration = stream.get("duration") or info.get("format", {}).get("duration") or 0
+    return {
+        "frame_rate": int(stream["sample_rate"]),
+        "channels": int(stream["channels"]),
+        "duration": float(duration),
+    }
+
+def find_executable(name):
+    """
+    Returns the path to an executable on the PATH, raising an error if it cannot be found.
+    """
+    path = shutil.which(name)
+    if not path:
+        raise FileNotFoundError(f"'{name}' was not found on the PATH. Install ffmpeg to process this audio format.")
+    return path
@@ -1,69 +1,270 @@
 # audio_transcriber.py
 
+import io
 import os
 import logging
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pydub import AudioSegment
 
-SUPPORTED_FORMATS = ('.wav', '.mp3', '.mp4', '.m4a', '.mpeg', '.mpga', '.webm')
+from metrics import Metrics
+from rate_limiter import request_cost
 
-def transcribe_audio_files(client, audio_files, tmp_dir):
+SUPPORTED_FORMATS = ('.wav', '.mp3', '.mp4', '.m4a', '.mpeg', '.mpga', '.webm', '.flac', '.ogg')
+
+TRANSCRIPTION_MODEL = "whisper-1"
+
+def transcribe_audio_files(client, audio_files, tmp_dir, max_workers=1, fail_fast=True, cache=None, completed=None,
+                           on_result=None, executor=None, timestamps=False, on_segments=None, metrics=None, max_in_flight=None):
     """
     Transcribes each audio chunk and returns the combined transcript.
 
+    Parameters are the same as for iter_transcriptions.
+
+    Returns:
+    - combined_transcript: String containing the combined transcript.
+    """
+    return "".join(iter_transcriptions(client, audio_files, tmp_dir, max_workers, fail_fast, cache,
+                                       completed, on_result, executor, timestamps, on_segments, metrics, max_in_flight))
+
+def iter_transcriptions(client, audio_files, tmp_dir, max_workers=1, fail_fast=True, cache=None, completed=None,
+                        on_result=None, executor=None, timestamps=False, on_segments=None, metrics=None, max_in_flight=None):
+    """
+    Transcribes each audio chunk and yields the transcript of each chunk in order.
+
+    Chunks are sent to the API concurrently by a pool of at most `max_workers`
+    threads. `audio_files` may be a generator such as the audio splitter: each
+    chunk is submitted as soon as it is produced, so uploading a chunk overlaps
+    with producing the next one, and each chunk's text is yielded as soon as it
+    and every chunk before it have been transcribed. With `max_in_flight`, no
+    further chunk is taken from `audio_files` while that many are being
+    transcribed, which bounds the memory held by chunks encoded in memory.
+
     Parameters:
     - client: OpenAI client object
-    - audio_files: List of paths to audio files.
+    - audio_files: Iterable of paths to audio files, or of AudioChunks encoded in memory, in chunk order.
     - tmp_dir: Directory to save any converted audio files.
+    - max_workers: Maximum number of concurrent transcription requests.
+    - fail_fast: If True, the first failed chunk aborts the whole transcription.
+      If False, failed chunks are skipped and the remaining results are kept.
+    - cache: Optional ResponseCache. Chunks whose audio has been transcribed before are not sent again.
+    - completed: Optional dictionary of chunk index to transcription for chunks transcribed in an earlier run; these are not sent again.
+    - on_result: Optional callback called with (index, transcription) as each chunk's transcription finishes.
+    - executor: Optional shared executor to run the requests on instead of a pool of `max_workers` threads.
+    - timestamps: If True, each chunk is transcribed with segment timestamps (see transcribe_audio_file).
+    - on_segments: Optional callback called in chunk order, just before a chunk's text is yielded, with
+      (index, segments) for each chunk transcribed with timestamps.
+    - metrics: Optional Metrics to record the requests in.
+    - max_in_flight: Optional maximum number of chunks submitted but not yet transcribed.
 
-    Returns:
-    - combined_transcript: String containing the combined transcript.
+    Yields:
+    - The text of each chunk followed by a newline. Empty and skipped chunks yield nothing.
     """
-    combined_transcript = ""
+    completed = completed or {}
+    results = {}  # Finished chunks not yet yielded
+    futures = {}
+    pending = set()
+    failed = 0
+    total = 0
+    next_to_yield = 0
+    if completed:
+        logging.info(f"{len(completed)} chunks were already transcribed.")
+
+    def collect(done):
+        nonlocal pending, failed
+        error = None
+        for future in done:
+            index, audio_file_path = futures.pop(future)
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                results[index] = None
+                if fail_fast:
+                    error = error or e
+                    continue
+                failed += 1
+                logging.warning(f"Skipping chunk {index + 1} ('{audio_file_path}') after it failed; keeping partial results.")
+                continue
+            if on_result is not None:
+                on_result(index, results[index])
+
+        if error is not None:
+            # Stop queued chunks, but keep the results of requests already in flight
+            for other in pending:
+                other.cancel()
+            for future in wait(pending)[0]:
+                if not future.cancelled() and future.exception() is None and on_result is not None:
+                    on_result(futures[future][0], future.result())
+            pending = set()
+            raise error
+
+    def finished_prefix():
+        nonlocal next_to_yield
+        while next_to_yield in results:
+            text = transcription_text(results.pop(next_to_yield), next_to_yield, on_segments)
+            next_to_yield += 1
+            if text:
+                yield text + "\n"
 
-    for audio_file_path in sorted(audio_files):
+    pool = nullcontext(executor) if executor is not None else ThreadPoolExecutor(max_workers=max(1, max_workers))
+    with pool as executor:
         try:
-            logging.info(f"Processing file: '{audio_file_path}'")
+            for index, audio_file in enumerate(audio_files):
+                total = index + 1
+                if index in completed:
+                    results[index] = completed[index]
+                else:
+                    future = executor.submit(transcribe_audio_file, client, audio_file, tmp_dir, cache, timestamps, metrics)
+                    futures[future] = (index, audio_file_name(audio_file))
+                    pending.add(future)
+                audio_file = None  # Only the pending request keeps the chunk
 
-            # Check file size
-            file_size = os.path.getsize(audio_file_path)
-            if file_size > 25 * 1024 * 1024:
-                logging.warning(f"File '{audio_file_path}' exceeds 25 MB limit and will be skipped.")
-                continue
+                # Collect whatever has finished without waiting, then yield the finished in-order prefix
+                done = {future for future in pending if future.done()}
+                pending -= done
+                collect(done)
+                yield from finished_prefix()
 
-            # Check if the file is in a supported format
-            ext = os.path.splitext(audio_file_path)[1].lower()
-            if ext not in SUPPORTED_FORMATS:
-                logging.warning(f"File '{audio_file_path}' has an unsupported format '{ext}'. Attempting to convert to WAV.")
-
-                # Convert audio file to 'wav' format
-                audio = AudioSegment.from_file(audio_file_path)
-                base_name = os.path.splitext(os.path.basename(audio_file_path))[0]
-                converted_file_path = os.path.join(tmp_dir, f"{base_name}.wav")
-                audio.export(converted_file_path, format='wav')
-                audio_file_path = converted_file_path
-                logging.info(f"Converted '{audio_file_path}' to WAV format.")
-
-            # Read the audio file
-            logging.info("Reading audio file...")
-            with open(audio_file_path, "rb") as audio_file:
-                logging.info("Transcribing audio file...")
-                transcription = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file
-                )
-                logging.info("Transcription completed.")
-
-            # Extract the transcript text
-            transcript_text = transcription.text
-            if not transcript_text:
-                logging.warning(f"Transcription returned empty text for '{audio_file_path}'.")
-                continue
+                # Hold back the next chunk until one in flight has finished
+                while max_in_flight and len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                    yield from finished_prefix()
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+                yield from finished_prefix()
+        finally:
+            # The consumer may stop early, or producing the chunks may fail
+            for future in pending:
+                future.cancel()
+
+    if failed:
+        logging.warning(f"{failed} of {total} chunks failed to transcribe. The combined transcript is incomplete.")
+    if cache is not None:
+        cache.log_stats("Response")
+
+def transcription_text(transcription, index=None, on_segments=None):
+    """
+    Returns the text of a chunk's transcription, passing its segments to `on_segments` if it has any.
+
+    Parameters:
+    - transcription: Text, dictionary with "text" and "segments", or None, as returned by transcribe_audio_file.
+    - index: Index of the chunk.
+    - on_segments: Optional callback called with (index, segments).
+    """
+    if isinstance(transcription, dict):
+        if on_segments is not None and transcription["segments"]:
+            on_segments(index, transcription["segments"])
+        return transcription["text"]
+    return transcription
+
+def transcribe_audio_file(client, audio_file, tmp_dir, cache=None, timestamps=False, metrics=None):
+    """
+    Transcribes a single audio file.
 
-            # Append to the combined transcript
-            combined_transcript += transcript_text + "\n"
+    Failed requests are retried by the client; see rate_limiter.RateLimitedClient.
 
-        except Exception as e:
-            logging.exception(f"An error occurred while processing '{audio_file_path}'.")
-            raise
+    Parameters:
+    - client: OpenAI client object
+    - audio_file: Path to the audio file, or an AudioChunk encoded in memory, which is uploaded from its data.
+    - tmp_dir: Directory to save the converted audio file if conversion is needed.
+    - cache: Optional ResponseCache, keyed by the audio content and the request parameters.
+    - timestamps: If True, the transcription is requested as verbose JSON with segment timestamps.
+    - metrics: Optional Metrics to record the request in.
+
+    Returns:
+    - transcript_text: The transcribed text, or None if the file was skipped or empty. With `timestamps`,
+      a dictionary with the "text" and its "segments" as [start, end, text] lists, with times in seconds
+      from the start of the file.
+    """
+    if metrics is None:
+        metrics = Metrics()
+    audio_file_path = audio_file_name(audio_file)
+    data = getattr(audio_file, "data", None)
+    try:
+        logging.info(f"Processing file: '{audio_file_path}'")
 
-    return combined_transcript
\ No newline at end of file
+        # Check file size
+        file_size = len(data) if data is not None else os.path.getsize(audio_file_path)
+        if file_size > 25 * 1024 * 1024:
+            logging.warning(f"File '{audio_file_path}' exceeds 25 MB limit and will be skipped.")
+            return None
+
+        # Check if the file is in a supported format; chunks in memory are always encoded in one
+        ext = os.path.splitext(audio_file_path)[1].lower()
+        if data is None and ext not in SUPPORTED_FORMATS:
+            logging.warning(f"File '{audio_file_path}' has an unsupported format '{ext}'. Attempting to convert to WAV.")
+
+            # Convert audio file to 'wav' format
+            audio = AudioSegment.from_file(audio_file_path)
+            base_name = os.path.splitext(os.path.basename(audio_file_path))[0]
+            converted_file_path = os.path.join(tmp_dir, f"{base_name}.wav")
+            audio.export(converted_file_path, format='wav')
+            audio_file_path = converted_file_path
+            logging.info(f"Converted '{audio_file_path}' to WAV format.")
+
+        # Look up the transcription by the content of the audio that would be uploaded
+        cache_key = None
+        if cache is not None:
+            content_hash = cache.hash_bytes(data) if data is not None else cache.hash_file(audio_file_path)
+            key_parts = ("transcription", TRANSCRIPTION_MODEL, content_hash)
+            if timestamps:
+                key_parts += ("verbose_json", "segment")
+            cache_key = cache.make_key(*key_parts)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                logging.info(f"Using cached transcription for '{audio_file_path}'.")
+                metrics.increment("transcription_cache_hits")
+                if not cached["text"]:
+                    return None
+                return cached if timestamps else cached["text"]
+
+        # Read the audio file, or upload the chunk's data from memory under the chunk's file name
+        upload_bytes = len(data) if data is not None else os.path.getsize(audio_file_path)
+        if data is not None:
+            upload = io.BytesIO(data)
+            upload.name = os.path.basename(audio_file_path)
+            seconds = audio_file.seconds
+        else:
+            upload = open(audio_file_path, "rb")
+            seconds = 0  # Measured from the file by the rate limiter if needed
+        with upload, request_cost(seconds), metrics.span("whisper_request", file=os.path.basename(audio_file_path)):
+            logging.info(f"Transcribing '{audio_file_path}'...")
+            options = {}
+            if timestamps:
+                options = {"response_format": "verbose_json", "timestamp_granularities": ["segment"]}
+            transcription = client.audio.transcriptions.create(
+                model=TRANSCRIPTION_MODEL,
+                file=upload,
+                **options
+            )
+        metrics.increment("whisper_requests")
+        metrics.increment("upload_bytes", upload_bytes)
+        logging.info(f"Transcription of '{audio_file_path}' completed.")
+
+        # Extract the transcript text
+        transcript_text = transcription.text
+        result = {"text": transcript_text}
+        if timestamps:
+            result["segments"] = [
+                [segment.start, segment.end, segment.text.strip()] for segment in (transcription.segments or [])
+            ]
+        if cache_key is not None:
+            cache.put(cache_key, result)
+        if not transcript_text:
+            logging.warning(f"Transcription returned empty text for '{audio_file_path}'.")
+            return None
+
+        return result if timestamps else transcript_text
+
+    except Exception as e:
+        logging.exception(f"An error occurred while processing '{audio_file_path}'.")
+        raise
+
+def audio_file_name(audio_file):
+    """
+    Returns the path of an audio file given as a path or as an AudioChunk.
+    """
+    return getattr(audio_file, "path", audio_file)
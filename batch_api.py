@@ -0,0 +1,451 @@
+# batch_api.py
+
+import os
+import json
+import time
+import logging
+from collections import namedtuple
+import tiktoken
+
+from file_manager import (
+    create_tmp_directory,
+    create_transcripts_directory,
+    create_cache_directory,
+    create_directory,
+    reserve_unique_filename,
+)
+from response_cache import ResponseCache, DEFAULT_CACHE_MAX_BYTES
+from rate_limiter import RateLimitedClient
+from transcript_chunker import split_transcript_into_chunks
+from transcript_processor import (
+    CONTEXT_TAIL_TOKENS,
+    OUTPUT_TOKEN_RATIO,
+    get_chunk_token_limit,
+    build_cleanup_request,
+    completion_cache_key,
+    cached_prompt_tokens,
+    merge_speakers,
+    PROCESSING_MODEL,
+)
+from prompt_templates import get_prompt, DEFAULT_PROMPT
+from batch_runner import run_batch, write_batch_report, DEFAULT_FILE_WORKERS, DEFAULT_API_WORKERS
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+DEFAULT_POLL_SECONDS = 30
+MAX_BATCH_REQUESTS = 50000  # Batch API limit on the requests in one input file
+MAX_BATCH_BYTES = 190 * 1024 * 1024  # Below the Batch API limit of 200 MB per input file
+MAX_REQUEST_ATTEMPTS = 3  # Rounds a failed request is submitted in before its transcript fails
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# A cleanup request for a transcript chunk, or for a part of a chunk whose reply was truncated
+BatchRequest = namedtuple('BatchRequest', ['job', 'index', 'label', 'chunk', 'previous_tail', 'speakers', 'attempt'])
+
+class CleanupJob:
+    """
+    One transcript cleaned up through the Batch API: its chunks, the replies received so far and its output file once written.
+
+    Replies are kept by label: "3" for the third chunk, and "3.1", "3.2" for the
+    parts a chunk was split into after its reply was truncated.
+    """
+
+    def __init__(self, number, input_path, chunks):
+        self.number = number
+        self.input_path = input_path
+        self.output_path = None
+        self.chunks = chunks
+        self.replies = {}  # Label to the reply text
+        self.parts = {}  # Label of a truncated chunk or part to the labels of its parts
+        self.speakers = None  # Speakers of the first chunk, once it is done
+        self.failed = False
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def is_done(self, label):
+        """
+        Returns True if the chunk or part with `label` has its reply, or all of its parts have theirs.
+        """
+        if label in self.parts:
+            return all(self.is_done(part) for part in self.parts[label])
+        return label in self.replies
+
+    def reply(self, label):
+        """
+        Returns the reply of a finished chunk or part, joining the replies of its parts in order.
+        """
+        if label in self.parts:
+            return "\n".join(self.reply(part) for part in self.parts[label])
+        return self.replies[label]
+
+    def text(self):
+        """
+        Returns the processed transcript, as process_transcript writes it: each chunk's reply followed by a newline.
+        """
+        return "".join(self.reply(f"{index + 1}") + "\n" for index in range(len(self.chunks)))
+
+class BatchCleanup:
+    """
+    Cleans up many transcripts with GPT-4o-mini through the OpenAI Batch API.
+
+    The transcripts are split into chunks as process_transcript splits them, and
+    the requests are sent in rounds. The first round holds the first chunk of
+    every transcript, which establishes its speaker labels. The next round holds
+    all remaining chunks, each carrying the tail of the previous chunk and the
+    speakers of the first one. Chunks whose replies were cut off at the token
+    limit are split in half and sent again in a further round, as are requests
+    that failed, up to MAX_REQUEST_ATTEMPTS times.
+
+    Each round is written to a JSONL input file in `state_dir`, uploaded and
+    submitted as one batch, or several if it exceeds the Batch API limits, and
+    polled until it ends. The submitted batch is recorded next to its input
+    file, so a run that is stopped while waiting picks up the same batch when
+    it is started again on the same transcripts instead of paying for it twice.
+    """
+
+    def __init__(self, client, state_dir, output_dir, cache=None, poll_seconds=DEFAULT_POLL_SECONDS, output_ratio=OUTPUT_TOKEN_RATIO,
+                 prompt=DEFAULT_PROMPT):
+        # Uploads and batch requests are retried by the client wrapper's retry policy
+        if not isinstance(client, RateLimitedClient):
+            client = RateLimitedClient(client)
+        self.client = client
+        self.state_dir = state_dir
+        self.output_dir = output_dir
+        self.cache = cache
+        self.poll_seconds = poll_seconds
+        self.encoding = tiktoken.encoding_for_model(PROCESSING_MODEL)
+        self.template = get_prompt(prompt)
+        self.chunk_tokens = get_chunk_token_limit(self.encoding, output_ratio, self.template)
+        self.jobs = []
+
+    def add_transcript(self, input_path, transcript_text):
+        """
+        Adds a transcript to clean up. Its output file is named after `input_path` in the output directory.
+
+        Returns:
+        - The CleanupJob of the transcript.
+        """
+        chunks = split_transcript_into_chunks(transcript_text, self.chunk_tokens, self.encoding, tail_tokens=CONTEXT_TAIL_TOKENS)
+        job = CleanupJob(len(self.jobs) + 1, input_path, chunks)
+        self.jobs.append(job)
+        logging.info(f"Split '{input_path}' into {len(chunks)} chunk(s).")
+        return job
+
+    def run(self):
+        """
+        Sends the requests of all transcripts in rounds of batches and writes the output files.
+
+        Returns:
+        - List of the CleanupJobs whose output files were written.
+        """
+        pending = []
+        for job in self.jobs:
+            if job.chunks:
+                self._schedule(BatchRequest(job, 0, "1", job.chunks[0], "", [], 0), pending)
+
+        round_number = 0
+        while pending:
+            round_number += 1
+            logging.info(f"Batch round {round_number}: {len(pending)} request(s) for "
+                         f"{len({request.job.number for request in pending})} transcript(s).")
+            outcomes = self.submit_and_wait(pending)
+            requests, pending = pending, []
+            for request in requests:
+                if not request.job.failed:
+                    self._handle(request, outcomes.get(custom_id(request)), pending)
+
+        written = []
+        for job in self.jobs:
+            if job.failed:
+                logging.error(f"The cleanup of '{job.input_path}' failed.")
+                continue
+            # Reserve the file name, so a job running at the same time cannot take it too
+            base_name = os.path.splitext(os.path.basename(job.input_path))[0]
+            output_path = os.path.join(self.output_dir, reserve_unique_filename(base_name, ".txt", self.output_dir))
+            try:
+                with open(output_path, "w", encoding="utf-8") as f:
+                    f.write(job.text())
+            except OSError:
+                logging.exception(f"Failed to write '{output_path}'.")
+                continue
+            job.output_path = output_path
+            written.append(job)
+            logging.info(f"Final transcript saved to '{output_path}'")
+        prompt_tokens = sum(job.prompt_tokens for job in self.jobs)
+        if prompt_tokens:
+            logging.info(f"Input tokens: {prompt_tokens}, of which {sum(job.cached_prompt_tokens for job in self.jobs)} "
+                         f"were served from the prompt cache.")
+        if self.cache is not None:
+            self.cache.log_stats("Response")
+        return written
+
+    def submit_and_wait(self, requests):
+        """
+        Submits requests as batches, waits for the batches to end and downloads their results.
+
+        Returns:
+        - Dictionary of custom ID to {"body": ...} with the chat completion of each
+          request that succeeded, or {"error": ...} with why it failed.
+        """
+        lines = []
+        for request in requests:
+            body, _ = build_cleanup_request(request.chunk, request.previous_tail, request.speakers, self.encoding, self.template)
+            lines.append(json.dumps({"custom_id": custom_id(request), "method": "POST", "url": BATCH_ENDPOINT, "body": body}) + "\n")
+
+        # Split the lines into input files within the Batch API limits
+        groups = [[]]
+        group_bytes = 0
+        for line in lines:
+            size = len(line.encode("utf-8"))
+            if groups[-1] and (len(groups[-1]) >= MAX_BATCH_REQUESTS or group_bytes + size > MAX_BATCH_BYTES):
+                groups.append([])
+                group_bytes = 0
+            groups[-1].append(line)
+            group_bytes += size
+
+        submitted = [self.submit("".join(group).encode("utf-8"), len(group)) for group in groups]
+        outcomes = {}
+        for (state_path, _), batch in zip(submitted, self.wait([batch_id for _, batch_id in submitted])):
+            outcomes.update(self.download_results(batch))
+            # The results are in hand, so a later run must not pick up this batch again
+            for path in (state_path, os.path.splitext(state_path)[0] + ".jsonl"):
+                if os.path.exists(path):
+                    os.remove(path)
+        return outcomes
+
+    def submit(self, data, count):
+        """
+        Writes a JSONL input file, uploads it and creates a batch from it, unless the same file was submitted before.
+
+        Parameters:
+        - data: Contents of the input file, one request per line.
+        - count: Number of requests in the file.
+
+        Returns:
+        - Tuple of the path of the state file that records the batch, and the batch ID.
+        """
+        digest = ResponseCache.hash_bytes(data)
+        input_path = os.path.join(self.state_dir, f"batch_{digest[:16]}.jsonl")
+        state_path = os.path.splitext(input_path)[0] + ".json"
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            logging.info(f"Resuming batch {state['batch_id']}, submitted earlier from '{input_path}'.")
+            return state_path, state["batch_id"]
+
+        with open(input_path, "wb") as f:
+            f.write(data)
+
+        def upload():
+            with open(input_path, "rb") as f:
+                return self.client.files.create(file=f, purpose="batch")
+
+        retry_policy = self.client.retry_policy
+        input_file = retry_policy.call(upload, "Batch input upload")
+        batch = retry_policy.call(lambda: self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=COMPLETION_WINDOW,
+        ), "Batch creation")
+        with open(state_path, "w", encoding="utf-8") as f:
+            json.dump({"batch_id": batch.id, "input_file_id": input_file.id, "submitted_at": time.time()}, f)
+        logging.info(f"Submitted batch {batch.id} with {count} request(s) from '{input_path}'.")
+        return state_path, batch.id
+
+    def wait(self, batch_ids):
+        """
+        Polls the batches every `poll_seconds` until all of them have ended.
+
+        Returns:
+        - List of the ended batches, in the order of `batch_ids`.
+        """
+        ended = {}
+        while True:
+            for batch_id in batch_ids:
+                if batch_id in ended:
+                    continue
+                batch = self.client.retry_policy.call(lambda: self.client.batches.retrieve(batch_id), "Batch status request")
+                counts = batch.request_counts
+                progress = f", {counts.completed + counts.failed}/{counts.total} request(s) done" if counts and counts.total else ""
+                logging.info(f"Batch {batch_id} is {batch.status}{progress}.")
+                if batch.status in FINAL_STATUSES:
+                    ended[batch_id] = batch
+            if len(ended) == len(batch_ids):
+                return [ended[batch_id] for batch_id in batch_ids]
+            time.sleep(self.poll_seconds)
+
+    def download_results(self, batch):
+        """
+        Downloads the output and error files of an ended batch.
+
+        A batch that failed or expired may have results for only some of its
+        requests, or none; the requests without a result are reported as failed.
+
+        Returns:
+        - Dictionary of custom ID to the outcome of each request, as for submit_and_wait.
+        """
+        if batch.status != "completed":
+            errors = [error.message for error in (batch.errors.data or [])] if batch.errors else []
+            logging.warning(f"Batch {batch.id} ended as {batch.status}" + (f": {'; '.join(errors)}" if errors else "."))
+
+        outcomes = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = self.client.retry_policy.call(lambda: self.client.files.content(file_id), "Batch result download")
+            for line in content.text.splitlines():
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                response = result.get("response") or {}
+                if result.get("error") is None and response.get("status_code") == 200:
+                    outcomes[result["custom_id"]] = {"body": response["body"]}
+                else:
+                    error = result.get("error") or (response.get("body") or {}).get("error")
+                    outcomes[result["custom_id"]] = {"error": error or f"HTTP status {response.get('status_code')}"}
+        return outcomes
+
+    def _schedule(self, request, pending):
+        # Whole chunks processed before, by a batch or by process_transcript, are taken from the cache
+        if self.cache is not None and "." not in request.label:
+            cached = self.cache.get(completion_cache_key(request.previous_tail, request.chunk.text, self.template))
+            if cached is not None:
+                logging.info(f"Using cached result for chunk {request.label} of '{request.job.input_path}'")
+                self._finish(request, cached["content"], pending, cached=True)
+                return
+        pending.append(request)
+
+    def _handle(self, request, outcome, pending):
+        job = request.job
+        body = (outcome or {}).get("body")
+        if body is None:
+            error = (outcome or {}).get("error") or "no result"
+            if request.attempt + 1 < MAX_REQUEST_ATTEMPTS:
+                logging.warning(f"The request for chunk {request.label} of '{job.input_path}' failed ({error}). "
+                                f"Submitting it again in the next round.")
+                pending.append(request._replace(attempt=request.attempt + 1))
+            else:
+                logging.error(f"The request for chunk {request.label} of '{job.input_path}' failed "
+                              f"{MAX_REQUEST_ATTEMPTS} times ({error}).")
+                job.failed = True
+            return
+
+        job.requests += 1
+        usage = body.get("usage") or {}
+        job.prompt_tokens += usage.get("prompt_tokens", 0)
+        job.cached_prompt_tokens += cached_prompt_tokens(usage)
+        job.completion_tokens += usage.get("completion_tokens", 0)
+        choice = body["choices"][0]
+        reply = choice["message"].get("content") or ""
+        if choice.get("finish_reason") != "length" or request.chunk.token_count < 2:
+            self._finish(request, reply, pending)
+            return
+
+        # The reply was cut off at the token limit. Split the chunk into parts of at most half its size,
+        # each carrying the context over from the part before it, and send them in the next round.
+        parts = split_transcript_into_chunks(
+            request.chunk.text, -(-request.chunk.token_count // 2), self.encoding, tail_tokens=CONTEXT_TAIL_TOKENS
+        )
+        logging.warning(f"The reply for chunk {request.label} of '{job.input_path}' was truncated. "
+                        f"Submitting it again in {len(parts)} parts.")
+        job.parts[request.label] = [f"{request.label}.{number}" for number in range(1, len(parts) + 1)]
+        previous_tail = request.previous_tail
+        for label, part in zip(job.parts[request.label], parts):
+            pending.append(request._replace(label=label, chunk=part, previous_tail=previous_tail, attempt=0))
+            previous_tail = part.tail
+
+    def _finish(self, request, reply, pending, cached=False):
+        job = request.job
+        job.replies[request.label] = reply
+        chunk_label = f"{request.index + 1}"
+        if not job.is_done(chunk_label):
+            return
+
+        chunk = job.chunks[request.index]
+        previous_tail = job.chunks[request.index - 1].tail if request.index > 0 else ""
+        if self.cache is not None and not cached:
+            self.cache.put(completion_cache_key(previous_tail, chunk.text, self.template), {"content": job.reply(chunk_label)})
+
+        # The first chunk has established the speakers; the remaining chunks can all be sent together
+        if request.index == 0:
+            job.speakers = merge_speakers([], job.reply(chunk_label))
+            for index in range(1, len(job.chunks)):
+                self._schedule(BatchRequest(job, index, f"{index + 1}", job.chunks[index], job.chunks[index - 1].tail,
+                                            job.speakers, 0), pending)
+
+def custom_id(request):
+    """
+    Returns the ID of a request in the batch files, from its transcript's number and its chunk or part label.
+    """
+    return f"{request.job.number}:{request.label}"
+
+def run_batch_api(client, input_files, is_transcript=False, poll_seconds=DEFAULT_POLL_SECONDS, file_workers=DEFAULT_FILE_WORKERS,
+                  split_processes=None, api_workers=DEFAULT_API_WORKERS, **app_options):
+    """
+    Processes input files with the GPT-4o-mini cleanup sent through the Batch API, and writes a summary report.
+
+    Audio files are first transcribed as in run_batch, stopping at their raw
+    transcripts. The transcripts are then cleaned up together by BatchCleanup,
+    which costs less than the synchronous requests and is not subject to the
+    per-minute rate limits, but may take up to the 24 hour completion window.
+
+    Parameters:
+    - client: OpenAI client object, or a RateLimitedClient.
+    - input_files: List of files to process.
+    - is_transcript: Indicates that the input files are transcripts.
+    - poll_seconds: Seconds between checks of the batch status.
+    - file_workers, split_processes, api_workers: As for run_batch, for transcribing audio files.
+    - app_options: Further keyword arguments for TranscriberApp. Of these, `output_ratio`,
+      `prompt`, `use_cache` and `cache_max_bytes` also apply to the cleanup.
+
+    Returns:
+    - List of job result dictionaries, in the order of `input_files`.
+    """
+    batch_start = time.monotonic()
+    if is_transcript:
+        results = [{"input": path, "status": "succeeded", "output_path": None, "audio_seconds": None, "durations": {},
+                    "raw_transcript_path": path} for path in input_files]
+    else:
+        results = run_batch(client, input_files, False, file_workers=file_workers, split_processes=split_processes,
+                            api_workers=api_workers, write_report=False, cleanup=False, **app_options)
+
+    cache = None
+    if app_options.get("use_cache", True):
+        cache = ResponseCache(create_cache_directory(), app_options.get("cache_max_bytes", DEFAULT_CACHE_MAX_BYTES))
+    state_dir = create_directory(os.path.join(create_tmp_directory(), "batches"))
+    cleanup = BatchCleanup(client, state_dir, create_transcripts_directory(), cache, poll_seconds,
+                           app_options.get("output_ratio", OUTPUT_TOKEN_RATIO), app_options.get("prompt", DEFAULT_PROMPT))
+
+    jobs = {}
+    for result in results:
+        if result["status"] != "succeeded":
+            continue
+        result["status"] = "failed"
+        try:
+            with open(result["raw_transcript_path"], "r", encoding="utf-8") as f:
+                transcript_text = f.read()
+        except Exception:
+            logging.exception(f"Failed to read transcript file '{result['raw_transcript_path']}'.")
+            continue
+        jobs[cleanup.add_transcript(result["input"], transcript_text)] = result
+
+    cleanup_start = time.monotonic()
+    try:
+        written = cleanup.run()
+    except Exception:
+        logging.exception("Failed to clean up the transcripts through the Batch API.")
+        written = []
+    for job, result in jobs.items():
+        durations = result["durations"]
+        transcribe_total = durations.pop("total", 0)
+        durations["process"] = time.monotonic() - cleanup_start
+        durations["total"] = transcribe_total + durations["process"]
+        result.update(requests=job.requests, prompt_tokens=job.prompt_tokens, cached_prompt_tokens=job.cached_prompt_tokens,
+                      completion_tokens=job.completion_tokens)
+        if job in written:
+            result["status"] = "succeeded"
+            result["output_path"] = job.output_path
+
+    write_batch_report(results, time.monotonic() - batch_start)
+    return results
@@ -0,0 +1,139 @@
+# batch_runner.py
+
+import os
+import glob
+import json
+import time
+import logging
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from app import TranscriberApp
+from audio_transcriber import SUPPORTED_FORMATS
+from file_manager import create_reports_directory, reserve_unique_filename
+
+DEFAULT_FILE_WORKERS = 2
+DEFAULT_API_WORKERS = 8
+
+def expand_inputs(inputs, is_transcript=False):
+    """
+    Expands the input arguments of a batch into the list of files to process.
+
+    Parameters:
+    - inputs: File paths, directories and glob patterns.
+    - is_transcript: If True, directories are searched for .txt transcripts instead of audio files.
+
+    Returns:
+    - Sorted list of file paths, without duplicates.
+    """
+    extensions = ('.txt',) if is_transcript else SUPPORTED_FORMATS
+    files = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for name in os.listdir(pattern):
+                path = os.path.join(pattern, name)
+                if os.path.isfile(path) and os.path.splitext(name)[1].lower() in extensions:
+                    files.add(path)
+        elif os.path.isfile(pattern):
+            files.add(pattern)
+        else:
+            matches = [path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path)]
+            if not matches:
+                logging.warning(f"No input files found for '{pattern}'")
+            files.update(matches)
+    return sorted(files)
+
+def run_batch(client, input_files, is_transcript=False, file_workers=DEFAULT_FILE_WORKERS, split_processes=None,
+              api_workers=DEFAULT_API_WORKERS, write_report=True, **app_options):
+    """
+    Processes many input files through one shared pipeline and writes a summary report.
+
+    Up to `file_workers` files are in progress at a time. Audio splitting and
+    encoding run in a process pool, while the transcription and GPT-4o-mini
+    requests of all files share one bounded thread pool and the rate limiters
+    of the client.
+
+    Parameters:
+    - client: OpenAI client object, or a RateLimitedClient whose limits apply across all files.
+    - input_files: List of files to process.
+    - is_transcript: Indicates that the input files are transcripts.
+    - file_workers: Maximum number of files processed at the same time.
+    - split_processes: Number of processes for splitting audio; defaults to the number of CPUs.
+    - api_workers: Maximum number of concurrent API requests across all files.
+    - write_report: If False, the summary report is left to the caller, e.g. when the batch is one stage of a larger run.
+    - app_options: Further keyword arguments for TranscriberApp.
+
+    Returns:
+    - List of job result dictionaries, in the order of `input_files`.
+    """
+    batch_start = time.monotonic()
+    logging.info(f"Processing {len(input_files)} file(s) with {file_workers} file worker(s) and {api_workers} API worker(s).")
+
+    # Split processes are spawned rather than forked, since forking while other threads hold locks can deadlock the child
+    with ThreadPoolExecutor(max_workers=max(1, api_workers)) as api_executor, \
+            ProcessPoolExecutor(max_workers=split_processes, mp_context=multiprocessing.get_context("spawn")) as split_executor, \
+            ThreadPoolExecutor(max_workers=max(1, file_workers)) as file_executor:
+        app = TranscriberApp(client, api_executor=api_executor, split_executor=split_executor, **app_options)
+        futures = [file_executor.submit(app.run, input_file, is_transcript) for input_file in input_files]
+
+        results = []
+        for input_file, future in zip(input_files, futures):
+            try:
+                results.append(future.result())
+            except Exception:
+                logging.exception(f"Failed to process '{input_file}'.")
+                results.append({"input": input_file, "status": "failed", "output_path": None, "audio_seconds": None, "durations": {}})
+
+    if write_report:
+        write_batch_report(results, time.monotonic() - batch_start)
+    return results
+
+def write_batch_report(results, total_seconds):
+    """
+    Logs a summary table of a batch and saves it as JSON in the reports directory.
+
+    Parameters:
+    - results: List of job result dictionaries.
+    - total_seconds: Wall-clock duration of the whole batch.
+
+    Returns:
+    - Path of the saved report.
+    """
+    for result in results:
+        audio_seconds = result.get("audio_seconds")
+        elapsed = result["durations"].get("total")
+        # Throughput is seconds of audio processed per second of wall-clock time
+        if result["status"] == "succeeded" and audio_seconds and elapsed:
+            result["throughput"] = audio_seconds / elapsed
+        else:
+            result["throughput"] = None
+
+    succeeded = sum(1 for result in results if result["status"] == "succeeded")
+    total_audio = sum(result["audio_seconds"] or 0 for result in results if result["status"] == "succeeded")
+    report = {
+        "files": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "duration_seconds": total_seconds,
+        "audio_seconds": total_audio,
+        "throughput": total_audio / total_seconds if total_seconds else None,
+        "results": results,
+    }
+
+    logging.info("Batch summary:")
+    for result in results:
+        durations = result["durations"]
+        stages = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in durations.items())
+        throughput = f", {result['throughput']:.1f}x realtime" if result["throughput"] else ""
+        logging.info(f"  [{result['status']}] {result['input']}: {stages}{throughput}")
+    logging.info(f"{succeeded} of {len(results)} file(s) succeeded in {total_seconds:.1f}s"
+                 + (f", {report['throughput']:.1f}x realtime" if total_audio else ""))
+
+    reports_dir = create_reports_directory()
+    report_name = reserve_unique_filename(f"batch_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}", ".json", reports_dir)
+    report_path = os.path.join(reports_dir, report_name)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Batch report saved to '{report_path}'")
+    return report_path
@@ -0,0 +1,90 @@
+# benchmarks/bench_chunker.py
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import tiktoken
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transcript_chunker import split_transcript_into_chunks, iter_transcript_chunks, get_token_byte_lengths
+from transcript_processor import PROCESSING_MODEL
+from bench_common import save_results
+
+WORDS = (
+    "so I think the main point here is that we need to look at the numbers again before the next "
+    "meeting and make sure everyone on the team agrees with the plan going forward right"
+).split()
+
+def make_transcript(size_bytes, seed=0):
+    """
+    Generates a synthetic transcript of roughly `size_bytes` bytes, with sentences of varying length.
+    """
+    rng = random.Random(seed)
+    sentences = []
+    size = 0
+    while size < size_bytes:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 40))).capitalize() + rng.choice(".?!")
+        sentences.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(sentences)
+
+def split_per_sentence(transcript_text, max_tokens_per_chunk, encoding):
+    """
+    The previous chunker, kept for comparison: encodes every sentence separately and builds chunks with +=.
+    """
+    sentences = re.split(r'(?<=[.!?])\s+', transcript_text)
+    chunks = []
+    current_chunk = ""
+    current_tokens = 0
+    for sentence in sentences:
+        sentence_tokens = len(encoding.encode(sentence))
+        if current_tokens + sentence_tokens <= max_tokens_per_chunk:
+            current_chunk += sentence + " "
+            current_tokens += sentence_tokens
+        else:
+            chunks.append(current_chunk.strip())
+            current_chunk = sentence + " "
+            current_tokens = sentence_tokens
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    # The token counts were not kept, so the processor encoded each chunk again
+    return [(chunk, len(encoding.encode(chunk))) for chunk in chunks]
+
+def measure(label, function, size_mb):
+    start = time.perf_counter()
+    chunks = function()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {len(chunks):>6} chunks  {elapsed:8.3f}s  {size_mb / elapsed:8.2f} MB/s")
+    return {"case": f"{label} {size_mb:g}MB", "chunks": len(chunks), "seconds": elapsed, "mb_per_second": size_mb / elapsed}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the transcript chunker on synthetic transcripts.')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 16], help='Transcript sizes in MB (default: 1 4 16).')
+    parser.add_argument('--max-tokens', type=int, default=8000, help='Maximum tokens per chunk (default: 8000).')
+    parser.add_argument('--pieces', type=int, default=200, help='Number of pieces for the streaming run (default: 200).')
+    parser.add_argument('--output', help='Path of the JSON results file (default: benchmarks/results/chunker_<commit>.json).')
+    args = parser.parse_args()
+
+    encoding = tiktoken.encoding_for_model(PROCESSING_MODEL)
+
+    # The token length table is built once per process; time it separately
+    start = time.perf_counter()
+    get_token_byte_lengths(encoding)
+    print(f"Token length table for '{encoding.name}' built in {time.perf_counter() - start:.3f}s")
+    results = []
+    for size_mb in args.sizes:
+        text = make_transcript(int(size_mb * 1024 * 1024))
+        piece_size = -(-len(text) // args.pieces)
+        pieces = [text[i:i + piece_size] for i in range(0, len(text), piece_size)]
+        print(f"{size_mb:g} MB transcript:")
+        results.append(measure("per-sentence (old)", lambda: split_per_sentence(text, args.max_tokens, encoding), size_mb))
+        results.append(measure("single pass", lambda: split_transcript_into_chunks(text, args.max_tokens, encoding), size_mb))
+        results.append(measure("single pass, streamed", lambda: list(iter_transcript_chunks(pieces, args.max_tokens, encoding)), size_mb))
+    save_results("chunker", results, args.output)
+
+if __name__ == "__main__":
+    main()
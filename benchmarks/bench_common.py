@@ -0,0 +1,60 @@
+# benchmarks/bench_common.py
+
+import os
+import sys
+import json
+import platform
+import resource
+import subprocess
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def environment():
+    """
+    Returns a dictionary describing the code and machine a benchmark ran on, so results can be compared across commits.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+    except OSError:
+        commit, dirty = None, None
+    return {
+        "commit": commit or None,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+    }
+
+def save_results(benchmark, results, output=None):
+    """
+    Saves benchmark results as JSON, together with the environment they were measured in.
+
+    Parameters:
+    - benchmark: Name of the benchmark.
+    - results: List of dictionaries, each with a "case" name and its measurements.
+    - output: Path of the file to write; by default `results/<benchmark>_<commit>.json`.
+
+    Returns:
+    - Path of the saved file.
+    """
+    env = environment()
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{benchmark}_{env['commit'] or 'unknown'}{'_dirty' if env['dirty'] else ''}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"benchmark": benchmark, "environment": env, "results": results}, f, indent=2)
+    print(f"Results saved to '{output}'")
+    return output
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of this process in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
@@ -0,0 +1,99 @@
+# benchmarks/bench_end_to_end.py
+
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+
+from openai import OpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import TranscriberApp
+from audio_splitter import ENCODING_PROFILES
+from rate_limiter import RateLimitedClient, RetryPolicy
+from fake_openai_server import start_server
+from fixtures import make_fixture, FIXTURE_FORMATS
+from bench_common import save_results, peak_rss_mb
+
+def run_app(file_path, base_url, work_dir, **app_options):
+    """
+    Runs TranscriberApp on one file against the fake server, with its directories inside `work_dir`.
+
+    Returns:
+    - Dictionary with the job's stage durations, throughput and request counters from its run report.
+    """
+    retry_policy = RetryPolicy(base_delay=0.1)
+    client = RateLimitedClient(OpenAI(api_key="fake", base_url=base_url, max_retries=0), retry_policy=retry_policy)
+    cwd = os.getcwd()
+    os.chdir(work_dir)  # The app keeps its tmp, transcripts, cache and reports directories in the working directory
+    try:
+        result = TranscriberApp(client, use_cache=False, **app_options).run(file_path, False)
+    finally:
+        os.chdir(cwd)
+    if result["status"] != "succeeded":
+        raise RuntimeError(f"The run on '{file_path}' failed.")
+
+    with open(result["report_path"], encoding="utf-8") as f:
+        report = json.load(f)
+    counters = report["metrics"]["counters"]
+    return {
+        "seconds": result["durations"]["total"],
+        "durations": result["durations"],
+        "throughput": report["throughput"],
+        "whisper_requests": counters.get("whisper_requests", 0),
+        "gpt_requests": counters.get("gpt_requests", 0),
+        "upload_bytes": counters.get("upload_bytes", 0),
+        "retries": retry_policy.retries,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark TranscriberApp.run end to end against the fake OpenAI server.')
+    parser.add_argument('--lengths', type=float, nargs='+', default=[600, 3600], help='Fixture lengths in seconds (default: 600 3600).')
+    parser.add_argument('--formats', nargs='+', choices=sorted(FIXTURE_FORMATS), default=['wav'], help='Fixture formats (default: wav).')
+    parser.add_argument('--encoding', choices=sorted(ENCODING_PROFILES), default='wav', help='Chunk encoding (default: %(default)s).')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent Whisper requests (default: %(default)s).')
+    parser.add_argument('--gpt-workers', type=int, default=4, help='Concurrent GPT-4o-mini requests (default: %(default)s).')
+    parser.add_argument('--stream', action='store_true', help='Stream the GPT-4o-mini replies.')
+    parser.add_argument('--in-memory', action='store_true', help='Encode the chunks in memory instead of writing them to disk.')
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds each fake API request takes (default: %(default)s).')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 429 (default: %(default)s).')
+    parser.add_argument('--server-error-rate', type=float, default=0.0, help='Fraction of requests answered with 500 (default: %(default)s).')
+    parser.add_argument('--output', help='Path of the JSON results file (default: benchmarks/results/end_to_end_<commit>.json).')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    server = start_server(latency=args.latency, error_rate=args.error_rate, server_error_rate=args.server_error_rate)
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    app_options = {"encoding": args.encoding, "max_workers": args.workers, "gpt_workers": args.gpt_workers, "stream": args.stream,
+                   "in_memory": args.in_memory}
+
+    results = []
+    for seconds in args.lengths:
+        for audio_format in args.formats:
+            try:
+                path = make_fixture(seconds, audio_format)
+            except FileNotFoundError as e:
+                print(f"Skipping {audio_format}: {e}")
+                continue
+            case = f"{seconds:g}s {audio_format} -> {args.encoding}{' in memory' if args.in_memory else ''}"
+            work_dir = tempfile.mkdtemp(prefix="bench_end_to_end_")
+            try:
+                result = run_app(path, base_url, work_dir, **app_options)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            durations = result["durations"]
+            print(f"{case:<28} {result['seconds']:8.2f}s  split {durations.get('split', 0):6.2f}s  "
+                  f"transcribe {durations.get('transcribe', 0):6.2f}s  first output {durations.get('first_output', 0):6.2f}s  "
+                  f"{result['throughput']:8.1f}x realtime  {result['whisper_requests']} + {result['gpt_requests']} requests")
+            results.append(dict(result, case=case, audio_seconds=seconds))
+
+    # Peak RSS of the whole run, since the cases share this process
+    print(f"Peak RSS: {peak_rss_mb():.1f} MB")
+    save_results("end_to_end", results, args.output)
+
+if __name__ == "__main__":
+    main()
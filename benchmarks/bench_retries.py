@@ -0,0 +1,70 @@
+# benchmarks/bench_retries.py
+
+import os
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limiter import RateLimiter, RateLimitedClient, RetryPolicy, request_cost
+from fake_openai_server import start_server
+
+def run_requests(client, count, workers, tokens):
+    """
+    Sends `count` chat completion requests through `client` from `workers` threads.
+
+    Returns:
+    - (succeeded, failed, elapsed seconds)
+    """
+    def request(number):
+        with request_cost(tokens):
+            client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": f"Request {number}."}],
+                max_tokens=16,
+            )
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(request, number) for number in range(count)]
+    failed = sum(1 for future in futures if future.exception() is not None)
+    return count - failed, failed, time.monotonic() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='Send requests with injected 429s through the rate limited client.')
+    parser.add_argument('--base-url', help='Base URL of a running fake server; by default one is started in-process.')
+    parser.add_argument('--requests', type=int, default=200, help='Number of requests (default: %(default)s).')
+    parser.add_argument('--workers', type=int, default=16, help='Concurrent requests (default: %(default)s).')
+    parser.add_argument('--error-rate', type=float, default=0.2, help='In-process server: fraction of requests answered with 429 (default: %(default)s).')
+    parser.add_argument('--server-rpm', type=int, default=1200, help='In-process server: requests per minute before it answers with 429 (default: %(default)s).')
+    parser.add_argument('--rpm', type=int, help='Client-side requests per minute.')
+    parser.add_argument('--tpm', type=int, help='Client-side tokens per minute.')
+    parser.add_argument('--tokens', type=int, default=100, help='Tokens charged per request (default: %(default)s).')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    base_url = args.base_url
+    server = None
+    if base_url is None:
+        server = start_server(error_rate=args.error_rate, requests_per_minute=args.server_rpm)
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+    retry_policy = RetryPolicy(base_delay=0.1)
+    limiter = RateLimiter(args.rpm, args.tpm)
+    client = RateLimitedClient(OpenAI(api_key="fake", base_url=base_url, max_retries=0), limiter, retry_policy=retry_policy)
+    succeeded, failed, elapsed = run_requests(client, args.requests, args.workers, args.tokens)
+
+    print(f"{succeeded} succeeded, {failed} failed in {elapsed:.2f}s ({succeeded / elapsed * 60:.0f} requests per minute)")
+    print(f"{retry_policy.retries} retries for {retry_policy.requests} requests")
+    if limiter.requests.per_minute:
+        print(f"Request limit in effect: {limiter.requests.per_minute:.0f} per minute")
+    if server is not None:
+        print(f"Server: {server.state.counts['requests']} request(s), {server.state.counts['rate_limited']} rate limited")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_split.py
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_splitter import split_audio, ENCODING_PROFILES
+from fixtures import make_fixture, FIXTURE_FORMATS
+from bench_common import save_results, peak_rss_mb
+
+def split_once(file_path, encoding, drop_silence_seconds=None):
+    """
+    Splits one file into a temporary directory and measures it.
+
+    Peak RSS covers the whole process, so each case runs in a fresh child
+    process started by `run_case`.
+
+    Returns:
+    - Dictionary with the number of chunks, their total size, the time taken and the peak RSS.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="bench_split_")
+    try:
+        start = time.perf_counter()
+        chunks = split_audio(file_path, tmp_dir, encoding, drop_silence_seconds=drop_silence_seconds)
+        elapsed = time.perf_counter() - start
+        return {
+            "chunks": len(chunks),
+            "chunk_bytes": sum(os.path.getsize(path) for path in chunks),
+            "seconds": elapsed,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def run_case(file_path, encoding, drop_silence_seconds=None):
+    """
+    Runs `split_once` in a child process, so its peak RSS is not inflated by earlier cases.
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--child", file_path, "--encodings", encoding]
+    if drop_silence_seconds is not None:
+        command += ["--drop-silence", str(drop_silence_seconds)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark split_audio on generated audio fixtures: time and peak RSS.')
+    parser.add_argument('--lengths', type=float, nargs='+', default=[60, 600, 3600], help='Fixture lengths in seconds (default: 60 600 3600).')
+    parser.add_argument('--formats', nargs='+', choices=sorted(FIXTURE_FORMATS), default=['wav'], help='Fixture formats (default: wav).')
+    parser.add_argument('--encodings', nargs='+', choices=sorted(ENCODING_PROFILES), default=['wav'], help='Chunk encodings (default: wav).')
+    parser.add_argument('--drop-silence', type=float, help='Remove silences longer than this many seconds while splitting.')
+    parser.add_argument('--output', help='Path of the JSON results file (default: benchmarks/results/split_<commit>.json).')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(split_once(args.child, args.encodings[0], args.drop_silence)))
+        return
+
+    results = []
+    for seconds in args.lengths:
+        for audio_format in args.formats:
+            try:
+                path = make_fixture(seconds, audio_format)
+            except FileNotFoundError as e:
+                print(f"Skipping {audio_format}: {e}")
+                continue
+            for encoding in args.encodings:
+                case = f"{seconds:g}s {audio_format} -> {encoding}"
+                try:
+                    result = run_case(path, encoding, args.drop_silence)
+                except subprocess.CalledProcessError as e:
+                    print(f"{case:<28} failed: {e.stderr.strip().splitlines()[-1] if e.stderr.strip() else e}")
+                    continue
+                print(f"{case:<28} {result['chunks']:>4} chunks  {result['seconds']:8.3f}s  "
+                      f"{seconds / result['seconds']:8.1f}x realtime  {result['peak_rss_mb']:8.1f} MB peak RSS")
+                results.append(dict(result, case=case, audio_seconds=seconds))
+    save_results("split", results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# benchmarks/compare.py
+
+import json
+import argparse
+
+# Measurements where a lower value is better; for the rest (e.g. throughput) higher is better
+LOWER_IS_BETTER = ("seconds", "peak_rss_mb", "bytes", "requests", "retries")
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def compare(old, new, threshold=0.05):
+    """
+    Compares the numeric measurements of the cases present in both result files.
+
+    Parameters:
+    - old, new: Results loaded from files written by bench_common.save_results.
+    - threshold: Relative change below which a difference is reported as unchanged.
+
+    Returns:
+    - List of (case, measurement, old value, new value, relative change, verdict) tuples.
+    """
+    old_cases = {result["case"]: result for result in old["results"]}
+    rows = []
+    for result in new["results"]:
+        previous = old_cases.get(result["case"])
+        if previous is None:
+            continue
+        for name, value in result.items():
+            before = previous.get(name)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not isinstance(before, (int, float)):
+                continue
+            change = (value - before) / before if before else 0.0
+            if abs(change) < threshold:
+                verdict = ""
+            elif (change < 0) == name.endswith(LOWER_IS_BETTER):
+                verdict = "better"
+            else:
+                verdict = "worse"
+            rows.append((result["case"], name, before, value, change, verdict))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files, e.g. from two commits.')
+    parser.add_argument('old', help='Results file of the baseline.')
+    parser.add_argument('new', help='Results file to compare with the baseline.')
+    parser.add_argument('--threshold', type=float, default=0.05, help='Relative change reported as unchanged (default: %(default)s).')
+    args = parser.parse_args()
+
+    old, new = load_results(args.old), load_results(args.new)
+    if old["benchmark"] != new["benchmark"]:
+        print(f"Warning: comparing '{old['benchmark']}' results with '{new['benchmark']}' results.")
+    print(f"{old['environment']['commit']} -> {new['environment']['commit']}")
+    for case, name, before, value, change, verdict in compare(old, new, args.threshold):
+        print(f"{case:<32} {name:<16} {before:>12.3f} {value:>12.3f} {change:>+8.1%}  {verdict}")
+
+if __name__ == "__main__":
+    main()
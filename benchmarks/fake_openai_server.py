@@ -0,0 +1,341 @@
+# benchmarks/fake_openai_server.py
+
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class FakeOpenAIState:
+    """
+    Settings, request accounting, uploaded files and batches shared by the handler threads of the fake server.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, server_error_rate=0.0, requests_per_minute=None, seed=0,
+                 batch_seconds=0.0, batch_error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.requests_per_minute = requests_per_minute
+        self.batch_seconds = batch_seconds  # Seconds from creating a batch until it completes
+        self.batch_error_rate = batch_error_rate  # Fraction of the requests in a batch that fail
+        self.random = random.Random(seed)
+        self.request_times = deque()  # Start times of the requests in the last minute
+        self.counts = {"requests": 0, "rate_limited": 0, "server_errors": 0, "batches": 0, "batch_requests": 0}
+        self.files = {}  # File ID to (file object, contents)
+        self.batches = {}  # Batch ID to (batch object, time it was created)
+        self.prompt_prefixes = set()  # System messages seen before, as the prompt cache holds them
+        self._lock = threading.Lock()
+
+    def cached_tokens(self, prefix):
+        """
+        Returns the prompt tokens served from the prompt cache for a request starting with `prefix`.
+
+        Like the API, only a prefix seen before is cached, and only once it is
+        at least 1,024 tokens long, in blocks of 128 tokens.
+        """
+        with self._lock:
+            seen = prefix in self.prompt_prefixes
+            self.prompt_prefixes.add(prefix)
+        tokens = len(prefix) // 4
+        if not seen or tokens < 1024:
+            return 0
+        return tokens // 128 * 128
+
+    def add_file(self, filename, purpose, content):
+        """
+        Stores an uploaded or generated file and returns its file object.
+        """
+        with self._lock:
+            file_id = f"file-fake{len(self.files) + 1}"
+            self.files[file_id] = ({"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                                    "filename": filename, "purpose": purpose, "status": "processed"}, content)
+            return self.files[file_id][0]
+
+    def add_batch(self, request):
+        """
+        Creates a batch from its request, or returns None if its input file does not exist.
+        """
+        with self._lock:
+            if request.get("input_file_id") not in self.files:
+                return None
+            self.counts["batches"] += 1
+            batch_id = f"batch_fake{len(self.batches) + 1}"
+            batch = {"id": batch_id, "object": "batch", "endpoint": request.get("endpoint"),
+                     "input_file_id": request["input_file_id"], "completion_window": request.get("completion_window"),
+                     "status": "in_progress", "created_at": int(time.time()), "output_file_id": None, "error_file_id": None,
+                     "metadata": request.get("metadata"), "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+            self.batches[batch_id] = (batch, time.monotonic())
+            return batch
+
+    def admit(self):
+        """
+        Records a request and decides whether to reject it.
+
+        Returns:
+        - (status, headers): The error status to answer with (429 or 500), or None, and the rate limit headers to send.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.counts["requests"] += 1
+            while self.request_times and self.request_times[0] <= now - 60:
+                self.request_times.popleft()
+
+            headers = {}
+            over_limit = False
+            if self.requests_per_minute:
+                over_limit = len(self.request_times) >= self.requests_per_minute
+                reset = 60 - (now - self.request_times[0]) if self.request_times else 0
+                headers = {
+                    "x-ratelimit-limit-requests": str(self.requests_per_minute),
+                    "x-ratelimit-remaining-requests": str(max(0, self.requests_per_minute - len(self.request_times) - 1)),
+                    "x-ratelimit-reset-requests": f"{reset:.3f}s",
+                }
+            injected = self.random.random() < self.error_rate
+            if over_limit or injected:
+                self.counts["rate_limited"] += 1
+                headers["retry-after-ms"] = str(int(self.random.uniform(50, 500)))
+                return 429, headers
+            self.request_times.append(now)
+            if self.random.random() < self.server_error_rate:
+                self.counts["server_errors"] += 1
+                return 500, headers
+            return None, headers
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """
+    Answers /audio/transcriptions and /chat/completions requests the way the OpenAI API does, without a model.
+
+    The /files and /batches endpoints of the Batch API are served as well. A
+    batch completes `batch_seconds` after it was created, when its status is
+    next requested, and its requests are answered as /chat/completions would be.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        state = self.server.state
+        parts = self.path.split("?")[0].rstrip("/").split("/")
+        if self.path.endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "fake"}]})
+        elif parts[-3:] == ["files", parts[-2], "content"] and parts[-2] in state.files:
+            self.send_bytes(state.files[parts[-2]][1])
+        elif parts[-2] == "batches" and parts[-1] in state.batches:
+            self.send_json(200, self.retrieve_batch(parts[-1]))
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path '{self.path}'", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        state = self.server.state
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        status, headers = state.admit()
+        if state.latency:
+            time.sleep(state.latency)
+        if status == 429:
+            error = {"message": "Rate limit reached (fake server).", "type": "requests", "code": "rate_limit_exceeded"}
+            self.send_json(429, {"error": error}, headers)
+        elif status == 500:
+            self.send_json(500, {"error": {"message": "Internal error (fake server).", "type": "server_error"}}, headers)
+        elif self.path.endswith("/audio/transcriptions"):
+            self.send_json(200, self.transcription(body), headers)
+        elif self.path.endswith("/chat/completions"):
+            request = json.loads(body)
+            if request.get("stream"):
+                self.send_stream(self.completion_chunks(request), headers)
+            else:
+                self.send_json(200, self.completion(request), headers)
+        elif self.path.endswith("/files"):
+            fields = multipart_fields(self.headers.get("Content-Type", ""), body)
+            filename, content = fields.get("file", (None, b""))
+            purpose = fields.get("purpose", (None, b""))[1].decode("utf-8")
+            self.send_json(200, state.add_file(filename or "upload.jsonl", purpose, content), headers)
+        elif self.path.endswith("/batches"):
+            batch = state.add_batch(json.loads(body))
+            if batch is None:
+                self.send_json(400, {"error": {"message": "Unknown input file.", "type": "invalid_request_error"}}, headers)
+            else:
+                self.send_json(200, batch, headers)
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path '{self.path}'", "type": "invalid_request_error"}})
+
+    def transcription(self, body):
+        text = f"This is a fake transcription of {len(body)} bytes of audio. It has two sentences."
+        if b'name="response_format"\r\n\r\nverbose_json' in body:
+            return {"text": text, "segments": [
+                {"id": 0, "start": 0.0, "end": 2.0, "text": " This is a fake transcription."},
+                {"id": 1, "start": 2.0, "end": 4.0, "text": " It has two sentences."},
+            ]}
+        return {"text": text}
+
+    def retrieve_batch(self, batch_id):
+        """
+        Returns a batch object, running the batch's requests first if it is due to complete.
+        """
+        state = self.server.state
+        with state._lock:
+            batch, created = state.batches[batch_id]
+            if batch["status"] != "in_progress" or time.monotonic() - created < state.batch_seconds:
+                return batch
+            input_content = state.files[batch["input_file_id"]][1]
+
+        output, errors = [], []
+        for number, line in enumerate(input_content.decode("utf-8").splitlines()):
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            result = {"id": f"batch_req_{number}", "custom_id": request["custom_id"], "error": None}
+            with state._lock:
+                state.counts["batch_requests"] += 1
+                failed = state.random.random() < state.batch_error_rate
+            if failed:
+                error = {"message": "Internal error (fake server).", "type": "server_error"}
+                errors.append(dict(result, response={"status_code": 500, "request_id": f"req_{number}", "body": {"error": error}}))
+            else:
+                body = self.completion(request["body"])
+                output.append(dict(result, response={"status_code": 200, "request_id": f"req_{number}", "body": body}))
+
+        def jsonl(results):
+            return "".join(json.dumps(result) + "\n" for result in results).encode("utf-8")
+
+        output_file = state.add_file(f"{batch_id}_output.jsonl", "batch_output", jsonl(output))
+        error_file = state.add_file(f"{batch_id}_error.jsonl", "batch_output", jsonl(errors)) if errors else None
+        with state._lock:
+            batch.update(status="completed", completed_at=int(time.time()), output_file_id=output_file["id"],
+                         error_file_id=error_file and error_file["id"],
+                         request_counts={"total": len(output) + len(errors), "completed": len(output), "failed": len(errors)})
+            return batch
+
+    def completion(self, request):
+        content = self.reply(request)
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": self.usage(request, content),
+        }
+
+    def completion_chunks(self, request):
+        """
+        Returns the chunks of a streamed completion, a few words per chunk.
+        """
+        content = self.reply(request)
+        base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini")}
+        words = content.split(" ")
+        chunks = [dict(base, choices=[{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])]
+        for i in range(0, len(words), 8):
+            text = " ".join(words[i:i + 8]) + (" " if i + 8 < len(words) else "")
+            chunks.append(dict(base, choices=[{"index": 0, "delta": {"content": text}, "finish_reason": None}]))
+        chunks.append(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunks.append(dict(base, choices=[], usage=self.usage(request, content)))
+        return chunks
+
+    def reply(self, request):
+        # The cleanup keeps the text, so echo the end of the user message back with a speaker label
+        return "Speaker 1: " + request["messages"][-1]["content"].rsplit("\n\n", 1)[-1]
+
+    def usage(self, request, content):
+        # Roughly four characters per token, which is close enough for benchmarks
+        prompt_tokens = sum(len(message["content"]) for message in request["messages"]) // 4
+        completion_tokens = len(content) // 4
+        first = request["messages"][0]
+        cached_tokens = self.server.state.cached_tokens(first["content"]) if first["role"] == "system" else 0
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_bytes(self, data):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_stream(self, chunks, headers=None):
+        data = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+        data = data.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+def multipart_fields(content_type, body):
+    """
+    Parses a multipart/form-data request body.
+
+    Returns:
+    - Dictionary of field name to (file name or None, contents as bytes).
+    """
+    message = BytesParser(policy=default_policy).parsebytes(b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        fields[name] = (part.get_filename(), part.get_payload(decode=True) or b"")
+    return fields
+
+def start_server(port=0, **settings):
+    """
+    Starts the fake server on a background thread.
+
+    Parameters:
+    - port: Port to listen on; 0 picks a free port.
+    - settings: Keyword arguments for FakeOpenAIState.
+
+    Returns:
+    - The server; its base URL is f"http://127.0.0.1:{server.server_port}/v1".
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOpenAIHandler)
+    server.daemon_threads = True
+    server.state = FakeOpenAIState(**settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a fake OpenAI API for benchmarks and retry tests.')
+    parser.add_argument('--port', type=int, default=8089, help='Port to listen on (default: %(default)s).')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds each request takes (default: %(default)s).')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 429 (default: %(default)s).')
+    parser.add_argument('--server-error-rate', type=float, default=0.0, help='Fraction of requests answered with 500 (default: %(default)s).')
+    parser.add_argument('--rpm', type=int, help='Requests per minute allowed before answering with 429.')
+    parser.add_argument('--batch-seconds', type=float, default=0.0, help='Seconds each batch takes to complete (default: %(default)s).')
+    parser.add_argument('--batch-error-rate', type=float, default=0.0,
+                        help='Fraction of the requests in a batch that fail (default: %(default)s).')
+    args = parser.parse_args()
+
+    server = start_server(args.port, latency=args.latency, error_rate=args.error_rate,
+                          server_error_rate=args.server_error_rate, requests_per_minute=args.rpm,
+                          batch_seconds=args.batch_seconds, batch_error_rate=args.batch_error_rate)
+    print(f"Fake OpenAI API listening on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        counts = server.state.counts
+        print(f"Served {counts['requests']} request(s), {counts['rate_limited']} rate limited, {counts['server_errors']} server error(s), "
+              f"{counts['batches']} batch(es) with {counts['batch_requests']} request(s).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/fixtures.py
+
+import os
+import wave
+import shutil
+import argparse
+import subprocess
+import numpy as np
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# ffmpeg arguments for each fixture format other than WAV
+FIXTURE_FORMATS = {
+    'wav': None,
+    'flac': ['-c:a', 'flac'],
+    'mp3': ['-c:a', 'libmp3lame', '-b:a', '64k'],
+    'm4a': ['-c:a', 'aac', '-b:a', '64k'],
+    'ogg': ['-c:a', 'libopus', '-b:a', '32k'],
+}
+
+BLOCK_SECONDS = 60  # Audio is generated and written a block at a time, so long fixtures do not need much memory
+
+def write_speech_like_wav(path, seconds, frame_rate=44100, channels=2, seed=0):
+    """
+    Writes a 16-bit PCM WAV file of synthetic, speech-like audio.
+
+    The audio alternates "words" of noise shaped by a few harmonics with short
+    pauses between them and longer pauses between "sentences", so that quiet cut
+    points and silence removal behave as they do on real recordings.
+
+    Parameters:
+    - path: Path of the WAV file to write.
+    - seconds: Duration of the audio.
+    - frame_rate: Sample rate.
+    - channels: Number of channels; every channel carries the same signal.
+    - seed: Seed of the random generator, so fixtures are identical across runs.
+    """
+    rng = np.random.default_rng(seed)
+    total_frames = int(seconds * frame_rate)
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(frame_rate)
+        written = 0
+        phase = 0.0
+        while written < total_frames:
+            n_frames = min(BLOCK_SECONDS * frame_rate, total_frames - written)
+            t = (np.arange(n_frames) + written) / frame_rate
+
+            # Words of 0.2-0.6 s separated by pauses; every few words a longer pause
+            envelope = np.zeros(n_frames)
+            position = 0
+            while position < n_frames:
+                word = int(rng.uniform(0.2, 0.6) * frame_rate)
+                envelope[position:position + word] = np.hanning(min(word, n_frames - position) * 2)[:min(word, n_frames - position)] ** 0.5
+                position += word
+                pause = rng.uniform(1.0, 2.5) if rng.random() < 0.15 else rng.uniform(0.05, 0.2)
+                position += int(pause * frame_rate)
+
+            pitch = 120 + 40 * np.sin(2 * np.pi * 0.3 * t + phase)
+            voice = sum(np.sin(2 * np.pi * pitch * harmonic * t) / harmonic for harmonic in (1, 2, 3, 5))
+            signal = (0.3 * voice + 0.05 * rng.standard_normal(n_frames)) * envelope
+            signal += 0.002 * rng.standard_normal(n_frames)  # Background noise, so pauses are not digital silence
+            samples = np.clip(signal * 12000, -32768, 32767).astype('<i2')
+            wav.writeframes(np.repeat(samples[:, None], channels, axis=1).tobytes())
+            written += n_frames
+            phase += 1.0
+
+def make_fixture(seconds, audio_format='wav', directory=FIXTURES_DIR, seed=0):
+    """
+    Returns the path of a fixture of the given length and format, generating it if it does not exist yet.
+
+    Formats other than WAV are encoded from the WAV fixture with ffmpeg.
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = f"speech_{seconds:g}s"
+    wav_path = os.path.join(directory, f"{name}.wav")
+    if not os.path.exists(wav_path):
+        print(f"Generating '{wav_path}'...")
+        write_speech_like_wav(wav_path + ".tmp", seconds, seed=seed)
+        os.replace(wav_path + ".tmp", wav_path)
+    if audio_format == 'wav':
+        return wav_path
+
+    path = os.path.join(directory, f"{name}.{audio_format}")
+    if not os.path.exists(path):
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            raise FileNotFoundError(f"ffmpeg is needed to generate '{audio_format}' fixtures.")
+        print(f"Encoding '{path}'...")
+        subprocess.run([ffmpeg, "-v", "error", "-y", "-i", wav_path, *FIXTURE_FORMATS[audio_format], path], check=True)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic audio fixtures for the benchmarks.')
+    parser.add_argument('--lengths', type=float, nargs='+', default=[60, 600, 3600], help='Fixture lengths in seconds (default: 60 600 3600).')
+    parser.add_argument('--formats', nargs='+', choices=sorted(FIXTURE_FORMATS), default=['wav'], help='Fixture formats (default: wav).')
+    args = parser.parse_args()
+
+    for seconds in args.lengths:
+        for audio_format in args.formats:
+            path = make_fixture(seconds, audio_format)
+            print(f"{path} ({os.path.getsize(path) / (1024 * 1024):.1f} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 
 import os
 import re
+import hashlib
 
 def create_directory(path):
     if not os.path.exists(path):
@@ -20,6 +21,43 @@ def create_raw_transcripts_directory():
     raw_transcripts_dir = os.path.join(os.getcwd(), 'raw_transcripts')
     return create_directory(raw_transcripts_dir)
 
+def create_job_directory(tmp_dir, input_file_path):
+    """
+    Creates the temporary directory of the job for an input file.
+
+    The directory name combines the file's base name with a hash of its absolute
+    path, so inputs with the same name in different directories do not collide
+    and a re-run of the same input finds its previous job directory.
+    """
+    base_name = os.path.splitext(os.path.basename(input_file_path))[0]
+    path_hash = hashlib.sha1(os.path.abspath(input_file_path).encode("utf-8")).hexdigest()[:8]
+    return create_directory(os.path.join(tmp_dir, f"{base_name}_{path_hash}"))
+
+def clean_job_directory(job_dir, keep=()):
+    """
+    Deletes the chunk files and other intermediate files of a finished job.
+
+    The files named in `keep` stay, such as the job manifest, so a later resumed
+    or incremental run still finds the job's recorded results.
+
+    Returns:
+    - Number of bytes freed.
+    """
+    freed = 0
+    for entry in os.scandir(job_dir):
+        if entry.is_file() and entry.name not in keep:
+            freed += entry.stat().st_size
+            os.remove(entry.path)
+    return freed
+
+def create_cache_directory():
+    cache_dir = os.path.join(os.getcwd(), 'cache')
+    return create_directory(cache_dir)
+
+def create_reports_directory():
+    reports_dir = os.path.join(os.getcwd(), 'reports')
+    return create_directory(reports_dir)
+
 def get_unique_filename(base_name, extension, directory):
     """
     Generates a unique filename by appending an incremented number if the file already exists.
@@ -54,4 +92,29 @@ def get_unique_filename(base_name, extension, directory):
     # Find the next available suffix number
     next_suffix = max(suffix_numbers) + 1
     unique_filename = f"{base_name}_{next_suffix}{extension}"
-    return unique_filename
\ No newline at end of file
+    return unique_filename
+
+def reserve_unique_filename(base_name, extension, directory):
+    """
+    Chooses a unique filename like get_unique_filename and creates the file, so that no other job can take it.
+
+    The name is only chosen once the file has been created in exclusive mode;
+    if another job created it first, the next free name is tried. Jobs running
+    at the same time, in threads or in other processes, therefore never write
+    to the same file.
+
+    Parameters:
+    - base_name: The base name of the file without extension.
+    - extension: The file extension, e.g., '.txt'.
+    - directory: The directory where the file will be saved.
+
+    Returns:
+    - unique_filename: The name of the new, empty file.
+    """
+    while True:
+        filename = get_unique_filename(base_name, extension, directory)
+        try:
+            with open(os.path.join(directory, filename), "x"):
+                return filename
+        except FileExistsError:
+            continue  # Taken by another job since it was chosen
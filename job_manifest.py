@@ -0,0 +1,218 @@
+# job_manifest.py
+
+import os
+import json
+import logging
+import threading
+
+MANIFEST_FILENAME = "manifest.json"
+
+class JobManifest:
+    """
+    Checkpoint of a job's progress, stored as JSON in the job's temporary directory.
+
+    The manifest records the source file, the settings the job was started with,
+    every audio chunk written by the splitter, the transcription of each chunk
+    and the result of each post-processing chunk. It is saved after every
+    change, so a job that fails part way can be resumed where it stopped.
+    """
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        self._lock = threading.RLock()  # Held while the data is changed and while it is saved
+
+    @classmethod
+    def open(cls, job_dir, source_path, settings, resume=False, incremental=False):
+        """
+        Opens the manifest of a job, or starts a new one.
+
+        Parameters:
+        - job_dir: The job's temporary directory.
+        - source_path: Path to the input file of the job.
+        - settings: Dictionary of the settings that affect the job's intermediate results.
+        - resume: If True, an existing manifest for the same unchanged source and settings is reused.
+        - incremental: If True, the manifest is also reused if the source has only grown since, as a
+          recording that is still being written does. The job then continues after its last chunk.
+
+        Returns:
+        - JobManifest
+        """
+        path = os.path.join(job_dir, MANIFEST_FILENAME)
+        source = file_fingerprint(source_path)
+
+        if resume and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                logging.warning(f"Could not read job manifest '{path}'. Starting the job from the beginning.")
+            else:
+                grown = incremental and source_has_grown(data.get("source"), source)
+                if data.get("source") != source and not grown:
+                    logging.warning(f"'{source_path}' has changed since the last run. Starting the job from the beginning.")
+                elif data.get("settings") != settings:
+                    logging.warning("The job settings have changed since the last run. Starting the job from the beginning.")
+                else:
+                    manifest = cls(path, data)
+                    if grown:
+                        logging.info(f"'{source_path}' has grown since the last run. Continuing after the last chunk.")
+                        data.update(source=source, split_complete=False, complete=False)
+                        manifest.save()
+                    manifest.log_progress()
+                    return manifest
+        elif resume:
+            logging.info(f"No previous run found for '{source_path}'. Starting the job from the beginning.")
+
+        data = {
+            "source": source,
+            "settings": settings,
+            "chunks": [],
+            "split_complete": False,
+            "transcriptions": {},
+            "raw_transcript_path": None,
+            "processed_chunks": {},
+            "output_path": None,
+            "complete": False,
+        }
+        manifest = cls(path, data)
+        manifest.save()
+        return manifest
+
+    def save(self):
+        """
+        Writes the manifest to disk atomically.
+
+        The pipeline records results from several threads, so every change to
+        the data is made with the lock held, and the data is serialized under it too.
+        """
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f)
+            os.replace(tmp_path, self.path)
+
+    def log_progress(self):
+        """
+        Logs how far the job had progressed.
+        """
+        data = self.data
+        logging.info(
+            f"Resuming job from '{self.path}': {len(data['chunks'])} chunk(s) split"
+            f"{' (complete)' if data['split_complete'] else ''}, "
+            f"{len(data['transcriptions'])} transcribed, {len(data['processed_chunks'])} post-processed."
+        )
+
+    def split_chunks(self):
+        """
+        Returns the recorded audio chunks that can be reused, as dictionaries.
+
+        A chunk can be reused if it has been transcribed or its file still exists.
+        Chunks encoded in memory and the chunk files of finished jobs are not kept,
+        so only their transcriptions make them reusable. Chunks after the first
+        one that cannot be reused are dropped, together with their
+        transcriptions, so splitting resumes from there.
+        """
+        with self._lock:
+            chunks = []
+            for chunk in self.data["chunks"]:
+                if str(chunk["index"]) not in self.data["transcriptions"] and not os.path.exists(chunk["path"]):
+                    logging.warning(f"Chunk '{chunk['path']}' is neither transcribed nor on disk. Splitting again from there.")
+                    self.data["split_complete"] = False
+                    break
+                chunks.append(chunk)
+            self.data["chunks"] = chunks
+            self.data["transcriptions"] = {
+                index: text for index, text in self.data["transcriptions"].items() if int(index) < len(chunks)
+            }
+            return list(chunks)
+
+    def record_chunk(self, chunk):
+        """
+        Records an AudioChunk written by the splitter. The data of a chunk encoded in memory is not recorded.
+        """
+        chunk = chunk._asdict()
+        del chunk["data"]
+        with self._lock:
+            self.data["chunks"].append(chunk)
+            self.save()
+
+    def mark_split_complete(self):
+        """
+        Records that every chunk of the source has been written.
+        """
+        with self._lock:
+            self.data["split_complete"] = True
+            self.save()
+
+    def completed_transcriptions(self):
+        """
+        Returns a dictionary of chunk index to transcription for the chunks already transcribed.
+
+        A transcription is the text, or a dictionary of the text and its segments if the job requested timestamps.
+        """
+        with self._lock:
+            return {int(index): transcription for index, transcription in self.data["transcriptions"].items()}
+
+    def record_transcription(self, index, transcription):
+        """
+        Records the transcription of the chunk at `index`.
+        """
+        with self._lock:
+            self.data["transcriptions"][str(index)] = transcription
+            self.save()
+
+    def completed_processing(self):
+        """
+        Returns a dictionary of chunk index to {"key": ..., "content": ...} for the post-processing chunks already done.
+
+        The key identifies the request a chunk was processed from, so a result is
+        only reused if the chunk's text and context are unchanged.
+        """
+        with self._lock:
+            return {int(index): chunk for index, chunk in self.data["processed_chunks"].items()}
+
+    def record_processing(self, index, key, content):
+        """
+        Records the processed text of the post-processing chunk at `index`, with the key of its request.
+        """
+        with self._lock:
+            self.data["processed_chunks"][str(index)] = {"key": key, "content": content}
+            self.save()
+
+    def set_output_paths(self, raw_transcript_path=None, output_path=None):
+        """
+        Records where the job's transcripts are written, so a resumed job writes to the same files.
+        """
+        with self._lock:
+            if raw_transcript_path:
+                self.data["raw_transcript_path"] = raw_transcript_path
+            if output_path:
+                self.data["output_path"] = output_path
+            self.save()
+
+    def mark_complete(self):
+        """
+        Records that the job finished successfully.
+        """
+        with self._lock:
+            self.data["complete"] = True
+            self.save()
+
+def source_has_grown(previous, current):
+    """
+    Returns True if the file fingerprint `current` is of the same file as `previous`, with data appended since.
+    """
+    return (
+        previous is not None
+        and previous["path"] == current["path"]
+        and current["size"] > previous["size"]
+        and current["mtime"] >= previous["mtime"]
+    )
+
+def file_fingerprint(file_path):
+    """
+    Returns a dictionary identifying the current version of a file by its path, size and modification time.
+    """
+    stat = os.stat(file_path)
+    return {"path": os.path.abspath(file_path), "size": stat.st_size, "mtime": stat.st_mtime}
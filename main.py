@@ -9,6 +9,15 @@ from openai import OpenAI
 from logger_config import configure_logging
 from api_validator import validate_api_key
 from app import TranscriberApp
+from audio_splitter import ENCODING_PROFILES, DEFAULT_ENCODING, CUT_SEARCH_SECONDS
+from response_cache import DEFAULT_CACHE_MAX_BYTES
+from transcript_processor import OUTPUT_TOKEN_RATIO
+from prompt_templates import get_prompt, prompt_names, DEFAULT_PROMPT
+from segment_store import EXPORT_FORMATS
+from rate_limiter import RateLimiter, RateLimitedClient, RetryPolicy, MAX_RETRIES
+from batch_runner import expand_inputs, run_batch, DEFAULT_FILE_WORKERS, DEFAULT_API_WORKERS
+from transcription_service import serve, DEFAULT_SERVICE_HOST, DEFAULT_SERVICE_PORT
+from batch_api import run_batch_api, DEFAULT_POLL_SECONDS
 
 def main():
     try:
@@ -17,14 +26,95 @@ def main():
 
         # Parse command-line arguments
         parser = argparse.ArgumentParser(description='Transcribe and process audio files.')
-        parser.add_argument('input_file', help='Path to the audio file or transcript file.')
-        parser.add_argument('--transcript', action='store_true', help='Indicates that the input file is a transcript.')
+        parser.add_argument('inputs', nargs='*', metavar='input',
+                            help='Path to the audio file or transcript file. Several files, directories or glob patterns run as a batch.')
+        parser.add_argument('--transcript', action='store_true', help='Indicates that the input files are transcripts.')
+        parser.add_argument('--workers', type=int, default=4, help='Maximum number of concurrent transcription requests (default: 4).')
+        parser.add_argument('--gpt-workers', type=int, default=4, help='Maximum number of concurrent GPT-4o-mini requests when processing transcripts (default: 4).')
+        parser.add_argument('--output-ratio', type=float, default=OUTPUT_TOKEN_RATIO,
+                            help='Expected GPT-4o-mini output tokens per input token, used to size transcript chunks so replies are not truncated (default: %(default)s).')
+        parser.add_argument('--prompt', default=DEFAULT_PROMPT, metavar='NAME',
+                            help=f"Instructions for GPT-4o-mini: a registered prompt ({', '.join(prompt_names())}) or the path of a text file "
+                                 "with the instructions (default: %(default)s).")
+        parser.add_argument('--stream', action='store_true',
+                            help='Stream GPT-4o-mini replies and append them to the output transcript as they arrive.')
+        parser.add_argument('--echo', action='store_true', help='Also print the processed transcript to stdout as it is written.')
+        parser.add_argument('--export', nargs='+', choices=EXPORT_FORMATS, default=[], metavar='FORMAT',
+                            help=f"Transcribe with segment timestamps and export them next to the raw transcript ({', '.join(EXPORT_FORMATS)}).")
+        parser.add_argument('--encoding', choices=sorted(ENCODING_PROFILES), default=DEFAULT_ENCODING,
+                            help=f"Encoding of the audio chunks uploaded for transcription (default: {DEFAULT_ENCODING}).")
+        parser.add_argument('--cut-search', type=float, default=CUT_SEARCH_SECONDS,
+                            help=f"Seconds before each chunk boundary to search for a quiet cut point; 0 disables (default: {CUT_SEARCH_SECONDS}).")
+        parser.add_argument('--drop-silence', type=float, metavar='SECONDS',
+                            help='Remove silences longer than this many seconds before uploading audio.')
+        parser.add_argument('--start', type=float, metavar='SECONDS', help='Only transcribe the audio from this time on.')
+        parser.add_argument('--end', type=float, metavar='SECONDS', help='Only transcribe the audio up to this time.')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Continue the previous run on a recording that has grown since, transcribing only the new audio.')
+        parser.add_argument('--in-memory', action='store_true',
+                            help='Encode audio chunks in memory and upload them from there, without writing them to disk.')
+        parser.add_argument('--max-buffers', type=int, metavar='N',
+                            help='With --in-memory: maximum number of chunks held in memory at once (default: twice --workers).')
+        parser.add_argument('--keep-chunks', action='store_true', help='Keep the audio chunks of finished jobs in the tmp directory.')
+        parser.add_argument('--no-cache', action='store_true', help='Do not read or write the cache of API responses.')
+        parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024), metavar='MB',
+                            help='Maximum size of the response cache; least recently used entries are evicted (default: %(default)s).')
+        parser.add_argument('--resume', action='store_true',
+                            help='Resume the previous run on the same input from where it stopped, reusing its chunks and results.')
+        parser.add_argument('--keep-partial', action='store_true', help='Keep the transcripts of successful chunks when other chunks fail, instead of aborting.')
+        parser.add_argument('--prometheus', action='store_true',
+                            help='Also write the metrics of each run in the Prometheus text format next to its JSON run report.')
+        parser.add_argument('--file-workers', type=int, default=DEFAULT_FILE_WORKERS,
+                            help='Batch and service mode: maximum number of files processed at the same time (default: %(default)s).')
+        parser.add_argument('--split-processes', type=int,
+                            help='Batch and service mode: number of processes for splitting audio (default: number of CPUs).')
+        parser.add_argument('--api-workers', type=int, default=DEFAULT_API_WORKERS,
+                            help='Batch and service mode: maximum number of concurrent API requests across all files (default: %(default)s).')
+        parser.add_argument('--batch', action='store_true',
+                            help='Send the GPT-4o-mini cleanup of all inputs through the OpenAI Batch API, at a lower price and without per-minute limits, '
+                                 'and wait for it to complete (up to 24 hours).')
+        parser.add_argument('--batch-poll', type=float, default=DEFAULT_POLL_SECONDS, metavar='SECONDS',
+                            help='Batch API mode: seconds between checks of the batch status (default: %(default)s).')
+        parser.add_argument('--serve', action='store_true',
+                            help='Run as a service that takes jobs over a local HTTP API, instead of processing the inputs.')
+        parser.add_argument('--host', default=DEFAULT_SERVICE_HOST, help='Service mode: address to listen on (default: %(default)s).')
+        parser.add_argument('--port', type=int, default=DEFAULT_SERVICE_PORT, help='Service mode: port to listen on (default: %(default)s).')
+        parser.add_argument('--socket', metavar='PATH', help='Service mode: listen on this Unix socket instead of a TCP port.')
+        parser.add_argument('--rpm', type=int, metavar='N', help='Limit the requests to each model to N per minute across all files.')
+        parser.add_argument('--tpm', type=int, metavar='N', help='Limit GPT-4o-mini requests to N tokens per minute across all files.')
+        parser.add_argument('--audio-rate', type=float, metavar='SECONDS',
+                            help='Limit transcription uploads to this many seconds of audio per minute across all files.')
+        parser.add_argument('--max-retries', type=int, default=MAX_RETRIES,
+                            help='Retries per API request after rate limit, server and connection errors (default: %(default)s).')
         args = parser.parse_args()
+        if not args.inputs and not args.serve:
+            parser.error('at least one input is required unless --serve is given.')
+        if args.inputs and args.serve:
+            parser.error('inputs cannot be given with --serve; submit them to the service instead.')
+        if args.batch and args.serve:
+            parser.error('--batch cannot be combined with --serve.')
+        if args.batch and (args.stream or args.echo):
+            parser.error('--stream and --echo cannot be combined with --batch, whose replies arrive all at once.')
+        if args.start is not None and args.end is not None and args.end <= args.start:
+            parser.error('--end must be after --start.')
+        if args.incremental and args.end is not None:
+            parser.error('--incremental cannot be combined with --end.')
+        if args.output_ratio <= 0:
+            parser.error('--output-ratio must be positive.')
+        try:
+            get_prompt(args.prompt)
+        except ValueError as e:
+            parser.error(str(e))
 
-        input_file_path = args.input_file
-        if not os.path.exists(input_file_path):
-            logging.error(f"Input file not found at '{input_file_path}'")
-            sys.exit(1)
+        # A single existing file runs on its own; anything else is a batch
+        is_batch = not args.serve and (args.batch or len(args.inputs) > 1 or not os.path.isfile(args.inputs[0]))
+        if is_batch:
+            input_files = expand_inputs(args.inputs, args.transcript)
+            if not input_files:
+                logging.error("No input files found.")
+                sys.exit(1)
+        elif not args.serve:
+            input_file_path = args.inputs[0]
 
         # Load your API key from an environment variable
         api_key = os.getenv("OPENAI_API_KEY")
@@ -32,8 +122,8 @@ def main():
             logging.error("OPENAI_API_KEY environment variable not set.")
             sys.exit(1)
 
-        # Initialize OpenAI client
-        client = OpenAI(api_key=api_key)
+        # Initialize OpenAI client; retries are handled by the rate limited client instead
+        client = OpenAI(api_key=api_key, max_retries=0)
 
         # Validate the OpenAI API key
         try:
@@ -42,9 +132,48 @@ def main():
             logging.exception("Failed to validate OpenAI API key.")
             sys.exit(1)
 
-        # Initialize and run the application
-        app = TranscriberApp(client)
-        app.run(input_file_path, args.transcript)
+        # Pace and retry the requests of all files through one set of limiters
+        client = RateLimitedClient(
+            client,
+            RateLimiter(args.rpm, args.tpm),
+            RateLimiter(args.rpm, args.audio_rate),
+            RetryPolicy(args.max_retries),
+        )
+        if args.rpm or args.tpm or args.audio_rate:
+            logging.info(f"API requests are limited to {args.rpm or 'unlimited'} requests per minute per model, "
+                         f"{args.tpm or 'unlimited'} tokens per minute and {args.audio_rate or 'unlimited'} seconds of audio per minute.")
+
+        app_options = dict(max_workers=args.workers, fail_fast=not args.keep_partial, gpt_workers=args.gpt_workers, encoding=args.encoding,
+                           cut_search_seconds=args.cut_search, drop_silence_seconds=args.drop_silence,
+                           use_cache=not args.no_cache, cache_max_bytes=args.cache_size * 1024 * 1024,
+                           resume=args.resume, output_ratio=args.output_ratio,
+                           stream=args.stream, echo=args.echo, export_formats=args.export,
+                           start_seconds=args.start, end_seconds=args.end, incremental=args.incremental,
+                           prometheus=args.prometheus, in_memory=args.in_memory, max_buffers=args.max_buffers,
+                           keep_chunks=args.keep_chunks, prompt=args.prompt)
+
+        if args.serve:
+            # The client, its connection pool and its rate limiters stay warm for every submitted job
+            service_options = dict(app_options, workers=args.file_workers, api_workers=args.api_workers,
+                                   split_processes=args.split_processes)
+            serve(client, args.host, args.port, args.socket, **service_options)
+        elif args.batch:
+            results = run_batch_api(client, input_files, args.transcript, poll_seconds=args.batch_poll,
+                                    file_workers=args.file_workers, split_processes=args.split_processes,
+                                    api_workers=args.api_workers, **app_options)
+            if any(result["status"] != "succeeded" for result in results):
+                logging.error("Some files failed to process.")
+                sys.exit(1)
+        elif is_batch:
+            results = run_batch(client, input_files, args.transcript, file_workers=args.file_workers,
+                                split_processes=args.split_processes, api_workers=args.api_workers, **app_options)
+            if any(result["status"] != "succeeded" for result in results):
+                logging.error("Some files failed to process.")
+                sys.exit(1)
+        else:
+            # Initialize and run the application
+            app = TranscriberApp(client, **app_options)
+            app.run(input_file_path, args.transcript)
 
         logging.info("Processing completed successfully.")
 
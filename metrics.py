@@ -0,0 +1,163 @@
+# metrics.py
+
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets, in seconds for durations
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+METRIC_PREFIX = "transcriber_"
+
+class Histogram:
+    """
+    Distribution of observed values in fixed buckets, with their count, sum, minimum and maximum.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + ("+Inf",), self.bucket_counts)},
+        }
+
+class Metrics:
+    """
+    Thread-safe collection of the spans, counters and histograms of one job.
+
+    A span times one piece of work, such as a split chunk or an API request;
+    its duration is also added to the histogram `<name>_seconds`. Counters
+    accumulate totals such as bytes uploaded or tokens used. The collected
+    metrics are written out as a JSON run report or in the Prometheus text
+    format.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counters = {}
+        self.histograms = {}
+        self.spans = []  # (name, start, seconds, attributes), with start relative to `started`
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        """
+        Adds `value` to the counter `name`.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        """
+        Adds an observation to the histogram `name`.
+        """
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def record_span(self, name, start, seconds, **attributes):
+        """
+        Records a span that started at `start` (from time.monotonic) and took `seconds`.
+        """
+        self.observe(f"{name}_seconds", seconds)
+        with self._lock:
+            self.spans.append((name, start - self.started, seconds, attributes))
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Times the code in the block as a span. The span is recorded even if the block raises.
+        """
+        start = time.monotonic()
+        try:
+            yield attributes
+        finally:
+            self.record_span(name, start, time.monotonic() - start, **attributes)
+
+    def snapshot(self):
+        """
+        Returns the collected metrics as a JSON-serializable dictionary.
+        """
+        with self._lock:
+            return {
+                "elapsed_seconds": time.monotonic() - self.started,
+                "counters": dict(self.counters),
+                "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+                "spans": [
+                    {"name": name, "start": start, "seconds": seconds, **attributes}
+                    for name, start, seconds, attributes in self.spans
+                ],
+            }
+
+    def write_json(self, path, **report):
+        """
+        Writes a JSON run report with the collected metrics and the given top-level fields.
+        """
+        report["metrics"] = self.snapshot()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    def write_prometheus(self, path, labels=None):
+        """
+        Writes the counters and histograms in the Prometheus text exposition format.
+
+        Parameters:
+        - path: Path of the file to write, e.g. for the node exporter's textfile collector.
+        - labels: Optional dictionary of labels added to every sample.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus(labels))
+
+    def to_prometheus(self, labels=None):
+        """
+        Returns the counters and histograms in the Prometheus text exposition format.
+        """
+        def label_text(extra=None):
+            items = dict(labels or {}, **(extra or {}))
+            if not items:
+                return ""
+            return "{" + ",".join(f'{name}="{escape_label(str(value))}"' for name, value in items.items()) + "}"
+
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = f"{METRIC_PREFIX}{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric}{label_text()} {value}")
+            for name, histogram in sorted(self.histograms.items()):
+                metric = f"{METRIC_PREFIX}{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.bucket_counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{label_text({'le': bound})} {cumulative}")
+                lines.append(f"{metric}_sum{label_text()} {histogram.sum}")
+                lines.append(f"{metric}_count{label_text()} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+def escape_label(value):
+    """
+    Escapes a Prometheus label value.
+    """
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
@@ -0,0 +1,119 @@
+# prompt_templates.py
+
+import os
+import hashlib
+
+# Your specified prompt, sent as the system message
+CLEANUP_PROMPT = """
+Your task is to improve the readability of a raw transcript while preserving as much of the original wording as possible. Follow these guidelines:
+
+1. Read the transcript carefully, sentence by sentence.
+2. Identify speakers:
+   - There are multiple potential speakers in this transcript.
+   - Identify transitions between speakers based on:
+     a) Clear changes in the topic or subject matter
+     b) Shifts in speaking style, vocabulary, or tone
+     c) Contextual clues indicating a new person is speaking (e.g., "Thank you for that presentation, now I have a question...")
+   - Assign content to speakers as follows:
+     a) For consecutive content from the same speaker, group it together.
+     b) When you detect a likely speaker change, start a new paragraph and label it with a new speaker designation.
+   - Label speakers sequentially as "Speaker 1", "Speaker 2", "Speaker 3", etc., in the order they appear in the transcript.
+   - If a speaker returns later in the transcript, reuse their original label.
+   - If you're unsure about a speaker change, err on the side of keeping the current speaker label.
+
+3. Improve readability with minimal changes:
+   - Correct only obvious grammatical errors and typos.
+   - Retain original wording unless it significantly impairs understanding.
+   - Keep filler words and false starts unless they severely disrupt readability.
+   - Only break up extremely long, confusing sentences if necessary for comprehension.
+   - Maintain the original tone, style, and vocabulary of each speaker.
+
+4. Handle unclear or nonsensical parts:
+   - If a part is completely incomprehensible, replace it with [best guess].
+   - Inside the brackets, provide your best interpretation of the intended meaning.
+   - Use a similar number of words and try to incorporate any recognizable parts of the original text.
+
+5. Formatting:
+   - Present the transcript in a clear, easy-to-read format.
+   - Start a new paragraph for each change of speaker.
+
+6. Prioritize authenticity:
+   - Your primary goal is to preserve the original content as much as possible.
+   - Make only the minimum changes necessary for basic comprehension.
+   - Do not add new information, elaborate, or change the context of the conversation.
+   - If in doubt, keep the original wording.
+
+Provide the minimally-edited, more readable version of the transcript while strictly adhering to these guidelines. The output should be nearly identical to the input, with changes only where absolutely necessary for basic understanding.
+"""
+DEFAULT_PROMPT = "cleanup"
+
+class PromptTemplate:
+    """
+    Instructions for processing transcript chunks, sent as the system message ahead of every chunk.
+
+    The instructions are identical in every request, so they form a stable
+    prefix that the API can cache. Once a request's first 1,024 tokens match a
+    recent request, the matching part is billed at a discount and the reply
+    starts sooner. Everything that changes from chunk to chunk, the context and
+    the chunk itself, follows in the user message.
+    """
+
+    def __init__(self, name, instructions):
+        self.name = name
+        self.instructions = instructions
+        self.cache_key = f"{name}-{hashlib.sha256(instructions.encode('utf-8')).hexdigest()[:12]}"
+        self._token_counts = {}  # Encoding name to the number of tokens of the instructions
+
+    def prefix_tokens(self, encoding):
+        """
+        Returns the number of tokens of the instructions, counted once per encoding and reused.
+        """
+        count = self._token_counts.get(encoding.name)
+        if count is None:
+            count = self._token_counts[encoding.name] = len(encoding.encode(self.instructions))
+        return count
+
+    def messages(self, user_message):
+        """
+        Returns the chat messages of a request: the instructions, then the user message.
+        """
+        return [
+            {"role": "system", "content": self.instructions},
+            {"role": "user", "content": user_message}
+        ]
+
+_prompts = {}
+
+def register_prompt(template):
+    """
+    Adds a PromptTemplate to the registry under its name, replacing any template of that name.
+
+    Returns:
+    - The template.
+    """
+    _prompts[template.name] = template
+    return template
+
+def get_prompt(name):
+    """
+    Returns a registered PromptTemplate.
+
+    A name that is not registered is read as the path of a text file holding
+    the instructions, which is registered under that path. ValueError is raised
+    if `name` is neither registered nor an existing file.
+    """
+    template = _prompts.get(name)
+    if template is not None:
+        return template
+    if not os.path.isfile(name):
+        raise ValueError(f"Unknown prompt '{name}'. Use one of {', '.join(prompt_names())} or the path of a prompt file.")
+    with open(name, "r", encoding="utf-8") as f:
+        return register_prompt(PromptTemplate(name, f.read()))
+
+def prompt_names():
+    """
+    Returns the sorted names of the registered prompts.
+    """
+    return sorted(_prompts)
+
+register_prompt(PromptTemplate(DEFAULT_PROMPT, CLEANUP_PROMPT))
@@ -0,0 +1,361 @@
+# rate_limiter.py
+
+import re
+import time
+import wave
+import types
+import random
+import logging
+import threading
+from contextlib import contextmanager
+
+import openai
+
+from audio_stream import probe_audio
+
+# Retry settings for failed API requests
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0  # seconds
+RETRY_MAX_DELAY = 60.0  # seconds
+# Retries allowed across all requests: a fixed allowance plus a fraction of the requests made
+RETRY_BUDGET_MIN = 10
+RETRY_BUDGET_RATIO = 0.2
+
+RESET_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+_request_cost = threading.local()  # Token count of the request about to be made on this thread
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at a steady rate per minute.
+
+    The bucket holds up to `burst_seconds` worth of tokens, so short bursts are
+    allowed while the long-run rate stays at `per_minute`. A bucket without a
+    rate does not limit anything until it learns one from the API's rate limit
+    headers.
+    """
+
+    def __init__(self, per_minute=None, burst_seconds=10):
+        self.burst_seconds = burst_seconds
+        self.per_minute = None
+        self.rate = None
+        self.capacity = None
+        self._level = 0.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        if per_minute:
+            self._set_rate(per_minute)
+            self._level = self.capacity
+
+    def _set_rate(self, per_minute):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * self.burst_seconds)
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self._level = min(self.capacity, self._level + max(0.0, now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1):
+        """
+        Blocks until `amount` tokens are available, then takes them.
+
+        An amount larger than the bucket waits for a full bucket and leaves it in
+        debt, so the requests after it wait for the difference.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait_seconds = self._paused_until - now
+                elif self.rate is None:
+                    return
+                else:
+                    self._refill(now)
+                    needed = min(amount, self.capacity)
+                    if self._level >= needed:
+                        self._level -= amount
+                        return
+                    wait_seconds = (needed - self._level) / self.rate
+            time.sleep(wait_seconds)
+
+    def observe(self, limit=None, remaining=None, reset_seconds=None):
+        """
+        Adapts the bucket to the limit and remaining tokens reported by the API.
+
+        The bucket takes on the server's limit if it is lower than its own, and
+        never holds more tokens than the server says remain. If none remain, the
+        bucket is paused until the server's limit resets.
+
+        Parameters:
+        - limit: Tokens allowed per minute, or None if not reported.
+        - remaining: Tokens remaining in the current window, or None if not reported.
+        - reset_seconds: Seconds until the window resets, or None if not reported.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if limit and (self.per_minute is None or limit < self.per_minute):
+                learned = self.rate is None
+                self._set_rate(limit)
+                if learned:
+                    self._level = self.capacity
+            if remaining is not None and self.rate is not None:
+                self._level = min(self._level, remaining)
+            if remaining == 0 and reset_seconds:
+                self._paused_until = max(self._paused_until, now + reset_seconds)
+
+    def pause(self, seconds):
+        """
+        Holds back every acquire for the next `seconds`.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class RateLimiter:
+    """
+    Thread-safe limiter on the requests started per minute and the tokens they use per minute.
+
+    Either limit may be left out. Limits reported by the API in its
+    `x-ratelimit-*` response headers are picked up as the requests complete.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, burst_seconds=10):
+        self.requests = TokenBucket(requests_per_minute, burst_seconds)
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds)
+
+    def acquire(self, tokens=0):
+        """
+        Blocks until a request using `tokens` tokens may be started.
+        """
+        self.requests.acquire()
+        if tokens:
+            self.tokens.acquire(tokens)
+
+    def observe_headers(self, headers, tokens=True):
+        """
+        Adapts the limits to the rate limit headers of an API response.
+
+        Parameters:
+        - headers: The response headers.
+        - tokens: If False, only the request limit headers are used.
+        """
+        self.requests.observe(
+            header_number(headers, "x-ratelimit-limit-requests"),
+            header_number(headers, "x-ratelimit-remaining-requests"),
+            parse_reset_duration(headers.get("x-ratelimit-reset-requests")),
+        )
+        if tokens:
+            self.tokens.observe(
+                header_number(headers, "x-ratelimit-limit-tokens"),
+                header_number(headers, "x-ratelimit-remaining-tokens"),
+                parse_reset_duration(headers.get("x-ratelimit-reset-tokens")),
+            )
+
+    def pause(self, seconds):
+        """
+        Holds back every request for the next `seconds`, after the API has rate limited one.
+        """
+        self.requests.pause(seconds)
+
+class RetryPolicy:
+    """
+    Retries failed API requests with jittered exponential backoff, within a retry budget shared by all requests.
+
+    Rate limit (429), server (5xx), timeout and connection errors are retried;
+    an exhausted quota and other client errors are not. A `retry-after` header
+    from the server takes precedence over the backoff. The budget allows
+    `budget_min` retries plus `budget_ratio` retries per request made, so a
+    persistent outage fails quickly instead of multiplying the load.
+    """
+
+    def __init__(self, max_retries=MAX_RETRIES, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 budget_min=RETRY_BUDGET_MIN, budget_ratio=RETRY_BUDGET_RATIO):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_min = budget_min
+        self.budget_ratio = budget_ratio
+        self.requests = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def call(self, func, description, limiter=None):
+        """
+        Calls `func` until it succeeds, retrying the errors that are worth retrying.
+
+        Parameters:
+        - func: Function making the request, called without arguments.
+        - description: Description of the request for log messages.
+        - limiter: Optional RateLimiter to pause when the request is rate limited.
+
+        Returns:
+        - The return value of `func`.
+        """
+        with self._lock:
+            self.requests += 1
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                with self._lock:
+                    if self.retries >= self.budget_min + self.budget_ratio * self.requests:
+                        logging.warning(f"The retry budget is exhausted ({self.retries} retries for {self.requests} requests). "
+                                        f"Not retrying {description}.")
+                        raise
+                    self.retries += 1
+
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                delay = min(delay, self.max_delay)
+                attempt += 1
+                if limiter is not None and isinstance(e, openai.RateLimitError):
+                    limiter.pause(delay)
+                logging.warning(f"{description} failed ({describe_error(e)}). Retrying in {delay:.1f}s ({attempt}/{self.max_retries}).")
+                time.sleep(delay)
+
+class RateLimitedClient:
+    """
+    Wraps an OpenAI client so that every transcription and chat completion request is paced and retried.
+
+    Chat completions wait for `limiter`, charged with the token count given by
+    request_cost. Transcriptions wait for `transcription_limiter`, whose tokens
+    are seconds of audio, given by request_cost or measured from the file. Both limiters adapt to the rate limit headers of the
+    responses, and failed requests are retried by the retry policy. All other
+    attributes are passed through to the wrapped client, so the wrapper can be
+    used anywhere the client is.
+    """
+
+    def __init__(self, client, limiter=None, transcription_limiter=None, retry_policy=None):
+        self.client = client
+        self.limiter = limiter or RateLimiter()
+        self.transcription_limiter = transcription_limiter or RateLimiter()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.audio = types.SimpleNamespace(
+            transcriptions=types.SimpleNamespace(create=self._limited(
+                client.audio.transcriptions, self.transcription_limiter, "Transcription request", self._audio_cost, False
+            ))
+        )
+        self.chat = types.SimpleNamespace(
+            completions=types.SimpleNamespace(create=self._limited(
+                client.chat.completions, self.limiter, "Chat completion request", self._token_cost, True
+            ))
+        )
+
+    def _limited(self, resource, limiter, description, cost, token_headers):
+        # The raw response gives access to the rate limit headers; clients without it are called directly
+        raw = getattr(resource, "with_raw_response", None)
+
+        def attempt(kwargs):
+            limiter.acquire(cost(kwargs))
+            if raw is None:
+                return resource.create(**kwargs)
+            response = raw.create(**kwargs)
+            limiter.observe_headers(response.headers, token_headers)
+            return response.parse()
+
+        def limited_create(**kwargs):
+            return self.retry_policy.call(lambda: attempt(kwargs), description, limiter)
+        return limited_create
+
+    def _token_cost(self, kwargs):
+        return getattr(_request_cost, "tokens", 0)
+
+    def _audio_cost(self, kwargs):
+        if self.transcription_limiter.tokens.rate is None:
+            return 0
+        # A duration given by request_cost saves probing the file
+        return getattr(_request_cost, "tokens", 0) or audio_file_seconds(kwargs["file"])
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+@contextmanager
+def request_cost(tokens):
+    """
+    Sets the number of tokens the requests made on this thread inside the block are charged with.
+
+    The caller passes the count it has already computed with tiktoken, so the
+    rate limiter does not have to tokenize the request again.
+    """
+    _request_cost.tokens = tokens
+    try:
+        yield
+    finally:
+        _request_cost.tokens = 0
+
+def is_retryable(error):
+    """
+    Returns True if a failed API request is worth retrying.
+    """
+    if isinstance(error, openai.RateLimitError):
+        # An exhausted quota does not recover by waiting
+        return getattr(error, "code", None) != "insufficient_quota"
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def retry_after_seconds(error):
+    """
+    Returns the delay the server asked for in the `retry-after-ms` or `retry-after` header of an error, or None.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        if response.headers.get("retry-after-ms"):
+            return float(response.headers["retry-after-ms"]) / 1000
+        if response.headers.get("retry-after"):
+            return float(response.headers["retry-after"])
+    except ValueError:
+        pass  # An HTTP date rather than a number of seconds
+    return None
+
+def describe_error(error):
+    """
+    Returns a short description of a failed API request for log messages.
+    """
+    status_code = getattr(error, "status_code", None)
+    return f"{status_code} {type(error).__name__}" if status_code else type(error).__name__
+
+def header_number(headers, name):
+    """
+    Returns a numeric response header as a number, or None if it is missing or not a number.
+    """
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+def parse_reset_duration(value):
+    """
+    Parses a rate limit reset duration such as "1s", "6m0s" or "20ms" into seconds, or returns None.
+    """
+    if not value:
+        return None
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = RESET_DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+def audio_file_seconds(audio_file):
+    """
+    Returns the duration in seconds of an open audio file about to be uploaded.
+
+    WAV files are read with the `wave` module; other formats are probed with ffprobe.
+    """
+    position = audio_file.tell()
+    try:
+        with wave.open(audio_file, "rb") as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError):
+        return probe_audio(audio_file.name)["duration"]
+    finally:
+        audio_file.seek(position)
@@ -0,0 +1,138 @@
+# response_cache.py
+
+import os
+import json
+import hashlib
+import logging
+import threading
+
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+EVICTION_TARGET = 0.9  # Evict down to this fraction of the cap, so eviction does not run on every write
+
+class ResponseCache:
+    """
+    On-disk cache of API results, keyed by a content hash of the request.
+
+    Each entry is stored as a small JSON file. Reading an entry refreshes its
+    modification time, and when the cache grows past `max_bytes` the least
+    recently used entries are removed.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes = sum(size for _, _, size in self._entries())
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Builds a cache key from strings, bytes and JSON-serializable values.
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode("utf-8")
+            elif not isinstance(part, (bytes, bytearray, memoryview)):
+                part = json.dumps(part, sort_keys=True).encode("utf-8")
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    @staticmethod
+    def hash_file(file_path):
+        """
+        Returns the SHA-256 hex digest of a file's contents, read in blocks.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def hash_bytes(data):
+        """
+        Returns the SHA-256 hex digest of data held in memory; equal to hash_file of a file with the same contents.
+        """
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached value for `key`, or None if it is not cached.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Stores `value` under `key` and evicts the least recently used entries if the cache is over its size cap.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(value).encode("utf-8")
+
+        # Write atomically so concurrent readers never see a partial entry
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_bytes += len(data) - previous_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def log_stats(self, label):
+        """
+        Logs the hit and miss counts accumulated so far.
+        """
+        logging.info(f"{label} cache: {self.hits} hit(s), {self.misses} miss(es)")
+
+    def _evict(self):
+        entries = sorted(self._entries())  # Oldest modification time first
+        total = sum(size for _, _, size in entries)
+        evicted = 0
+        for _, path, size in entries:
+            if total <= self.max_bytes * EVICTION_TARGET:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        self._total_bytes = total
+        if evicted:
+            logging.info(f"Evicted {evicted} least recently used cache entries.")
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
@@ -0,0 +1,140 @@
+# segment_store.py
+
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+
+EXPORT_FORMATS = ('srt', 'vtt', 'json')
+
+class SegmentStore:
+    """
+    Compact, append-only store of timestamped transcript segments, in time order.
+
+    Start and end times are kept in typed arrays, and the segment texts in one
+    string indexed by an array of offsets, instead of one dictionary per
+    segment. Times are in seconds from the start of the source audio.
+    """
+
+    def __init__(self):
+        self.starts = array('d')
+        self.ends = array('d')
+        self.text_offsets = array('q', [0])
+        self._text = ""
+        self._text_parts = []  # Texts added since the text was last joined
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        """
+        Returns the segment at `index` as a (start, end, text) tuple.
+        """
+        if self._text_parts:
+            self._text += "".join(self._text_parts)
+            self._text_parts = []
+        return self.starts[index], self.ends[index], self._text[self.text_offsets[index]:self.text_offsets[index + 1]]
+
+    def add(self, start, end, text):
+        """
+        Appends a segment. Segments must be added in time order.
+        """
+        text = text.strip()
+        self.starts.append(start)
+        self.ends.append(end)
+        self._text_parts.append(text)
+        self.text_offsets.append(self.text_offsets[-1] + len(text))
+
+    def add_chunk(self, segments, start_frame, frame_rate, removed_silences=()):
+        """
+        Appends the segments of one audio chunk, rebased onto the timeline of the source audio.
+
+        Parameters:
+        - segments: Iterable of (start, end, text) with times in seconds from the start of the chunk.
+        - start_frame: Frame of the source audio at which the chunk starts.
+        - frame_rate: Frames per second of `start_frame` and `removed_silences`.
+        - removed_silences: (start_frame, n_frames) pairs, relative to the chunk start, of silences removed from the chunk.
+        """
+        def to_source_seconds(seconds):
+            # Shift the time past every removed silence that starts before it
+            frame = seconds * frame_rate
+            for silence_start, n_frames in removed_silences:
+                if frame < silence_start:
+                    break
+                frame += n_frames
+            return (start_frame + frame) / frame_rate
+
+        for start, end, text in segments:
+            self.add(to_source_seconds(start), to_source_seconds(end), text)
+
+    def find(self, start_seconds=None, end_seconds=None):
+        """
+        Returns the range of indices of the segments that overlap a time range.
+
+        Parameters:
+        - start_seconds: Start of the range, or None for the beginning of the audio.
+        - end_seconds: End of the range, or None for the end of the audio.
+        """
+        first = 0 if start_seconds is None else bisect_right(self.ends, start_seconds)
+        last = len(self) if end_seconds is None else bisect_left(self.starts, end_seconds)
+        return range(first, max(first, last))
+
+def format_timestamp(seconds, separator):
+    """
+    Formats seconds as HH:MM:SS followed by `separator` and milliseconds.
+    """
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+def write_srt(store, path):
+    """
+    Writes the segments as SubRip (.srt) subtitles.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for number, (start, end, text) in enumerate(store, start=1):
+            f.write(f"{number}\n{format_timestamp(start, ',')} --> {format_timestamp(end, ',')}\n{text}\n\n")
+
+def write_vtt(store, path):
+    """
+    Writes the segments as WebVTT (.vtt) subtitles.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("WEBVTT\n\n")
+        for start, end, text in store:
+            f.write(f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}\n{text}\n\n")
+
+def write_json(store, path):
+    """
+    Writes the segments as a JSON object with a list of {"start", "end", "text"} segments.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"segments": [')
+        for index, (start, end, text) in enumerate(store):
+            f.write(("," if index else "") + "\n  " + json.dumps({"start": round(start, 3), "end": round(end, 3), "text": text}))
+        f.write("\n]}\n")
+
+def export_segments(store, base_path, formats):
+    """
+    Writes the segments in each of the given formats, next to each other.
+
+    Parameters:
+    - store: SegmentStore
+    - base_path: Output path without extension.
+    - formats: Iterable of format names from EXPORT_FORMATS.
+
+    Returns:
+    - List of the paths written.
+    """
+    writers = {'srt': write_srt, 'vtt': write_vtt, 'json': write_json}
+    paths = []
+    for export_format in formats:
+        path = f"{base_path}.{export_format}"
+        writers[export_format](store, path)
+        paths.append(path)
+    return paths
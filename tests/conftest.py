@@ -0,0 +1,85 @@
+# conftest.py
+
+import os
+import sys
+import wave
+import types
+import threading
+
+import numpy as np
+import pytest
+import tiktoken
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+@pytest.fixture
+def encoding():
+    """
+    A byte-level tiktoken encoding built locally, so the tests never download one.
+    """
+    ranks = {bytes([i]): i for i in range(256)}
+    return tiktoken.Encoding("test", pat_str=r"\s?\S+|\s+", mergeable_ranks=ranks, special_tokens={})
+
+@pytest.fixture
+def offline_encoding(monkeypatch, encoding):
+    """
+    Makes tiktoken.encoding_for_model return the local encoding.
+    """
+    monkeypatch.setattr(tiktoken, "encoding_for_model", lambda model: encoding)
+    return encoding
+
+@pytest.fixture
+def workdir(monkeypatch, tmp_path):
+    """
+    Runs the test in an empty directory, where the app creates its tmp, cache and transcripts directories.
+    """
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def make_wav(tmp_path):
+    """
+    Returns a function that writes a mono 16-bit WAV tone of the given length and returns its path.
+
+    The tone is silent during each (start, end) range in `silences`, given in seconds.
+    """
+    def make(name="meeting.wav", seconds=8, frame_rate=8000, silences=()):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        samples = 8000 * np.sin(2 * np.pi * 440 * np.arange(int(seconds * frame_rate)) / frame_rate)
+        for start, end in silences:
+            samples[int(start * frame_rate):int(end * frame_rate)] = 0
+        with wave.open(str(path), "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(frame_rate)
+            wav.writeframes(samples.astype("<i2").tobytes())
+        return str(path)
+    return make
+
+class FakeTranscriptions:
+    """
+    Stands in for client.audio.transcriptions, answering each upload with the name of the chunk it came from.
+    """
+
+    def __init__(self):
+        self.uploads = []
+        self.lock = threading.Lock()
+
+    def create(self, model, file, **options):
+        name = os.path.splitext(os.path.basename(file.name))[0]
+        with self.lock:
+            self.uploads.append(name)
+        return types.SimpleNamespace(text=f"text of {name}", segments=[])
+
+@pytest.fixture
+def whisper_client():
+    """
+    A fake OpenAI client whose transcriptions return the uploaded chunk's name.
+    """
+    return types.SimpleNamespace(
+        audio=types.SimpleNamespace(transcriptions=FakeTranscriptions()),
+        chat=types.SimpleNamespace(completions=None),
+    )
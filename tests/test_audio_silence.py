@@ -0,0 +1,46 @@
+# test_audio_silence.py
+
+import numpy as np
+
+import audio_splitter
+from audio_splitter import iter_audio_chunks
+from audio_silence import find_quietest_frame, remove_long_silences
+
+FRAME_RATE = 8000
+
+def tone(seconds, silences=()):
+    samples = 8000 * np.sin(2 * np.pi * 440 * np.arange(int(seconds * FRAME_RATE)) / FRAME_RATE)
+    for start, end in silences:
+        samples[int(start * FRAME_RATE):int(end * FRAME_RATE)] = 0
+    return samples.astype("<i2").tobytes()
+
+def test_quietest_frame_is_found_in_the_search_window():
+    frame = find_quietest_frame(tone(10, [(7, 7.5)]), 2, 1, FRAME_RATE, 5)
+    assert 7 * FRAME_RATE <= frame <= 7.5 * FRAME_RATE
+
+def test_search_is_limited_to_the_second_half_of_the_data():
+    # The only silence is at the very start, so cutting there would leave an empty chunk
+    frame = find_quietest_frame(tone(6, [(0, 0.5)]), 2, 1, FRAME_RATE, 10)
+    assert frame >= 3 * FRAME_RATE
+
+def test_long_silences_are_removed_with_padding():
+    trimmed, removed = remove_long_silences(tone(10, [(3, 6)]), 2, 1, FRAME_RATE, 1)
+    assert len(removed) == 1
+    start, length = removed[0]
+    assert abs(start - 3.25 * FRAME_RATE) < 0.05 * FRAME_RATE
+    assert abs(length - 2.5 * FRAME_RATE) < 0.05 * FRAME_RATE
+    assert len(trimmed) == len(tone(10)) - 2 * length
+
+def test_search_window_longer_than_a_chunk_does_not_make_tiny_chunks(monkeypatch, tmp_path, make_wav):
+    get_max_chunk_frames = audio_splitter.get_max_chunk_frames
+    monkeypatch.setattr(audio_splitter, "get_max_chunk_frames",
+                        lambda frame_rate, *args: min(get_max_chunk_frames(frame_rate, *args), 6 * frame_rate))
+    path = make_wav(seconds=20, silences=[(5, 8), (14, 15)])
+
+    chunks = list(iter_audio_chunks(path, str(tmp_path), encoding="wav", cut_search_seconds=10))
+
+    durations = [(chunk.end_frame - chunk.start_frame) / chunk.frame_rate for chunk in chunks]
+    assert min(durations) >= audio_splitter.MIN_CHUNK_SECONDS
+    assert max(durations) <= 6
+    assert chunks[0].start_frame == 0 and chunks[-1].end_frame == 20 * FRAME_RATE
+    assert all(previous.end_frame == chunk.start_frame for previous, chunk in zip(chunks, chunks[1:]))
@@ -0,0 +1,177 @@
+# test_audio_splitter.py
+
+import io
+import os
+import wave
+import shutil
+import types
+
+import pytest
+
+import audio_splitter
+from audio_splitter import (
+    iter_audio_chunks,
+    plan_chunks,
+    get_max_chunk_frames,
+    encode_chunk,
+    write_chunk,
+    ENCODING_PROFILES,
+    DEFAULT_ENCODING,
+    WAV_HEADER_SIZE,
+)
+
+FRAME_RATE = 8000
+# Small enough that a few seconds of 8 kHz mono 16-bit WAV need several chunks
+LIMIT_BYTES = WAV_HEADER_SIZE + 3 * FRAME_RATE * 2
+
+@pytest.fixture
+def small_limit(monkeypatch):
+    """
+    Lowers the chunk size limit to three seconds of the test audio.
+    """
+    get_max_chunk_frames = audio_splitter.get_max_chunk_frames
+    monkeypatch.setattr(audio_splitter, "MAX_CHUNK_SIZE_BYTES", LIMIT_BYTES)
+    monkeypatch.setattr(audio_splitter, "get_max_chunk_frames",
+                        lambda frame_rate, bytes_per_second, header_size=WAV_HEADER_SIZE, *args:
+                        get_max_chunk_frames(frame_rate, bytes_per_second, header_size, LIMIT_BYTES))
+    return LIMIT_BYTES
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+
+def make_dir(tmp_path, name):
+    path = tmp_path / name
+    path.mkdir()
+    return str(path)
+
+def read_frames(path):
+    with wave.open(path, "rb") as wav:
+        return wav.readframes(wav.getnframes())
+
+@pytest.mark.parametrize("cut_search_seconds", [0, 1])
+def test_chunks_cover_the_audio_without_gaps_or_overlaps(small_limit, tmp_path, make_wav, cut_search_seconds):
+    path = make_wav(seconds=10, silences=[(2, 2.3), (4.5, 4.8)])
+    chunks = list(iter_audio_chunks(path, make_dir(tmp_path, "chunks"), encoding="wav", cut_search_seconds=cut_search_seconds))
+
+    assert len(chunks) > 1
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+    assert chunks[0].start_frame == 0 and chunks[-1].end_frame == 10 * FRAME_RATE
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.start_frame == previous.end_frame
+    for chunk in chunks:
+        assert os.path.getsize(chunk.path) <= small_limit
+
+    # Together the chunk files hold exactly the source frames
+    assert b"".join(read_frames(chunk.path) for chunk in chunks) == read_frames(path)
+
+def test_split_resumed_at_a_chunk_boundary_continues_from_it(small_limit, tmp_path, make_wav):
+    path = make_wav(seconds=10)
+    chunks = list(iter_audio_chunks(path, make_dir(tmp_path, "all"), encoding="wav", cut_search_seconds=0))
+    resumed = list(iter_audio_chunks(path, make_dir(tmp_path, "resumed"), encoding="wav", cut_search_seconds=0,
+                                     start_frame=chunks[1].end_frame, first_index=2))
+
+    assert resumed[0].index == 2 and resumed[0].start_frame == chunks[1].end_frame
+    assert resumed[-1].end_frame == 10 * FRAME_RATE
+    assert b"".join(read_frames(chunk.path) for chunk in resumed) == b"".join(read_frames(chunk.path) for chunk in chunks[2:])
+
+@pytest.mark.parametrize("encoding", sorted(ENCODING_PROFILES))
+def test_planned_chunks_are_equal_contiguous_and_under_the_limit(encoding):
+    profile = ENCODING_PROFILES[encoding]
+    frame_rate = profile.frame_rate or 16000
+    bytes_per_second = profile.bytes_per_second or frame_rate * 2
+    max_bytes = profile.header_size + int(45 * bytes_per_second)
+    total_frames = 100 * frame_rate + 7
+
+    plan = plan_chunks(total_frames, frame_rate, bytes_per_second, profile.header_size, max_bytes)
+
+    assert len(plan) == 3
+    assert plan[0].start_frame == 0 and plan[-1].end_frame == total_frames
+    for previous, chunk in zip(plan, plan[1:]):
+        assert chunk.start_frame == previous.end_frame
+    lengths = [chunk.end_frame - chunk.start_frame for chunk in plan]
+    assert max(lengths) - min(lengths) <= 2
+    for chunk in plan:
+        assert chunk.predicted_size <= max_bytes
+
+def test_plan_respects_the_duration_limit():
+    plan = plan_chunks(10 * 60 * 16000, 16000, 4000, max_chunk_seconds=4 * 60)
+    assert len(plan) == 3
+    assert all(chunk.end_frame - chunk.start_frame <= 4 * 60 * 16000 for chunk in plan)
+
+def test_audio_of_unknown_length_is_planned_as_one_full_chunk():
+    plan = plan_chunks(0, 8000, 16000, max_chunk_size_bytes=LIMIT_BYTES)
+    assert [(chunk.start_frame, chunk.end_frame) for chunk in plan] == [(0, 3 * 8000)]
+    assert plan[0].predicted_size == LIMIT_BYTES
+
+def test_limit_below_one_second_of_audio_is_rejected():
+    with pytest.raises(ValueError):
+        get_max_chunk_frames(8000, 16000, WAV_HEADER_SIZE, WAV_HEADER_SIZE + 15999)
+
+def test_predicted_wav_sizes_are_exact(small_limit, tmp_path, make_wav):
+    path = make_wav(seconds=10)
+    plan = plan_chunks(10 * FRAME_RATE, FRAME_RATE, FRAME_RATE * 2, max_chunk_size_bytes=small_limit)
+    chunks = list(iter_audio_chunks(path, make_dir(tmp_path, "chunks"), encoding="wav", cut_search_seconds=0))
+
+    assert [(chunk.start_frame, chunk.end_frame) for chunk in chunks] == [(planned.start_frame, planned.end_frame) for planned in plan]
+    assert [os.path.getsize(chunk.path) for chunk in chunks] == [planned.predicted_size for planned in plan]
+
+def test_compressed_profiles_encode_mono_16_khz():
+    assert DEFAULT_ENCODING in ENCODING_PROFILES
+    for name, profile in ENCODING_PROFILES.items():
+        if profile.codec_args is not None:
+            assert (profile.frame_rate, profile.channels) == (16000, 1), name
+            assert profile.bytes_per_second < 16000 * 2 * 1.1, name
+
+def test_wav_encoded_in_memory_matches_the_written_file(tmp_path, make_wav):
+    frames = read_frames(make_wav(seconds=2))
+    stream = types.SimpleNamespace(frame_rate=FRAME_RATE, channels=1, sample_width=2)
+    chunk_path = str(tmp_path / "chunk.wav")
+    write_chunk(chunk_path, frames, stream, ENCODING_PROFILES["wav"])
+
+    data = encode_chunk(frames, stream, ENCODING_PROFILES["wav"])
+    with open(chunk_path, "rb") as f:
+        assert data == f.read()
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        assert (wav.getframerate(), wav.getnchannels(), wav.getnframes()) == (FRAME_RATE, 1, 2 * FRAME_RATE)
+
+def test_in_memory_chunks_are_valid_wav_and_nothing_is_written(small_limit, tmp_path, make_wav):
+    path = make_wav(seconds=10)
+    chunk_dir = make_dir(tmp_path, "chunks")
+    chunks = list(iter_audio_chunks(path, chunk_dir, encoding="wav", cut_search_seconds=0, in_memory=True))
+
+    assert os.listdir(chunk_dir) == []
+    frames = b""
+    for chunk in chunks:
+        assert chunk.size == len(chunk.data) <= small_limit
+        with wave.open(io.BytesIO(chunk.data), "rb") as wav:
+            frames += wav.readframes(wav.getnframes())
+    assert frames == read_frames(path)
+
+def test_compressed_profile_without_ffmpeg_names_the_missing_executable(monkeypatch, tmp_path, make_wav):
+    monkeypatch.setattr(shutil, "which", lambda name: None)
+    stream = types.SimpleNamespace(frame_rate=FRAME_RATE, channels=1, sample_width=2)
+    with pytest.raises(FileNotFoundError, match="ffmpeg"):
+        encode_chunk(read_frames(make_wav(seconds=1)), stream, ENCODING_PROFILES["flac"])
+
+@needs_ffmpeg
+@pytest.mark.parametrize("encoding", [name for name, profile in sorted(ENCODING_PROFILES.items()) if profile.codec_args])
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_compressed_chunks_stay_under_the_limit(monkeypatch, tmp_path, make_wav, encoding, in_memory):
+    profile = ENCODING_PROFILES[encoding]
+    limit = profile.header_size + int(4 * profile.bytes_per_second)
+    get_max_chunk_frames = audio_splitter.get_max_chunk_frames
+    monkeypatch.setattr(audio_splitter, "MAX_CHUNK_SIZE_BYTES", limit)
+    monkeypatch.setattr(audio_splitter, "get_max_chunk_frames",
+                        lambda frame_rate, bytes_per_second, header_size=WAV_HEADER_SIZE, *args:
+                        get_max_chunk_frames(frame_rate, bytes_per_second, header_size, limit))
+
+    # At the profile's rate the source is read directly, so the frame counts are exact
+    path = make_wav(seconds=10, frame_rate=16000)
+    chunks = list(iter_audio_chunks(path, make_dir(tmp_path, "chunks"), encoding=encoding, cut_search_seconds=0, in_memory=in_memory))
+    assert len(chunks) == 3
+    assert chunks[0].start_frame == 0 and chunks[-1].end_frame == 10 * 16000
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.start_frame == previous.end_frame
+    for chunk in chunks:
+        assert chunk.size <= limit
+        if not in_memory:
+            assert chunk.path.endswith(profile.extension)
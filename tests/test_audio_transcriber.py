@@ -0,0 +1,72 @@
+# test_audio_transcriber.py
+
+import os
+import types
+import threading
+
+import pytest
+
+from audio_transcriber import iter_transcriptions, transcribe_audio_files
+
+class ScriptedTranscriptions:
+    """
+    Fake transcriptions resource that finishes chunks in a given order and fails the chunks named in `failing`.
+    """
+
+    def __init__(self, finish_order, failing=()):
+        self.failing = set(failing)
+        self.lock = threading.Condition()
+        self.turns = list(finish_order)  # Chunk names in the order their requests may return
+        self.finished = []
+
+    def create(self, model, file, **options):
+        name = os.path.splitext(os.path.basename(file.name))[0]
+        with self.lock:
+            if not self.lock.wait_for(lambda: not self.turns or self.turns[0] == name, timeout=5):
+                raise TimeoutError(f"'{name}' was never allowed to finish.")
+            if self.turns:
+                self.turns.pop(0)
+            self.finished.append(name)
+            self.lock.notify_all()
+        if name in self.failing:
+            raise RuntimeError(f"Transcription of '{name}' failed.")
+        return types.SimpleNamespace(text=f"text of {name}")
+
+def scripted_client(finish_order, failing=()):
+    return types.SimpleNamespace(audio=types.SimpleNamespace(transcriptions=ScriptedTranscriptions(finish_order, failing)))
+
+@pytest.fixture
+def chunks(make_wav):
+    return [make_wav(f"part{n}.wav", seconds=1) for n in range(4)]
+
+def test_chunks_finishing_out_of_order_are_yielded_in_order(tmp_path, chunks):
+    client = scripted_client(["part3", "part1", "part2", "part0"])
+    finished = []
+    texts = list(iter_transcriptions(client, chunks, str(tmp_path), max_workers=4,
+                                     on_result=lambda index, text: finished.append(index)))
+    assert client.audio.transcriptions.finished == ["part3", "part1", "part2", "part0"]
+    assert sorted(finished) == [0, 1, 2, 3]
+    assert texts == [f"text of part{n}\n" for n in range(4)]
+
+def test_failed_chunk_aborts_the_transcription_by_default(tmp_path, chunks):
+    client = scripted_client([], failing=["part1"])
+    texts = []
+    with pytest.raises(RuntimeError, match="part1"):
+        for text in iter_transcriptions(client, chunks, str(tmp_path), max_workers=2, max_in_flight=1):
+            texts.append(text)
+    assert texts == ["text of part0\n"]
+    assert client.audio.transcriptions.finished == ["part0", "part1"]
+
+def test_failed_chunks_are_skipped_when_keeping_partial_results(tmp_path, chunks):
+    client = scripted_client(["part2", "part0", "part1", "part3"], failing=["part1"])
+    recorded = {}
+    transcript = transcribe_audio_files(client, chunks, str(tmp_path), max_workers=4, fail_fast=False,
+                                        on_result=recorded.__setitem__)
+    assert transcript == "text of part0\ntext of part2\ntext of part3\n"
+    assert sorted(recorded) == [0, 2, 3]
+
+def test_completed_chunks_are_not_sent_again(tmp_path, chunks):
+    client = scripted_client([])
+    transcript = transcribe_audio_files(client, chunks, str(tmp_path), max_workers=2, completed={0: "earlier", 2: "run"})
+    assert sorted(client.audio.transcriptions.finished) == ["part1", "part3"]
+    assert transcript == "earlier\ntext of part1\nrun\ntext of part3\n"
@@ -0,0 +1,81 @@
+# test_batch_api.py
+
+import os
+import re
+
+import pytest
+from openai import OpenAI
+
+from fake_openai_server import start_server
+from batch_api import BatchCleanup, run_batch_api, MAX_REQUEST_ATTEMPTS
+
+@pytest.fixture
+def batch_server():
+    # Batches complete at once; about a third of the requests in a batch fail and are retried
+    server = start_server(batch_seconds=0, batch_error_rate=0.3, seed=7)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def batch_client(server):
+    return OpenAI(api_key="fake", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+
+def write_transcript(directory, name, chunks, chunk_tokens):
+    # Numbered sentences, so each transcript spans several chunks and the order of its text can be checked
+    sentence_count = chunks * chunk_tokens // len("Sentence number 000 is here. ")
+    path = directory / name
+    path.write_text(" ".join(f"Sentence number {n} is here." for n in range(sentence_count)), encoding="utf-8")
+    return str(path), sentence_count
+
+def sentence_numbers(path):
+    with open(path, encoding="utf-8") as f:
+        return [int(number) for number in re.findall(r"Sentence number (\d+) is here\.", f.read())]
+
+def test_batch_cleanup_round_trip(workdir, offline_encoding, batch_server):
+    client = batch_client(batch_server)
+    chunk_tokens = BatchCleanup(client, str(workdir), str(workdir)).chunk_tokens
+    inputs = [write_transcript(workdir, name, chunks, chunk_tokens) for name, chunks in (("one.txt", 3), ("two.txt", 1))]
+
+    results = run_batch_api(client, [path for path, _ in inputs], is_transcript=True, poll_seconds=0.01)
+
+    counts = batch_server.state.counts
+    uploads = [file for file, _ in batch_server.state.files.values() if file["purpose"] == "batch"]
+    assert counts["batches"] == len(uploads) >= 2  # The first chunks, then the rest, then any retries
+    assert counts["batch_requests"] > sum(result["requests"] for result in results)  # Failed requests were sent again
+    for result, (path, sentence_count) in zip(results, inputs):
+        assert result["status"] == "succeeded"
+        assert result["output_path"] == os.path.join(str(workdir), "transcripts", os.path.basename(path))
+        # Every chunk's reply is mapped back to its place in its own transcript
+        assert sentence_numbers(result["output_path"]) == list(range(sentence_count))
+    assert results[0]["requests"] > 1
+    assert os.listdir(workdir / "tmp" / "batches") == []
+
+    # A rerun on the same transcripts is answered from the cache without a new batch
+    batches, batch_requests = counts["batches"], counts["batch_requests"]
+    rerun = run_batch_api(client, [path for path, _ in inputs], is_transcript=True, poll_seconds=0.01)
+    assert (counts["batches"], counts["batch_requests"]) == (batches, batch_requests)
+    for result, first in zip(rerun, results):
+        assert result["status"] == "succeeded"
+        assert result["output_path"] != first["output_path"]
+        with open(result["output_path"], encoding="utf-8") as f, open(first["output_path"], encoding="utf-8") as g:
+            assert f.read() == g.read()
+
+def test_failed_requests_are_retried_until_their_attempts_run_out(workdir, offline_encoding, batch_server):
+    client = batch_client(batch_server)
+    os.makedirs(workdir / "out")
+    cleanup = BatchCleanup(client, str(workdir), str(workdir / "out"), poll_seconds=0.01)
+    transcripts = [f"Transcript {n} has one sentence." for n in range(12)]
+    jobs = [cleanup.add_transcript(f"talk{n}.wav", text) for n, text in enumerate(transcripts)]
+
+    written = cleanup.run()
+
+    failed = [job for job in jobs if job.failed]
+    assert written == [job for job in jobs if not job.failed]
+    # With this seed, several requests fail and succeed when sent again, and one fails every attempt
+    assert len(failed) == 1
+    assert batch_server.state.counts["batch_requests"] > len(jobs) + MAX_REQUEST_ATTEMPTS - 1
+    assert failed[0].output_path is None
+    for job in written:
+        assert job.requests == 1
+        with open(job.output_path, encoding="utf-8") as f:
+            assert f.read() == f"Speaker 1: {transcripts[jobs.index(job)]}\n"
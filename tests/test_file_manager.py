@@ -0,0 +1,24 @@
+# test_file_manager.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from file_manager import get_unique_filename, reserve_unique_filename
+from batch_runner import run_batch
+
+def test_unique_filename_adds_a_suffix(tmp_path):
+    assert get_unique_filename("meeting", ".txt", str(tmp_path)) == "meeting.txt"
+    (tmp_path / "meeting.txt").write_text("")
+    (tmp_path / "meeting_2.txt").write_text("")
+    assert get_unique_filename("meeting", ".txt", str(tmp_path)) == "meeting_3.txt"
+
+def test_concurrent_reservations_get_distinct_files(tmp_path):
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        names = list(executor.map(lambda _: reserve_unique_filename("meeting", ".txt", str(tmp_path)), range(32)))
+    assert len(set(names)) == 32
+    assert sorted(os.listdir(tmp_path)) == sorted(names)
+
+def test_jobs_with_the_same_file_name_write_distinct_transcripts(workdir, make_wav, whisper_client):
+    inputs = [make_wav(f"{folder}/meeting.wav", seconds=2) for folder in ("a", "b", "c", "d")]
+    run_batch(whisper_client, inputs, file_workers=4, encoding="wav", use_cache=False, cleanup=False)
+    assert sorted(os.listdir(workdir / "raw_transcripts")) == ["meeting.txt", "meeting_1.txt", "meeting_2.txt", "meeting_3.txt"]
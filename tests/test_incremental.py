@@ -0,0 +1,36 @@
+# test_incremental.py
+
+import audio_splitter
+from app import TranscriberApp
+
+def small_chunks(monkeypatch, seconds):
+    # Split the test audio into chunks of a few seconds instead of 30 minutes
+    get_max_chunk_frames = audio_splitter.get_max_chunk_frames
+    monkeypatch.setattr(audio_splitter, "get_max_chunk_frames",
+                        lambda frame_rate, *args: min(get_max_chunk_frames(frame_rate, *args), seconds * frame_rate))
+
+def make_app(client):
+    return TranscriberApp(client, encoding="wav", cut_search_seconds=0, use_cache=False, cleanup=False, incremental=True)
+
+def test_only_the_audio_added_since_the_last_run_is_uploaded(monkeypatch, workdir, make_wav, whisper_client):
+    small_chunks(monkeypatch, 2)
+    uploads = whisper_client.audio.transcriptions.uploads
+    result = make_app(whisper_client).process_audio_file(make_wav(seconds=8))
+    assert result["status"] == "succeeded"
+    assert uploads == [f"meeting_part{n}" for n in range(1, 5)]
+
+    # The recording grows by four seconds; the first eight are unchanged
+    uploads.clear()
+    audio_path = make_wav(seconds=12)
+    result = make_app(whisper_client).process_audio_file(audio_path)
+    assert result["status"] == "succeeded"
+    assert sorted(uploads) == ["meeting_part5", "meeting_part6"]
+
+    with open(result["raw_transcript_path"], encoding="utf-8") as f:
+        assert f.read().split("\n")[:6] == [f"text of meeting_part{n}" for n in range(1, 7)]
+
+    # Nothing has been added since, so nothing is uploaded again
+    uploads.clear()
+    result = make_app(whisper_client).process_audio_file(audio_path)
+    assert result["status"] == "succeeded"
+    assert uploads == []
@@ -0,0 +1,64 @@
+# test_job_manifest.py
+
+import json
+import threading
+
+from audio_splitter import AudioChunk
+from job_manifest import JobManifest
+
+def test_results_recorded_from_several_threads_are_all_saved(tmp_path, make_wav):
+    source = make_wav(seconds=1)
+    manifest = JobManifest.open(str(tmp_path), source, {})
+    count = 200
+    errors = []
+
+    def run(record):
+        try:
+            for index in range(count):
+                record(index)
+        except Exception as e:
+            errors.append(e)
+
+    # The splitter and the transcriptions record from the reader thread while the post-processing records from the main thread
+    def split_and_transcribe(index):
+        manifest.record_chunk(AudioChunk(index, f"part{index}.wav", index, index + 1, 8000, ()))
+        manifest.record_transcription(index, f"text {index}")
+
+    writers = [
+        threading.Thread(target=run, args=(split_and_transcribe,)),
+        threading.Thread(target=run, args=(lambda index: manifest.record_processing(index, f"key {index}", f"content {index}"),)),
+    ]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    assert errors == []
+    with open(manifest.path, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert len(saved["chunks"]) == count
+    assert saved["transcriptions"] == {str(index): f"text {index}" for index in range(count)}
+    assert saved["processed_chunks"] == {str(index): {"key": f"key {index}", "content": f"content {index}"} for index in range(count)}
+
+    resumed = JobManifest.open(str(tmp_path), source, {}, resume=True)
+    assert resumed.completed_transcriptions() == {index: f"text {index}" for index in range(count)}
+
+def test_changes_wait_for_a_save_in_progress(tmp_path, make_wav):
+    manifest = JobManifest.open(str(tmp_path), make_wav(seconds=1), {})
+    recorders = [
+        lambda: manifest.record_chunk(AudioChunk(0, "part1.wav", 0, 8000, 8000, ())),
+        lambda: manifest.record_transcription(0, "text"),
+        lambda: manifest.record_processing(0, "key", "content"),
+        lambda: manifest.set_output_paths(output_path="out.txt"),
+        manifest.mark_split_complete,
+        manifest.mark_complete,
+    ]
+    for record in recorders:
+        before = json.dumps(manifest.data, sort_keys=True)
+        with manifest._lock:  # As save() holds it while serializing the data
+            thread = threading.Thread(target=record)
+            thread.start()
+            thread.join(0.05)
+            assert json.dumps(manifest.data, sort_keys=True) == before
+        thread.join()
+        assert json.dumps(manifest.data, sort_keys=True) != before
@@ -0,0 +1,76 @@
+# test_metrics.py
+
+import json
+import time
+
+import pytest
+
+from metrics import Metrics, Histogram
+
+def test_histogram_buckets_include_their_upper_bound():
+    histogram = Histogram(buckets=(1, 5))
+    for value in (0.5, 1, 3, 5, 7):
+        histogram.observe(value)
+
+    assert histogram.to_dict() == {
+        "count": 5, "sum": 16.5, "mean": 3.3, "min": 0.5, "max": 7,
+        "buckets": {"1": 2, "5": 2, "+Inf": 1},
+    }
+
+def test_spans_are_recorded_even_if_the_block_raises():
+    metrics = Metrics()
+    with pytest.raises(RuntimeError):
+        with metrics.span("request", chunk=3):
+            raise RuntimeError("failed")
+    metrics.record_span("split_chunk", metrics.started + 2, 0.5, chunk=0)
+
+    (name, start, seconds, attributes), split_span = metrics.spans
+    assert (name, attributes) == ("request", {"chunk": 3})
+    assert start >= 0 and seconds >= 0
+    assert split_span == ("split_chunk", 2, 0.5, {"chunk": 0})
+    assert metrics.histograms["request_seconds"].count == 1
+    assert metrics.histograms["split_chunk_seconds"].sum == 0.5
+
+def test_json_report_holds_the_metrics_and_the_given_fields(tmp_path):
+    metrics = Metrics()
+    metrics.increment("audio_chunks")
+    metrics.increment("audio_chunks", 2)
+    metrics.increment("chunk_bytes", 1024)
+    metrics.record_span("whisper_request", time.monotonic(), 1.5, chunk=1)
+
+    path = tmp_path / "report.json"
+    metrics.write_json(str(path), status="succeeded", input_path="meeting.wav")
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+
+    assert (report["status"], report["input_path"]) == ("succeeded", "meeting.wav")
+    assert report["metrics"]["counters"] == {"audio_chunks": 3, "chunk_bytes": 1024}
+    assert report["metrics"]["histograms"]["whisper_request_seconds"]["count"] == 1
+    span, = report["metrics"]["spans"]
+    assert (span["name"], span["seconds"], span["chunk"]) == ("whisper_request", 1.5, 1)
+
+def test_prometheus_output_has_counters_and_cumulative_buckets(tmp_path):
+    metrics = Metrics()
+    metrics.increment("audio_chunks", 4)
+    for seconds in (0.2, 0.7, 400):
+        metrics.observe("whisper_request_seconds", seconds)
+
+    path = tmp_path / "metrics.prom"
+    metrics.write_prometheus(str(path), labels={"file": 'a "quoted"\\name'})
+    lines = path.read_text(encoding="utf-8").splitlines()
+
+    label = 'file="a \\"quoted\\"\\\\name"'
+    assert lines[:2] == ["# TYPE transcriber_audio_chunks_total counter", f"transcriber_audio_chunks_total{{{label}}} 4"]
+    assert "# TYPE transcriber_whisper_request_seconds histogram" in lines
+    assert f'transcriber_whisper_request_seconds_bucket{{{label},le="0.1"}} 0' in lines
+    assert f'transcriber_whisper_request_seconds_bucket{{{label},le="0.25"}} 1' in lines
+    assert f'transcriber_whisper_request_seconds_bucket{{{label},le="1"}} 2' in lines
+    assert f'transcriber_whisper_request_seconds_bucket{{{label},le="300"}} 2' in lines
+    assert f'transcriber_whisper_request_seconds_bucket{{{label},le="+Inf"}} 3' in lines
+    assert f"transcriber_whisper_request_seconds_sum{{{label}}} 400.9" in lines
+    assert f"transcriber_whisper_request_seconds_count{{{label}}} 3" in lines
+
+def test_prometheus_output_without_labels():
+    metrics = Metrics()
+    metrics.increment("chunk_bytes", 10)
+    assert metrics.to_prometheus() == "# TYPE transcriber_chunk_bytes_total counter\ntranscriber_chunk_bytes_total 10\n"
@@ -0,0 +1,110 @@
+# test_rate_limiter.py
+
+import re
+import time
+import logging
+
+import openai
+import pytest
+from openai import OpenAI
+
+from fake_openai_server import start_server
+from rate_limiter import TokenBucket, RateLimiter, RetryPolicy, RateLimitedClient
+
+@pytest.fixture
+def fake_api():
+    servers = []
+
+    def start(**settings):
+        server = start_server(**settings)
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_port}/v1"
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def chat(client):
+    return client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": "Hello."}],
+        max_tokens=16,
+    )
+
+def retry_delays(caplog):
+    return [float(delay) for delay in re.findall(r"Retrying in (\d+\.\d)s", caplog.text)]
+
+def test_retry_after_header_is_honoured(fake_api, caplog):
+    server, base_url = fake_api(error_rate=0.6, seed=3)
+    # Without the server's retry-after-ms, each retry would back off for at least 30 seconds
+    retry_policy = RetryPolicy(max_retries=10, base_delay=60, budget_min=100)
+    client = RateLimitedClient(OpenAI(api_key="fake", base_url=base_url, max_retries=0), retry_policy=retry_policy)
+    with caplog.at_level(logging.WARNING):
+        start = time.monotonic()
+        for _ in range(5):
+            chat(client)
+    assert server.state.counts["rate_limited"] > 0
+    assert retry_policy.retries == server.state.counts["rate_limited"]
+    delays = retry_delays(caplog)
+    assert len(delays) == retry_policy.retries
+    assert all(delay <= 0.5 for delay in delays)
+    assert time.monotonic() - start < 10
+
+def test_retries_stop_at_max_retries(fake_api):
+    server, base_url = fake_api(server_error_rate=1.0)
+    retry_policy = RetryPolicy(max_retries=2, base_delay=0.01)
+    client = RateLimitedClient(OpenAI(api_key="fake", base_url=base_url, max_retries=0), retry_policy=retry_policy)
+    with pytest.raises(openai.InternalServerError):
+        chat(client)
+    assert server.state.counts["server_errors"] == 3
+    assert retry_policy.retries == 2
+
+def test_retry_budget_stops_retries_across_requests(fake_api):
+    server, base_url = fake_api(server_error_rate=1.0)
+    retry_policy = RetryPolicy(max_retries=5, base_delay=0.01, budget_min=1, budget_ratio=0)
+    client = RateLimitedClient(OpenAI(api_key="fake", base_url=base_url, max_retries=0), retry_policy=retry_policy)
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            chat(client)
+    assert server.state.counts["server_errors"] == 3
+    assert retry_policy.retries == 1
+
+def test_errors_that_are_not_retryable_are_raised_at_once():
+    calls = []
+
+    def fail():
+        calls.append(None)
+        raise ValueError("Bad request.")
+    with pytest.raises(ValueError):
+        RetryPolicy(base_delay=0.01).call(fail, "Test request")
+    assert len(calls) == 1
+
+def test_token_bucket_paces_requests_after_a_burst():
+    bucket = TokenBucket(per_minute=600, burst_seconds=0.2)  # 10 per second, bursts of 2
+    start = time.monotonic()
+    for _ in range(2):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05
+    for _ in range(5):
+        bucket.acquire()
+    assert 0.4 <= time.monotonic() - start < 1.0
+
+def test_large_request_leaves_the_bucket_in_debt():
+    bucket = TokenBucket(per_minute=600, burst_seconds=0.5)  # Holds 5 tokens
+    start = time.monotonic()
+    bucket.acquire(8)
+    assert time.monotonic() - start < 0.05
+    bucket.acquire(1)
+    assert 0.3 <= time.monotonic() - start < 0.8
+
+def test_limiter_learns_the_limit_and_pauses_until_the_reset():
+    limiter = RateLimiter()
+    limiter.observe_headers({
+        "x-ratelimit-limit-requests": "6000",
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-reset-requests": "300ms",
+    })
+    assert limiter.requests.per_minute == 6000
+    start = time.monotonic()
+    limiter.acquire()
+    assert 0.25 <= time.monotonic() - start < 0.8
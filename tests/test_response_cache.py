@@ -0,0 +1,53 @@
+# test_response_cache.py
+
+import os
+
+from response_cache import ResponseCache
+
+def test_keys_hash_the_content_of_every_part():
+    key = ResponseCache.make_key("whisper-1", b"audio", {"language": "en", "prompt": None})
+    assert key == ResponseCache.make_key("whisper-1", b"audio", {"prompt": None, "language": "en"})
+    assert key != ResponseCache.make_key("whisper-1", b"audio!", {"language": "en", "prompt": None})
+    # Parts are length-prefixed, so moving text from one part to the next changes the key
+    assert ResponseCache.make_key("ab", "c") != ResponseCache.make_key("a", "bc")
+
+def test_file_and_bytes_hashes_agree(tmp_path):
+    path = tmp_path / "chunk.wav"
+    path.write_bytes(b"\x00\x01" * 1000)
+    assert ResponseCache.hash_file(str(path)) == ResponseCache.hash_bytes(b"\x00\x01" * 1000)
+
+def test_values_are_cached_across_instances(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    key = ResponseCache.make_key("text")
+    assert cache.get(key) is None
+    cache.put(key, {"text": "hello", "segments": [[0.0, 1.0, "hello"]]})
+
+    reopened = ResponseCache(str(tmp_path))
+    assert reopened.get(key) == {"text": "hello", "segments": [[0.0, 1.0, "hello"]]}
+    assert (cache.hits, cache.misses, reopened.hits) == (0, 1, 1)
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=350)
+    keys = [ResponseCache.make_key(f"entry {number}") for number in range(4)]
+    for age, key in enumerate(keys[:3]):
+        cache.put(key, "x" * 100)  # 102 bytes of JSON
+        os.utime(cache._path(key), (1000 + age, 1000 + age))
+
+    # Reading the oldest entry makes it the most recently used
+    assert cache.get(keys[0]) == "x" * 100
+    cache.put(keys[3], "x" * 100)
+
+    assert cache.get(keys[1]) is None
+    assert [cache.get(key) for key in (keys[0], keys[2], keys[3])] == ["x" * 100] * 3
+
+def test_existing_entries_count_towards_the_cap(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    for number in range(3):
+        cache.put(ResponseCache.make_key(number), "x" * 100)
+        os.utime(cache._path(ResponseCache.make_key(number)), (1000, 1000))
+
+    reopened = ResponseCache(str(tmp_path), max_bytes=250)
+    reopened.put(ResponseCache.make_key(3), "x" * 100)
+    remaining = [reopened.get(ResponseCache.make_key(number)) for number in range(4)]
+    assert sum(value is not None for value in remaining) == 2
+    assert remaining[3] == "x" * 100
@@ -0,0 +1,46 @@
+# test_resume.py
+
+import glob
+import json
+
+import audio_splitter
+from app import TranscriberApp
+from job_manifest import MANIFEST_FILENAME
+
+def small_chunks(monkeypatch, seconds):
+    # Split the test audio into chunks of a few seconds instead of 30 minutes
+    get_max_chunk_frames = audio_splitter.get_max_chunk_frames
+    monkeypatch.setattr(audio_splitter, "get_max_chunk_frames",
+                        lambda frame_rate, *args: min(get_max_chunk_frames(frame_rate, *args), seconds * frame_rate))
+
+def make_app(client, **options):
+    return TranscriberApp(client, encoding="wav", cut_search_seconds=0, use_cache=False, cleanup=False, **options)
+
+def test_resume_does_not_reuse_transcriptions_of_chunks_split_again(monkeypatch, workdir, make_wav, whisper_client):
+    small_chunks(monkeypatch, 2)
+    audio_path = make_wav(seconds=8)
+    result = make_app(whisper_client, in_memory=True).process_audio_file(audio_path)
+    assert result["status"] == "succeeded"
+    assert len(whisper_client.audio.transcriptions.uploads) == 4
+
+    # Simulate a run interrupted after chunk 3 was transcribed but not chunk 2
+    manifest_path, = glob.glob(str(workdir / "tmp" / "*" / MANIFEST_FILENAME))
+    with open(manifest_path, encoding="utf-8") as f:
+        data = json.load(f)
+    del data["transcriptions"]["1"]
+    data["transcriptions"]["2"] = "STALE"
+    data["split_complete"] = False
+    data["complete"] = False
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+    whisper_client.audio.transcriptions.uploads.clear()
+    result = make_app(whisper_client, in_memory=True, resume=True).process_audio_file(audio_path)
+    assert result["status"] == "succeeded"
+
+    # Splitting resumes after chunk 1, so every later chunk is transcribed again
+    assert sorted(whisper_client.audio.transcriptions.uploads) == ["meeting_part2", "meeting_part3", "meeting_part4"]
+    with open(result["raw_transcript_path"], encoding="utf-8") as f:
+        raw_transcript = f.read()
+    assert "STALE" not in raw_transcript
+    assert raw_transcript.split("\n")[:4] == [f"text of meeting_part{n}" for n in range(1, 5)]
@@ -0,0 +1,63 @@
+# test_segment_store.py
+
+import json
+
+import pytest
+
+from segment_store import SegmentStore, format_timestamp, export_segments
+
+def test_chunk_segments_are_offset_by_the_chunk_start():
+    store = SegmentStore()
+    store.add_chunk([(0.0, 1.5, " Hello "), (1.5, 3.0, "world")], 0, 16000)
+    store.add_chunk([(0.25, 2.0, "again")], 90 * 16000, 16000)
+
+    assert list(store) == [(0.0, 1.5, "Hello"), (1.5, 3.0, "world"), (90.25, 92.0, "again")]
+
+def test_removed_silences_are_added_back_to_later_segments():
+    store = SegmentStore()
+    # Two seconds of silence were removed one second into a chunk starting at 10 s
+    store.add_chunk([(0.5, 0.9, "before"), (1.5, 2.0, "after")], 10 * 8000, 8000, removed_silences=[(8000, 2 * 8000)])
+
+    assert list(store) == [(10.5, 10.9, "before"), (13.5, 14.0, "after")]
+
+def test_segments_overlapping_a_time_range_are_found():
+    store = SegmentStore()
+    for start in range(0, 10, 2):
+        store.add(start, start + 2, f"segment {start}")
+
+    assert list(store.find(3, 7)) == [1, 2, 3]
+    assert list(store.find(end_seconds=2)) == [0]
+    assert list(store.find(20)) == []
+
+@pytest.mark.parametrize("seconds, separator, expected", [
+    (0, ",", "00:00:00,000"),
+    (1.2345, ".", "00:00:01.234"),
+    (59.9996, ",", "00:01:00,000"),
+    (3725.5, ".", "01:02:05.500"),
+])
+def test_timestamps_are_formatted_with_milliseconds(seconds, separator, expected):
+    assert format_timestamp(seconds, separator) == expected
+
+def test_segments_are_exported_as_srt_vtt_and_json(tmp_path):
+    store = SegmentStore()
+    store.add_chunk([(0.0, 1.5, "Hello"), (1.5, 3.25, "world")], 3600 * 8000, 8000)
+
+    paths = export_segments(store, str(tmp_path / "meeting"), ("srt", "vtt", "json"))
+    assert paths == [str(tmp_path / f"meeting.{extension}") for extension in ("srt", "vtt", "json")]
+
+    with open(paths[0], encoding="utf-8") as f:
+        assert f.read() == (
+            "1\n01:00:00,000 --> 01:00:01,500\nHello\n\n"
+            "2\n01:00:01,500 --> 01:00:03,250\nworld\n\n"
+        )
+    with open(paths[1], encoding="utf-8") as f:
+        assert f.read() == (
+            "WEBVTT\n\n"
+            "01:00:00.000 --> 01:00:01.500\nHello\n\n"
+            "01:00:01.500 --> 01:00:03.250\nworld\n\n"
+        )
+    with open(paths[2], encoding="utf-8") as f:
+        assert json.load(f) == {"segments": [
+            {"start": 3600.0, "end": 3601.5, "text": "Hello"},
+            {"start": 3601.5, "end": 3603.25, "text": "world"},
+        ]}
@@ -0,0 +1,56 @@
+# test_split_pool.py
+
+import os
+import glob
+from concurrent.futures import ThreadPoolExecutor
+
+import audio_splitter
+from app import TranscriberApp
+from job_manifest import JobManifest
+from metrics import Metrics
+
+def small_chunks(monkeypatch, seconds):
+    # Split the test audio into chunks of a few seconds instead of 30 minutes
+    get_max_chunk_frames = audio_splitter.get_max_chunk_frames
+    monkeypatch.setattr(audio_splitter, "get_max_chunk_frames",
+                        lambda frame_rate, *args: min(get_max_chunk_frames(frame_rate, *args), seconds * frame_rate))
+
+def split_in_pool(app, audio_path, job_dir):
+    os.makedirs(job_dir)
+    manifest = JobManifest.open(str(job_dir), audio_path, {})
+    return app.split_audio_file(audio_path, str(job_dir), manifest, Metrics()), manifest
+
+def test_pool_chunks_are_yielded_as_they_are_split(monkeypatch, workdir, make_wav, whisper_client):
+    small_chunks(monkeypatch, 2)
+    audio_path = make_wav(seconds=8)
+    with ThreadPoolExecutor(max_workers=1) as split_executor:
+        app = TranscriberApp(whisper_client, encoding="wav", cut_search_seconds=0, split_executor=split_executor)
+        chunks, manifest = split_in_pool(app, audio_path, workdir / "job")
+
+        # The first chunk arrives while the pool has split at most one chunk ahead
+        first = next(chunks)
+        assert first.endswith("meeting_part1.wav")
+        assert len(glob.glob(str(workdir / "job" / "*.wav"))) <= 2
+
+        paths = [first, *chunks]
+    assert [os.path.basename(path) for path in paths] == [f"meeting_part{n}.wav" for n in range(1, 5)]
+    assert manifest.data["split_complete"]
+
+    # Each chunk starts where the previous one ended and the last one ends with the audio
+    recorded = manifest.split_chunks()
+    assert recorded[0]["start_frame"] == 0
+    for previous, chunk in zip(recorded, recorded[1:]):
+        assert chunk["start_frame"] == previous["end_frame"]
+    assert recorded[-1]["end_frame"] == 8 * 8000
+
+def test_pool_split_stops_at_the_end_of_the_time_range(monkeypatch, workdir, make_wav, whisper_client):
+    small_chunks(monkeypatch, 2)
+    audio_path = make_wav(seconds=8)
+    with ThreadPoolExecutor(max_workers=1) as split_executor:
+        app = TranscriberApp(whisper_client, encoding="wav", cut_search_seconds=0, split_executor=split_executor,
+                             start_seconds=1, end_seconds=6)
+        chunks, manifest = split_in_pool(app, audio_path, workdir / "job")
+        assert len(list(chunks)) == 3
+
+    recorded = manifest.split_chunks()
+    assert (recorded[0]["start_frame"], recorded[-1]["end_frame"]) == (8000, 6 * 8000)
@@ -0,0 +1,40 @@
+# test_split_timing.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import audio_splitter
+from app import TranscriberApp
+from metrics import Metrics
+
+def small_chunks(monkeypatch, seconds):
+    # Split the test audio into chunks of a few seconds instead of 30 minutes
+    get_max_chunk_frames = audio_splitter.get_max_chunk_frames
+    monkeypatch.setattr(audio_splitter, "get_max_chunk_frames",
+                        lambda frame_rate, *args: min(get_max_chunk_frames(frame_rate, *args), seconds * frame_rate))
+
+def make_app(client, **options):
+    return TranscriberApp(client, encoding="wav", cut_search_seconds=0, use_cache=False, cleanup=False, **options)
+
+def test_chunks_split_in_the_pool_are_timed_by_the_worker(monkeypatch, workdir, make_wav, whisper_client):
+    small_chunks(monkeypatch, 2)
+    write_chunk = audio_splitter.write_chunk
+
+    def slow_write_chunk(*args):
+        time.sleep(0.05)
+        write_chunk(*args)
+    monkeypatch.setattr(audio_splitter, "write_chunk", slow_write_chunk)
+
+    metrics = Metrics()
+    # The pool runs collect_audio_chunks as a process pool would, on threads so the patches apply
+    with ThreadPoolExecutor(max_workers=1) as split_executor:
+        result = make_app(whisper_client, split_executor=split_executor).process_audio_file(make_wav(seconds=8), metrics)
+    assert result["status"] == "succeeded"
+
+    chunk_spans = [span for span in metrics.spans if span[0] == "split_chunk"]
+    assert [span[3]["chunk"] for span in chunk_spans] == [0, 1, 2, 3]
+    for name, start, seconds, attributes in chunk_spans:
+        assert seconds >= 0.05
+    # One worker splits the chunks one after another
+    for previous, span in zip(chunk_spans, chunk_spans[1:]):
+        assert previous[1] + previous[2] <= span[1] + 0.01
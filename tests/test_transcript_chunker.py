@@ -0,0 +1,29 @@
+# test_transcript_chunker.py
+
+from transcript_chunker import split_transcript_into_chunks, iter_transcript_chunks
+
+def chunk_texts(chunks):
+    return [chunk.text for chunk in chunks]
+
+def test_short_transcript_stays_one_chunk(encoding):
+    assert chunk_texts(split_transcript_into_chunks("A. B. C. D.", 10000, encoding)) == ["A. B. C. D."]
+    assert chunk_texts(split_transcript_into_chunks("Short one. Only two sentences.", 10000, encoding)) == [
+        "Short one. Only two sentences."
+    ]
+
+def test_chunks_end_at_sentence_boundaries(encoding):
+    text = "One two three. Four five six. Seven eight nine."
+    chunks = split_transcript_into_chunks(text, 32, encoding)
+    assert chunk_texts(chunks) == ["One two three. Four five six.", "Seven eight nine."]
+    assert all(chunk.token_count <= 32 for chunk in chunks)
+
+def test_last_chunk_fills_up_when_text_arrives_in_pieces(encoding):
+    pieces = ["First sentence here. ", "Second one. ", "Third. ", "Fourth."]
+    chunks = list(iter_transcript_chunks(pieces, 40, encoding))
+    assert chunk_texts(chunks) == ["First sentence here. Second one. Third.", "Fourth."]
+    assert " ".join(chunk_texts(iter_transcript_chunks(pieces, 10000, encoding))) == "".join(pieces).strip()
+    assert len(list(iter_transcript_chunks(pieces, 10000, encoding))) == 1
+
+def test_long_sentence_is_cut_at_the_limit(encoding):
+    chunks = split_transcript_into_chunks("x" * 25, 10, encoding)
+    assert [chunk.token_count for chunk in chunks] == [10, 10, 5]
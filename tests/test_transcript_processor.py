@@ -0,0 +1,195 @@
+# test_transcript_processor.py
+
+import re
+import types
+import threading
+
+import pytest
+
+import transcript_processor
+from transcript_processor import process_transcript, get_chunk_token_limit, build_cleanup_request
+from transcript_chunker import TranscriptChunk
+from prompt_templates import PromptTemplate, get_prompt, DEFAULT_PROMPT
+
+CHUNK_TOKENS = 200  # About seven sentences per chunk with the test encoding
+
+class FakeChatCompletions:
+    """
+    Fake chat completions that reply with the chunk's text after a speaker label.
+
+    Requests are named by the number of the first sentence in their chunk.
+    Requests named in `finish_order` return in that order, those in `failing`
+    raise, and replies to chunks of more than `truncate_over` sentences are cut
+    off at the token limit.
+    """
+
+    def __init__(self, finish_order=(), failing=(), truncate_over=None):
+        self.turns = list(finish_order)
+        self.failing = set(failing)
+        self.truncate_over = truncate_over
+        self.events = []  # ("start" or "end", request name), in order
+        self.user_messages = {}  # Request name to the user message of its first request
+        self.condition = threading.Condition()
+
+    def create(self, stream=False, messages=(), **options):
+        user_message = messages[-1]["content"]
+        text = user_message.rsplit("\n\n", 1)[-1]
+        numbers = sentence_numbers(text)
+        name = numbers[0]
+        with self.condition:
+            self.events.append(("start", name))
+            self.user_messages.setdefault(name, user_message)
+            if not self.condition.wait_for(lambda: name not in self.turns or self.turns[0] == name, timeout=5):
+                raise TimeoutError(f"Request {name} was never allowed to finish.")
+            if name in self.turns:
+                self.turns.remove(name)
+            self.events.append(("end", name))
+            self.condition.notify_all()
+        if name in self.failing:
+            raise RuntimeError(f"Request {name} failed.")
+
+        reply = f"Speaker 1: {text}"
+        finish_reason = "stop"
+        if self.truncate_over is not None and len(numbers) > self.truncate_over:
+            reply, finish_reason = reply[:len(reply) // 2], "length"
+        if stream:
+            events = [stream_event(reply[i:i + 16]) for i in range(0, len(reply), 16)]
+            return iter(events + [stream_event(None, finish_reason)])
+        message = types.SimpleNamespace(content=reply)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message, finish_reason=finish_reason)], usage=None)
+
+def stream_event(content, finish_reason=None):
+    choice = types.SimpleNamespace(delta=types.SimpleNamespace(content=content), finish_reason=finish_reason)
+    return types.SimpleNamespace(choices=[choice], usage=None)
+
+def chat_client(**options):
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=FakeChatCompletions(**options)))
+
+def sentence_numbers(text):
+    return [int(number) for number in re.findall(r"Sentence number (\d+) is here\.", text)]
+
+def numbered_transcript(count):
+    return " ".join(f"Sentence number {n} is here." for n in range(count))
+
+@pytest.fixture
+def small_chunks(monkeypatch, offline_encoding):
+    monkeypatch.setattr(transcript_processor, "get_chunk_token_limit", lambda *args: CHUNK_TOKENS)
+
+def chunk_names(encoding, text):
+    chunks = transcript_processor.split_transcript_into_chunks(text, CHUNK_TOKENS, encoding)
+    return [sentence_numbers(chunk.text)[0] for chunk in chunks]
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def test_first_chunk_alone_then_the_rest_concurrently_written_in_order(tmp_path, small_chunks, offline_encoding):
+    text = numbered_transcript(30)
+    names = chunk_names(offline_encoding, text)
+    assert len(names) >= 4
+    # The later chunks finish in reverse order, which only works if they are in flight together
+    client = chat_client(finish_order=[names[0]] + names[:0:-1])
+    output_path = tmp_path / "out.txt"
+    recorded = []
+
+    process_transcript(client, text, str(output_path), max_workers=len(names),
+                       on_result=lambda index, key, content: recorded.append(index))
+
+    events = client.chat.completions.events
+    assert events[:2] == [("start", names[0]), ("end", names[0])]
+    assert [name for kind, name in events if kind == "end"] == [names[0]] + names[:0:-1]
+    assert sorted(recorded) == list(range(len(names)))
+    # The later chunks carry the speakers found in the first one
+    assert all("Speakers identified so far: Speaker 1." in client.chat.completions.user_messages[name] for name in names[1:])
+    output = read(output_path)
+    assert sentence_numbers(output) == list(range(30))
+    assert output.count("Speaker 1: ") == len(names)
+
+def test_pieces_arriving_over_time_are_processed_in_order(tmp_path, small_chunks):
+    pieces = [f"Sentence number {n} is here. " for n in range(30)]
+    output_path = tmp_path / "out.txt"
+    process_transcript(chat_client(), iter(pieces), str(output_path), max_workers=3)
+    assert sentence_numbers(read(output_path)) == list(range(30))
+
+def test_failed_chunk_fails_the_job_keeping_the_finished_prefix(tmp_path, small_chunks, offline_encoding):
+    text = numbered_transcript(30)
+    names = chunk_names(offline_encoding, text)
+    # The later chunks finish, but nothing after the failed chunk is written
+    client = chat_client(failing=[names[1]])
+    output_path = tmp_path / "out.txt"
+    recorded = {}
+
+    with pytest.raises(RuntimeError, match=f"Request {names[1]} failed"):
+        process_transcript(client, text, str(output_path), max_workers=len(names),
+                           on_result=lambda index, key, content: recorded.__setitem__(index, {"key": key, "content": content}))
+
+    output = read(output_path)
+    assert sentence_numbers(output) == list(range(names[1]))
+    assert 0 in recorded and 1 not in recorded
+
+    # A rerun reuses the recorded chunks and only sends the rest
+    client = chat_client()
+    process_transcript(client, text, str(output_path), max_workers=len(names), completed=recorded)
+    sent = {name for kind, name in client.chat.completions.events if kind == "start"}
+    assert sent == {names[index] for index in range(len(names)) if index not in recorded}
+    assert sentence_numbers(read(output_path)) == list(range(30))
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_truncated_replies_are_split_and_processed_again(tmp_path, small_chunks, offline_encoding, stream):
+    text = numbered_transcript(30)
+    names = chunk_names(offline_encoding, text)
+    # Full chunks are cut off, including the first, while the halves they are split into are not
+    client = chat_client(truncate_over=5)
+    output_path = tmp_path / "out.txt"
+    metrics = transcript_processor.Metrics()
+
+    process_transcript(client, text, str(output_path), max_workers=3, stream=stream, metrics=metrics)
+
+    output = read(output_path)
+    assert sentence_numbers(output) == list(range(30))
+    assert output.count("Sentence number") == 30  # No part of a discarded reply is left behind
+    truncated = metrics.snapshot()["counters"]["truncated_replies"]
+    assert 2 <= truncated <= len(names)
+    assert output.count("Speaker 1: ") > len(names)  # Each truncated chunk was replaced by the replies to its parts
+
+def limit_for(encoding, output_ratio, template=None):
+    return get_chunk_token_limit(encoding, output_ratio, template)
+
+def test_chunk_token_limit_is_bound_by_the_completion_limit(encoding):
+    assert limit_for(encoding, 1.25) == int(transcript_processor.MAX_COMPLETION_TOKENS / 1.25)
+    assert limit_for(encoding, 1.0) == transcript_processor.MAX_COMPLETION_TOKENS
+    assert limit_for(encoding, 4.0) == transcript_processor.MAX_COMPLETION_TOKENS // 4
+
+def test_chunk_token_limit_is_bound_by_the_context_for_small_ratios(encoding):
+    template = get_prompt(DEFAULT_PROMPT)
+    input_limit = (transcript_processor.MAX_INPUT_TOKENS - template.prefix_tokens(encoding) - transcript_processor.CONTEXT_TAIL_TOKENS
+                   - transcript_processor.CONTEXT_OVERHEAD_TOKENS - 100)
+    assert limit_for(encoding, 0.01) == input_limit
+    # Where the two bounds cross, and just either side of it
+    crossing = transcript_processor.MAX_COMPLETION_TOKENS / input_limit
+    assert limit_for(encoding, crossing) in (input_limit, input_limit - 1)
+    assert limit_for(encoding, crossing * 0.99) == input_limit
+    assert limit_for(encoding, crossing * 1.01) < input_limit
+
+def test_chunk_token_limit_leaves_room_for_a_long_prompt(encoding):
+    default_tokens = get_prompt(DEFAULT_PROMPT).prefix_tokens(encoding)
+    template = PromptTemplate("long", "x" * 110000)
+    assert template.prefix_tokens(encoding) == 110000
+    assert limit_for(encoding, 0.01, template) == limit_for(encoding, 0.01) - (110000 - default_tokens)
+    # With a prompt this long the rest of the context is the bound, even at the usual ratio
+    assert limit_for(encoding, 1.25, template) == limit_for(encoding, 0.01, template)
+
+@pytest.mark.parametrize("output_ratio", [0, -1])
+def test_chunk_token_limit_rejects_ratios_that_are_not_positive(encoding, output_ratio):
+    with pytest.raises(ValueError):
+        limit_for(encoding, output_ratio)
+
+@pytest.mark.parametrize("output_ratio", [0.01, 0.5, 1.0, 1.25, 4.0])
+def test_full_chunk_and_its_expected_reply_fit_in_the_request(encoding, output_ratio):
+    limit = limit_for(encoding, output_ratio)
+    chunk = TranscriptChunk("x" * limit, limit, "")
+    request, prompt_tokens = build_cleanup_request(chunk, "y" * 200, ["Speaker 1"], encoding)
+    assert prompt_tokens + request["max_tokens"] <= transcript_processor.MAX_CONTEXT_LENGTH
+    assert request["max_tokens"] <= transcript_processor.MAX_COMPLETION_TOKENS
+    if output_ratio >= 1.0:
+        assert limit * output_ratio <= request["max_tokens"]
@@ -0,0 +1,103 @@
+# test_transcription_service.py
+
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from transcription_service import JobQueue, TranscriptionService, create_server
+
+def test_jobs_run_by_priority_then_submission_order():
+    queue = JobQueue()
+    low = queue.submit("low.wav", priority=0)
+    first = queue.submit("first.wav", priority=5)
+    second = queue.submit("second.wav", priority=5)
+    assert queue.get(low["id"])["position"] == 3
+    assert [queue.next()["id"] for _ in range(3)] == [first["id"], second["id"], low["id"]]
+
+def test_cancelled_job_that_is_forgotten_does_not_break_the_queue():
+    queue = JobQueue(max_finished=1)
+    cancelled = queue.submit("cancelled.wav")
+    other = queue.submit("other.wav")
+    assert queue.cancel(cancelled["id"])
+    assert not queue.cancel(cancelled["id"])
+    queued = queue.submit("queued.wav")
+    assert queue.cancel(other["id"])  # Forgets the first cancelled job
+
+    assert queue.get(cancelled["id"]) is None
+    assert queue.get(queued["id"])["position"] == 1
+    job = queue.next()
+    assert job["id"] == queued["id"]
+    assert job["status"] == "running"
+    queue.close()
+    assert queue.next() is None
+
+@pytest.fixture
+def service(workdir):
+    return TranscriptionService(client=None, use_cache=False)
+
+@pytest.mark.parametrize("options", [
+    {"export_formats": "srt"},
+    {"export_formats": ["srt", "docx"]},
+    {"encoding": "aiff"},
+    {"cut_search_seconds": "10"},
+    {"cut_search_seconds": True},
+    {"start_seconds": -1},
+    {"in_memory": "yes"},
+    {"max_buffers": 2.5},
+    {"max_buffers": 0},
+    {"prompt": ["cleanup"]},
+    {"prompt": "no-such-prompt"},
+    {"threads": 4},
+    {"output_ratio": 0},
+    [],
+    5,
+    "encoding=wav",
+])
+def test_submit_rejects_bad_options(service, make_wav, options):
+    with pytest.raises(ValueError):
+        service.submit(make_wav(), options=options)
+    assert service.queue.list() == []
+
+def test_submit_accepts_valid_options(service, make_wav):
+    options = {
+        "export_formats": ["srt", "vtt"],
+        "encoding": "wav",
+        "cut_search_seconds": 0,
+        "drop_silence_seconds": None,
+        "start_seconds": 1.5,
+        "in_memory": True,
+        "max_buffers": 4,
+        "prompt": "cleanup",
+    }
+    job = service.submit(make_wav(), priority=2, options=options)
+    assert job["status"] == "queued"
+    assert job["options"] == options
+
+@pytest.mark.parametrize("priority", [True, False, "1", 1.5])
+def test_submit_rejects_priorities_that_are_not_integers(service, make_wav, priority):
+    with pytest.raises(ValueError):
+        service.submit(make_wav(), priority=priority)
+
+def test_bad_requests_get_a_400_response(service, make_wav):
+    server = create_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    audio_path = make_wav()
+
+    def post(body):
+        request = urllib.request.Request(f"http://127.0.0.1:{server.server_port}/jobs", data=json.dumps(body).encode("utf-8"))
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    try:
+        assert post({"input": audio_path, "options": []}) == 400
+        assert post({"input": audio_path, "options": 5}) == 400
+        assert post({"input": audio_path, "priority": True}) == 400
+        assert post({"input": audio_path, "options": {"encoding": "wav"}}) == 202
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,139 @@
+# transcript_chunker.py
+
+import re
+import logging
+from collections import deque, namedtuple
+import numpy as np
+
+# Matched against UTF-8 encoded text, so sentence boundaries are found as byte offsets
+SENTENCE_BOUNDARY_PATTERN = re.compile(rb'(?<=[.!?])\s+')
+
+# A chunk of transcript text with its token count, and the text of its last
+# `tail_tokens` tokens for use as context for the next chunk
+TranscriptChunk = namedtuple('TranscriptChunk', ['text', 'token_count', 'tail'])
+
+_token_byte_lengths = {}  # Encoding name to the byte length of each of its tokens
+
+def split_transcript_into_chunks(transcript_text, max_tokens_per_chunk, encoding, tail_tokens=0):
+    """
+    Splits the transcript text into chunks that do not exceed the max tokens per chunk.
+
+    Parameters:
+    - transcript_text: The combined transcript text.
+    - max_tokens_per_chunk: Maximum number of tokens allowed per chunk.
+    - encoding: The tiktoken encoding object.
+    - tail_tokens: Number of tokens at the end of each chunk to return as its tail.
+
+    Returns:
+    - List of TranscriptChunks.
+    """
+    return list(iter_transcript_chunks([transcript_text], max_tokens_per_chunk, encoding, tail_tokens))
+
+def iter_transcript_chunks(text_pieces, max_tokens_per_chunk, encoding, tail_tokens=0):
+    """
+    Splits transcript text that arrives in pieces into chunks, yielding each chunk as soon as it is complete.
+
+    Each piece is encoded exactly once. Sentence boundaries are mapped to token
+    offsets, and each chunk ends at the last sentence boundary that fits in
+    `max_tokens_per_chunk` tokens. A sentence longer than that is cut at a token
+    boundary. Chunks are cut by token index, so the work done is linear in the
+    length of the transcript.
+
+    Parameters:
+    - text_pieces: Iterable of transcript text pieces, in order.
+    - max_tokens_per_chunk: Maximum number of tokens allowed per chunk.
+    - encoding: The tiktoken encoding object.
+    - tail_tokens: Number of tokens at the end of each chunk to return as its tail.
+
+    Yields:
+    - TranscriptChunk for each chunk, in order.
+    """
+    if max_tokens_per_chunk < 1:
+        raise ValueError(f"The maximum tokens per chunk must be positive, got {max_tokens_per_chunk}.")
+
+    token_lengths = get_token_byte_lengths(encoding)
+    tokens = np.empty(0, dtype=np.int64)  # Tokens not yet part of a chunk
+    char_starts = np.empty(0, dtype=bool)  # Whether each token starts on a character boundary
+    boundaries = deque()  # Indices into `tokens` where a new sentence starts, in order
+    previous_byte = b""
+
+    def cut(final):
+        nonlocal tokens, char_starts
+        start = 0
+        # Without more text to come, a chunk is only complete once more tokens follow it than fit in it
+        while len(tokens) - start > max_tokens_per_chunk or (final and len(tokens) > start):
+            limit = start + max_tokens_per_chunk
+            end = None
+            if final and len(tokens) <= limit:
+                # The rest of the transcript fits in one chunk
+                end = len(tokens)
+                boundaries.clear()
+            while boundaries and boundaries[0] <= limit:
+                end = boundaries.popleft()
+            if end is None or end <= start:
+                if len(tokens) <= limit:
+                    end = len(tokens)
+                else:
+                    end = limit
+                    # Do not cut inside a character that spans several tokens
+                    while end > start + 1 and not char_starts[end]:
+                        end -= 1
+                    logging.warning(f"A single sentence exceeds the maximum tokens per chunk; cutting it after {end - start} tokens.")
+            chunk_text = encoding.decode(tokens[start:end].tolist()).strip()
+            tail = encoding.decode(tokens[max(start, end - tail_tokens):end].tolist()).strip() if tail_tokens else ""
+            token_count = end - start
+            start = end
+            if chunk_text:
+                yield TranscriptChunk(chunk_text, token_count, tail)
+
+        # Drop the tokens of the chunks already yielded; fewer than a chunk's worth remain
+        if start:
+            tokens = tokens[start:]
+            char_starts = char_starts[start:]
+            for _ in range(len(boundaries)):
+                boundaries.append(boundaries.popleft() - start)
+
+    for piece in text_pieces:
+        if not piece:
+            continue
+        data = piece.encode("utf-8")
+        piece_tokens = np.asarray(encoding.encode(piece), dtype=np.int64)
+        lengths = token_lengths[piece_tokens]
+        token_starts = np.cumsum(lengths) - lengths  # Byte offset of each token in the piece
+
+        # Map the sentence boundaries in the piece to the first token starting at or after them.
+        # The previous piece's last byte is included so a boundary between pieces is found.
+        positions = np.array(
+            [match.start() - len(previous_byte) for match in SENTENCE_BOUNDARY_PATTERN.finditer(previous_byte + data, len(previous_byte))],
+            dtype=np.int64,
+        )
+        for boundary in (np.searchsorted(token_starts, positions) + len(tokens)).tolist():
+            if boundary > 0 and (not boundaries or boundaries[-1] < boundary):
+                boundaries.append(boundary)
+
+        # UTF-8 continuation bytes have the top bits 10
+        piece_char_starts = (np.frombuffer(data, dtype=np.uint8)[np.minimum(token_starts, len(data) - 1)] & 0xC0) != 0x80
+        tokens = np.concatenate((tokens, piece_tokens))
+        char_starts = np.concatenate((char_starts, piece_char_starts))
+        previous_byte = data[-1:]
+        yield from cut(final=False)
+
+    yield from cut(final=True)
+
+def get_token_byte_lengths(encoding):
+    """
+    Returns a NumPy array of the length in bytes of every token of an encoding.
+
+    The array is built once per encoding and reused, so that token offsets can
+    be computed for a whole transcript without decoding it token by token.
+    """
+    lengths = _token_byte_lengths.get(encoding.name)
+    if lengths is None:
+        lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+        for token in range(encoding.n_vocab):
+            try:
+                lengths[token] = len(encoding.decode_single_token_bytes(token))
+            except KeyError:
+                pass  # Unused token id
+        _token_byte_lengths[encoding.name] = lengths
+    return lengths
@@ -1,159 +1,443 @@
 # transcript_processor.py
 
+import os
+import re
+import sys
+import time
 import logging
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import tiktoken
 
-def process_transcript(client, transcript_text, output_file_name):
+from response_cache import ResponseCache
+from rate_limiter import request_cost
+from metrics import Metrics
+from transcript_chunker import iter_transcript_chunks, split_transcript_into_chunks
+from prompt_templates import get_prompt, DEFAULT_PROMPT
+
+PROCESSING_MODEL = "gpt-4o-mini"
+TEMPERATURE = 0.5
+
+# Maximum tokens for GPT-4o-mini
+MAX_CONTEXT_LENGTH = 128000
+MAX_COMPLETION_TOKENS = 16384  # Model's maximum output tokens
+MAX_INPUT_TOKENS = MAX_CONTEXT_LENGTH - MAX_COMPLETION_TOKENS
+
+# Expected output tokens per input token. The cleanup keeps nearly all of the
+# text and adds speaker labels, so the output is a little longer than the input.
+OUTPUT_TOKEN_RATIO = 1.25
+
+# Tokens of the previous chunk carried over as context for the next one
+CONTEXT_TAIL_TOKENS = 200
+# Tokens reserved for the context instructions and the speaker roster
+CONTEXT_OVERHEAD_TOKENS = 150
+
+SPEAKER_LABEL_PATTERN = re.compile(r"\bSpeaker (\d+)\b")
+
+def process_transcript(client, transcript_text, output_file_name, max_workers=1, cache=None, completed=None, on_result=None,
+                       executor=None, output_ratio=OUTPUT_TOKEN_RATIO, stream=False, echo=False, metrics=None,
+                       prompt=DEFAULT_PROMPT):
     """
-    Processes the combined transcript with GPT-4o-mini in manageable chunks and saves the final transcript.
+    Processes the transcript with GPT-4o-mini in manageable chunks and saves the final transcript.
+
+    The transcript may be given as one string or as an iterable of text pieces,
+    such as the transcriptions of audio chunks as they finish. The pieces are
+    split into chunks as they arrive and each chunk is sent as soon as it is
+    complete, so processing starts before the whole transcript is available.
+
+    The first chunk is processed on its own to establish the speaker labels. The
+    remaining chunks are then dispatched concurrently, each carrying the tail of
+    the previous chunk and the speakers identified so far, so labels stay
+    consistent across chunk boundaries. Finished chunks are appended to the
+    output file in order as soon as every chunk before them is done.
+
+    Chunks are sized so that their cleaned-up text fits in the completion token
+    limit. If a completion is still cut off at the limit, the chunk is split into
+    parts of at most half its size, at sentence boundaries, and each part is
+    processed again, so no part of the transcript is lost.
+
+    With `stream`, replies are streamed and the text of the first unfinished
+    chunk is appended to the output file as it arrives, flushed at each line
+    break. Later chunks are held in memory until it is their turn.
+
+    Every request starts with the same instructions, from the prompt template,
+    as its system message, so the API can serve that prefix from its prompt
+    cache. The cached part of each prompt is recorded in the metrics.
 
     Parameters:
     - client: OpenAI client object
-    - transcript_text: The combined transcript text.
+    - transcript_text: The combined transcript text, or an iterable of transcript pieces in order.
     - output_file_name: The filename to save the final transcript.
+    - max_workers: Maximum number of concurrent requests to GPT-4o-mini.
+    - cache: Optional ResponseCache. Chunks processed before with the same text,
+      preceding context, prompt, model and temperature are not sent again.
+    - completed: Optional dictionary of chunk index to {"key": ..., "content": ...} for chunks done in an
+      earlier run. A chunk is not sent again if its request key is unchanged.
+    - on_result: Optional callback called with (index, key, text) as each chunk's processing finishes.
+    - executor: Optional shared executor to run the requests on. At most `max_workers` chunks are in flight either way.
+    - output_ratio: Expected number of output tokens per input token, used to size the chunks.
+    - stream: If True, replies are streamed and written to the output file as they arrive.
+    - echo: If True, the processed transcript is also printed to stdout as it is written.
+    - metrics: Optional Metrics to record the requests and their token counts in.
+    - prompt: Name of the registered PromptTemplate with the instructions, or the path of a prompt file.
     """
+    if metrics is None:
+        metrics = Metrics()
     try:
-        # Your specified prompt
-        prompt = """
-Your task is to improve the readability of a raw transcript while preserving as much of the original wording as possible. Follow these guidelines:
-
-1. Read the transcript carefully, sentence by sentence.
-2. Identify speakers:
-   - There are multiple potential speakers in this transcript.
-   - Identify transitions between speakers based on:
-     a) Clear changes in the topic or subject matter
-     b) Shifts in speaking style, vocabulary, or tone
-     c) Contextual clues indicating a new person is speaking (e.g., "Thank you for that presentation, now I have a question...")
-   - Assign content to speakers as follows:
-     a) For consecutive content from the same speaker, group it together.
-     b) When you detect a likely speaker change, start a new paragraph and label it with a new speaker designation.
-   - Label speakers sequentially as "Speaker 1", "Speaker 2", "Speaker 3", etc., in the order they appear in the transcript.
-   - If a speaker returns later in the transcript, reuse their original label.
-   - If you're unsure about a speaker change, err on the side of keeping the current speaker label.
-
-3. Improve readability with minimal changes:
-   - Correct only obvious grammatical errors and typos.
-   - Retain original wording unless it significantly impairs understanding.
-   - Keep filler words and false starts unless they severely disrupt readability.
-   - Only break up extremely long, confusing sentences if necessary for comprehension.
-   - Maintain the original tone, style, and vocabulary of each speaker.
-
-4. Handle unclear or nonsensical parts:
-   - If a part is completely incomprehensible, replace it with [best guess].
-   - Inside the brackets, provide your best interpretation of the intended meaning.
-   - Use a similar number of words and try to incorporate any recognizable parts of the original text.
-
-5. Formatting:
-   - Present the transcript in a clear, easy-to-read format.
-   - Start a new paragraph for each change of speaker.
-
-6. Prioritize authenticity:
-   - Your primary goal is to preserve the original content as much as possible.
-   - Make only the minimum changes necessary for basic comprehension.
-   - Do not add new information, elaborate, or change the context of the conversation.
-   - If in doubt, keep the original wording.
-
-Provide the minimally-edited, more readable version of the transcript while strictly adhering to these guidelines. The output should be nearly identical to the input, with changes only where absolutely necessary for basic understanding.
-"""
-
-        # Maximum tokens for GPT-4o-mini
-        MAX_CONTEXT_LENGTH = 128000
-        MAX_COMPLETION_TOKENS = 16384  # Model's maximum output tokens
-        MAX_INPUT_TOKENS = MAX_CONTEXT_LENGTH - MAX_COMPLETION_TOKENS
-
-        # Initialize the tiktoken encoder
-        encoding = tiktoken.encoding_for_model("gpt-4o-mini")
-
-        # Tokenize the prompt and system message
-        prompt_tokens = len(encoding.encode(prompt))
-        system_message_tokens = len(encoding.encode("You are a helpful assistant."))
-
-        # Calculate available tokens for the transcript
-        available_tokens = MAX_INPUT_TOKENS - prompt_tokens - system_message_tokens - 100  # Reserve some buffer
-
-        # Split the transcript into chunks that fit within the available tokens
-        transcript_chunks = split_transcript_into_chunks(transcript_text, available_tokens, encoding)
-
-        # Process each chunk
-        final_transcript = ""
-        chunk_number = 1
-
-        for chunk in transcript_chunks:
-            logging.info(f"Processing chunk {chunk_number}/{len(transcript_chunks)}")
-
-            messages = [
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt + "\n\n" + chunk}
-            ]
-
-            # Estimate the total tokens for this request
-            total_request_tokens = prompt_tokens + system_message_tokens + len(encoding.encode(chunk))
-
-            # Adjust max_tokens to prevent exceeding the context window
-            max_tokens_for_completion = min(MAX_COMPLETION_TOKENS, MAX_CONTEXT_LENGTH - total_request_tokens - 100)
-
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                max_tokens=max_tokens_for_completion,
-                temperature=0.5
-            )
+        # Initialize the tiktoken encoder and the prompt, whose token count is memoized
+        encoding = tiktoken.encoding_for_model(PROCESSING_MODEL)
+        template = get_prompt(prompt)
+
+        # Size the chunks to fit in the rest of the request
+        available_tokens = get_chunk_token_limit(encoding, output_ratio, template)
+
+        # Split the transcript into chunks that fit within the available tokens, as the text arrives
+        if isinstance(transcript_text, str):
+            transcript_text = [transcript_text]
+        stop = threading.Event()
+
+        def read_pieces():
+            for piece in transcript_text:
+                if stop.is_set():
+                    return
+                yield piece
+
+        chunk_source = iter_transcript_chunks(read_pieces(), available_tokens, encoding, tail_tokens=CONTEXT_TAIL_TOKENS)
+        transcript_chunks = []
+        total_chunks = None  # Known once the whole transcript has arrived
+
+        def process_chunk(index, previous_tail, cache_key, speakers):
+            logging.info(f"Processing chunk {index + 1}/{total_chunks or '?'}")
+            chunk = transcript_chunks[index]
+
+            # The speaker roster depends on which chunks finished first, so it is not part of the key
+            if cache is not None:
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    logging.info(f"Using cached result for chunk {index + 1}/{total_chunks or '?'}")
+                    metrics.increment("completion_cache_hits")
+                    writer.write(index, cached["content"])
+                    return cached["content"]
+
+            assistant_reply = request_cleanup(index, chunk, previous_tail, speakers, f"{index + 1}")
+            logging.info(f"Chunk {index + 1}/{total_chunks or '?'} completed.")
+            if cache is not None:
+                cache.put(cache_key, {"content": assistant_reply})
+            return assistant_reply
+
+        def request_cleanup(index, chunk, previous_tail, speakers, label):
+            request, total_request_tokens = build_cleanup_request(chunk, previous_tail, speakers, encoding, template)
+            max_tokens_for_completion = request["max_tokens"]
+
+            request_start = time.monotonic()
+            options = {"stream_options": {"include_usage": True}} if stream else {}
+            # A rate limiter counts the prompt and the completion limit against the tokens per minute
+            with request_cost(total_request_tokens + max_tokens_for_completion):
+                response = client.chat.completions.create(stream=stream, **request, **options)
 
             # Extract the assistant's reply
-            assistant_reply = response.choices[0].message.content
-
-            final_transcript += assistant_reply + "\n"
-
-            chunk_number += 1
-
-        # Save the final transcript
-        with open(output_file_name, "w", encoding="utf-8") as f:
-            f.write(final_transcript)
+            if stream:
+                pieces = []
+                finish_reason = None
+                usage = None
+                for event in response:
+                    usage = getattr(event, "usage", None) or usage
+                    if not event.choices:
+                        continue
+                    delta = event.choices[0].delta.content
+                    if delta:
+                        if not pieces:
+                            metrics.observe("gpt_first_token_seconds", time.monotonic() - request_start)
+                        writer.write(index, delta)
+                        pieces.append(delta)
+                    finish_reason = event.choices[0].finish_reason or finish_reason
+                assistant_reply = "".join(pieces)
+            else:
+                assistant_reply = response.choices[0].message.content
+                finish_reason = response.choices[0].finish_reason
+                usage = getattr(response, "usage", None)
+                if finish_reason != "length" or chunk.token_count < 2:
+                    writer.write(index, assistant_reply)
+            metrics.record_span("gpt_request", request_start, time.monotonic() - request_start, chunk=label)
+            metrics.increment("gpt_requests")
+            # Use the counts the API reports, falling back to the estimate the request was sized with
+            if usage is not None and usage.prompt_tokens:
+                cached_tokens = cached_prompt_tokens(usage)
+                metrics.increment("prompt_tokens", usage.prompt_tokens)
+                metrics.increment("cached_prompt_tokens", cached_tokens)
+                metrics.increment("uncached_prompt_tokens", usage.prompt_tokens - cached_tokens)
+                metrics.increment("completion_tokens", usage.completion_tokens)
+            else:
+                metrics.increment("prompt_tokens", total_request_tokens)
+                metrics.increment("uncached_prompt_tokens", total_request_tokens)
+                metrics.increment("completion_tokens", len(encoding.encode(assistant_reply or "")))
+            if finish_reason != "length" or chunk.token_count < 2:
+                return assistant_reply
+
+            # The reply was cut off at the token limit. Split the chunk into parts of at most half its size
+            # and process them in turn, carrying the context over from each part to the next.
+            metrics.increment("truncated_replies")
+            if stream:
+                writer.discard(index, assistant_reply)
+            parts = split_transcript_into_chunks(
+                chunk.text, -(-chunk.token_count // 2), encoding, tail_tokens=CONTEXT_TAIL_TOKENS
+            )
+            logging.warning(f"The reply for chunk {label} was truncated at {max_tokens_for_completion} tokens. "
+                            f"Retrying it in {len(parts)} parts.")
+            replies = []
+            for number, part in enumerate(parts, start=1):
+                if number > 1:
+                    writer.write(index, "\n")
+                reply = request_cleanup(index, part, previous_tail, speakers, f"{label}.{number}")
+                replies.append(reply)
+                previous_tail = part.tail
+                speakers = merge_speakers(speakers, reply)
+            return "\n".join(replies)
+
+        completed = completed or {}
+        speakers = []
+        finished = {}
+        reused = 0
+        next_to_write = 0
+        next_to_submit = 0
+
+        pool = nullcontext(executor) if executor is not None else ThreadPoolExecutor(max_workers=max(1, max_workers))
+        # The chunks are read on their own thread, so waiting for transcript text never holds up finished requests
+        with ThreadPoolExecutor(max_workers=1) as reader, open(output_file_name, "wb") as output_file, pool as executor:
+            writer = OrderedTranscriptWriter(output_file, echo)
+            next_chunk = reader.submit(next, chunk_source, None)
+            in_flight = {}
+            try:
+                while next_chunk is not None or next_to_write < len(transcript_chunks):
+                    # Hold back the other chunks until the first one has established the speakers
+                    limit = len(transcript_chunks) if next_to_write > 0 else min(1, len(transcript_chunks))
+                    while next_to_submit < limit and len(in_flight) < max(1, max_workers):
+                        index = next_to_submit
+                        previous_tail = transcript_chunks[index - 1].tail if index > 0 else ""
+                        cache_key = completion_cache_key(previous_tail, transcript_chunks[index].text, template)
+                        previous = completed.get(index)
+                        if previous is not None and previous["key"] == cache_key:
+                            finished[index] = previous["content"]
+                            writer.write(index, previous["content"])
+                            writer.finish(index)
+                            reused += 1
+                        else:
+                            future = executor.submit(process_chunk, index, previous_tail, cache_key, list(speakers))
+                            in_flight[future] = (index, cache_key)
+                        next_to_submit += 1
+
+                    if next_to_write not in finished:
+                        waiting = set(in_flight)
+                        if next_chunk is not None:
+                            waiting.add(next_chunk)
+                        done, _ = wait(waiting, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            if future is next_chunk:
+                                chunk = future.result()
+                                if chunk is None:
+                                    next_chunk = None
+                                    total_chunks = len(transcript_chunks)
+                                else:
+                                    transcript_chunks.append(chunk)
+                                    next_chunk = reader.submit(next, chunk_source, None)
+                                continue
+
+                            index, cache_key = in_flight.pop(future)
+                            finished[index] = future.result()
+                            writer.finish(index)
+                            if on_result is not None:
+                                on_result(index, cache_key, finished[index])
+
+                    # The writer has written the finished in-order prefix; collect its speakers
+                    while next_to_write in finished:
+                        speakers = merge_speakers(speakers, finished.pop(next_to_write))
+                        next_to_write += 1
+            except BaseException:
+                # Stop reading the transcript and drop the queued requests
+                stop.set()
+                for other in in_flight:
+                    other.cancel()
+                raise
+
+        metrics.increment("transcript_chunks", total_chunks)
+        if reused:
+            metrics.increment("reused_chunks", reused)
+            logging.info(f"Reused {reused} of {total_chunks} chunks processed in an earlier run.")
+        if cache is not None:
+            cache.log_stats("Response")
+        counters = metrics.snapshot()["counters"]
+        if counters.get("prompt_tokens"):
+            logging.info(f"Input tokens: {counters['prompt_tokens']}, of which {counters.get('cached_prompt_tokens', 0)} "
+                         f"were served from the prompt cache.")
         logging.info(f"Final transcript saved to '{output_file_name}'")
 
     except Exception as e:
         logging.exception("An unexpected error occurred during processing with GPT-4o-mini.")
         raise
 
-def split_transcript_into_chunks(transcript_text, max_tokens_per_chunk, encoding):
+class OrderedTranscriptWriter:
+    """
+    Writes the processed chunks to the output file in order, while they are produced concurrently.
+
+    Text for the first unfinished chunk is written as soon as it arrives and
+    flushed at each line break. Text for later chunks is held until every chunk
+    before them has finished.
+    """
+
+    def __init__(self, output_file, echo=False):
+        self.output_file = output_file
+        self.echo = echo
+        self.head = 0  # Index of the first unfinished chunk
+        self.pending = {}  # Index to the text held for a later chunk
+        self.finished = set()
+        self._lock = threading.Lock()
+
+    def write(self, index, text):
+        """
+        Adds text to the chunk at `index`.
+        """
+        with self._lock:
+            if index == self.head:
+                self._emit(text)
+            else:
+                self.pending.setdefault(index, []).append(text)
+
+    def discard(self, index, text):
+        """
+        Removes `text`, the text most recently added to the chunk at `index`, so it can be produced again.
+        """
+        with self._lock:
+            if index == self.head:
+                self.output_file.flush()
+                self.output_file.seek(-len(text.encode("utf-8")), os.SEEK_END)
+                self.output_file.truncate()
+                if self.echo:
+                    sys.stdout.write("\n[discarded incomplete reply]\n")
+            else:
+                held = "".join(self.pending.pop(index, []))
+                self.pending[index] = [held[:len(held) - len(text)]]
+
+    def finish(self, index):
+        """
+        Marks the chunk at `index` as complete, and writes the chunks after it that were held back.
+        """
+        with self._lock:
+            self.pending.setdefault(index, []).append("\n")
+            self.finished.add(index)
+            while self.head in self.pending:
+                self._emit("".join(self.pending.pop(self.head)))
+                if self.head not in self.finished:
+                    break
+                self.finished.remove(self.head)
+                self.head += 1
+            self.output_file.flush()
+
+    def _emit(self, text):
+        self.output_file.write(text.encode("utf-8"))
+        if "\n" in text:
+            self.output_file.flush()
+        if self.echo:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+def get_chunk_token_limit(encoding, output_ratio=OUTPUT_TOKEN_RATIO, template=None):
+    """
+    Returns the maximum number of transcript tokens in a chunk.
+
+    The chunk must leave room in the request for the prompt and the context
+    carried over from the previous chunk, and its cleaned-up text, expected to
+    be `output_ratio` times as long, must fit in the completion token limit.
     """
-    Splits the transcript text into chunks that do not exceed the max tokens per chunk.
+    if output_ratio <= 0:
+        raise ValueError(f"The output token ratio must be positive, got {output_ratio}.")
+    template = template or get_prompt(DEFAULT_PROMPT)
+    available_tokens = (
+        MAX_INPUT_TOKENS - template.prefix_tokens(encoding)
+        - CONTEXT_TAIL_TOKENS - CONTEXT_OVERHEAD_TOKENS - 100  # Reserve some buffer
+    )
+    # The output is nearly as long as the input, so the completion limit is the tighter bound
+    return min(available_tokens, int(MAX_COMPLETION_TOKENS / output_ratio))
+
+def build_cleanup_request(chunk, previous_tail, speakers, encoding, template=None):
+    """
+    Builds the chat completion request that cleans up a transcript chunk.
+
+    The template's instructions come first, unchanged from request to request,
+    and `prompt_cache_key` groups the requests that share them, so the API can
+    serve them from its prompt cache.
 
     Parameters:
-    - transcript_text: The combined transcript text.
-    - max_tokens_per_chunk: Maximum number of tokens allowed per chunk.
-    - encoding: The tiktoken encoding object.
+    - chunk: The TranscriptChunk to process, with its token count.
+    - previous_tail: The end of the previous chunk, given as read-only context.
+    - speakers: Speaker labels assigned in the chunks processed so far.
+    - encoding: The tiktoken encoding of the processing model.
+    - template: The PromptTemplate with the instructions; defaults to the cleanup prompt.
 
     Returns:
-    - List of transcript text chunks.
-    """
-    # Split the transcript into sentences or paragraphs
-    import re
-    sentences = re.split(r'(?<=[.!?])\s+', transcript_text)
-
-    chunks = []
-    current_chunk = ""
-    current_tokens = 0
-
-    for sentence in sentences:
-        sentence_tokens = len(encoding.encode(sentence))
-
-        if current_tokens + sentence_tokens <= max_tokens_per_chunk:
-            current_chunk += sentence + " "
-            current_tokens += sentence_tokens
-        else:
-            # Start a new chunk
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence + " "
-            current_tokens = sentence_tokens
-
-            # Handle sentences longer than max_tokens_per_chunk
-            if sentence_tokens > max_tokens_per_chunk:
-                logging.warning(f"A single sentence exceeds the maximum tokens per chunk: '{sentence[:50]}...'")
-                # You may choose to split the sentence further or handle it accordingly
-
-    # Add the last chunk
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-
-    return chunks
\ No newline at end of file
+    - Tuple of the request parameters for chat.completions.create and the estimated number of prompt tokens.
+    """
+    template = template or get_prompt(DEFAULT_PROMPT)
+    context = build_context(previous_tail, speakers)
+    messages = template.messages(context + chunk.text)
+
+    # Estimate the total tokens for this request; the instructions were counted once and the chunk when it was split
+    total_request_tokens = template.prefix_tokens(encoding) + (len(encoding.encode(context)) if context else 0) + chunk.token_count
+
+    # Adjust max_tokens to prevent exceeding the context window
+    max_tokens_for_completion = min(MAX_COMPLETION_TOKENS, MAX_CONTEXT_LENGTH - total_request_tokens - 100)
+    request = {
+        "model": PROCESSING_MODEL,
+        "messages": messages,
+        "max_tokens": max_tokens_for_completion,
+        "temperature": TEMPERATURE,
+        "prompt_cache_key": template.cache_key,
+    }
+    return request, total_request_tokens
+
+def completion_cache_key(previous_tail, text, template=None):
+    """
+    Returns the cache key of a chunk's cleanup, from the chunk's text, the context before it and the request settings.
+    """
+    template = template or get_prompt(DEFAULT_PROMPT)
+    return ResponseCache.make_key("completion", PROCESSING_MODEL, TEMPERATURE, template.instructions, previous_tail, text)
+
+def cached_prompt_tokens(usage):
+    """
+    Returns the number of prompt tokens the API served from its prompt cache, from a usage object or dictionary.
+    """
+    details = usage.get("prompt_tokens_details") if isinstance(usage, dict) else getattr(usage, "prompt_tokens_details", None)
+    if details is None:
+        return 0
+    return (details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)) or 0
+
+def merge_speakers(speakers, text):
+    """
+    Adds the speaker labels found in `text` to the sorted list of known speaker labels.
+    """
+    numbers = {int(label.split()[-1]) for label in speakers}
+    numbers.update(int(number) for number in SPEAKER_LABEL_PATTERN.findall(text))
+    return [f"Speaker {number}" for number in sorted(numbers)]
+
+def build_context(previous_tail="", speakers=None):
+    """
+    Builds the part of the user message before the transcript chunk.
+
+    Returns:
+    - The context text, or an empty string for the first chunk.
+    """
+    if not previous_tail and not speakers:
+        return ""
+
+    context = ["This transcript is a continuation of an earlier part that has already been processed."]
+    if previous_tail:
+        context.append(
+            "The earlier part ended with the following text. It is for reference only; do not include it in your output:\n"
+            f'"""\n{previous_tail}\n"""'
+        )
+    if speakers:
+        context.append(
+            f"Speakers identified so far: {', '.join(speakers)}. "
+            "Reuse these labels for returning speakers and continue the numbering for new ones."
+        )
+    return "\n\n".join(context) + "\n\nTranscript to edit:\n\n"
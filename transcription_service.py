@@ -0,0 +1,482 @@
+# transcription_service.py
+
+import os
+import re
+import json
+import uuid
+import heapq
+import signal
+import logging
+import itertools
+import multiprocessing
+import threading
+import socketserver
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import tiktoken
+
+from app import TranscriberApp
+from audio_splitter import ENCODING_PROFILES
+from segment_store import EXPORT_FORMATS
+from response_cache import ResponseCache, DEFAULT_CACHE_MAX_BYTES
+from file_manager import create_cache_directory
+from transcript_chunker import get_token_byte_lengths
+from prompt_templates import get_prompt, DEFAULT_PROMPT
+from transcript_processor import PROCESSING_MODEL
+from batch_runner import DEFAULT_FILE_WORKERS, DEFAULT_API_WORKERS
+
+DEFAULT_SERVICE_HOST = "127.0.0.1"
+DEFAULT_SERVICE_PORT = 8765
+MAX_FINISHED_JOBS = 1000  # Records of finished jobs kept for status and result requests
+
+# TranscriberApp options a submitted job may set for itself, with the JSON types each accepts
+NUMBER = (int, float)
+JOB_OPTIONS = {
+    "encoding": str,
+    "cut_search_seconds": NUMBER,
+    "drop_silence_seconds": NUMBER,
+    "export_formats": list,
+    "start_seconds": NUMBER,
+    "end_seconds": NUMBER,
+    "incremental": bool,
+    "resume": bool,
+    "fail_fast": bool,
+    "output_ratio": NUMBER,
+    "stream": bool,
+    "in_memory": bool,
+    "max_buffers": int,
+    "keep_chunks": bool,
+    "prompt": str,
+}
+OPTIONAL_JOB_OPTIONS = ("drop_silence_seconds", "start_seconds", "end_seconds", "max_buffers")  # May also be null
+
+JOB_PATH_PATTERN = re.compile(r"^/jobs/([0-9a-f]+)(/result)?$")
+
+class JobQueue:
+    """
+    Thread-safe priority queue of submitted jobs, with the status record of every job.
+
+    Jobs with a higher priority run first; jobs of equal priority run in the
+    order they were submitted. A job moves from "queued" to "running" and then to
+    "succeeded" or "failed", or to "cancelled" if it is cancelled while queued.
+    Only the most recent `max_finished` finished jobs are remembered.
+    """
+
+    def __init__(self, max_finished=MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self.jobs = {}  # Job id to job record, in the order submitted
+        self._finished = []  # Ids of finished jobs, oldest first
+        self._heap = []  # (-priority, sequence, job id) of the queued jobs
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def submit(self, input_path, is_transcript=False, priority=0, options=None):
+        """
+        Queues a job and returns a copy of its record.
+        """
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "input": input_path,
+            "transcript": is_transcript,
+            "priority": priority,
+            "options": options or {},
+            "status": "queued",
+            "submitted": datetime.now().isoformat(timespec="seconds"),
+            "started": None,
+            "finished": None,
+            "result": None,
+        }
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The job queue is closed.")
+            self.jobs[job["id"]] = job
+            heapq.heappush(self._heap, (-priority, next(self._sequence), job["id"]))
+            self._condition.notify()
+            return dict(job)
+
+    def next(self):
+        """
+        Waits for the next queued job, marks it as running and returns it.
+
+        Returns:
+        - The job record, or None once the queue has been closed.
+        """
+        with self._condition:
+            while True:
+                while self._heap:
+                    job = self.jobs[heapq.heappop(self._heap)[2]]
+                    if job["status"] == "queued":
+                        job["status"] = "running"
+                        job["started"] = datetime.now().isoformat(timespec="seconds")
+                        return job
+                if self._closed:
+                    return None
+                self._condition.wait()
+
+    def finish(self, job_id, result):
+        """
+        Records the result dictionary of a finished job.
+        """
+        with self._condition:
+            job = self.jobs[job_id]
+            job["status"] = "succeeded" if result["status"] == "succeeded" else "failed"
+            job["finished"] = datetime.now().isoformat(timespec="seconds")
+            job["result"] = result
+            self._forget_oldest(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued job. Jobs that have started cannot be cancelled.
+
+        Returns:
+        - True if the job was cancelled.
+        """
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                return False
+            job["status"] = "cancelled"
+            job["finished"] = datetime.now().isoformat(timespec="seconds")
+            # Only queued jobs stay in the heap, so a forgotten job is never popped
+            self._heap = [entry for entry in self._heap if entry[2] != job_id]
+            heapq.heapify(self._heap)
+            self._forget_oldest(job_id)
+            return True
+
+    def _forget_oldest(self, job_id):
+        # Called with the lock held when a job finishes
+        self._finished.append(job_id)
+        while len(self._finished) > self.max_finished:
+            del self.jobs[self._finished.pop(0)]
+
+    def get(self, job_id):
+        """
+        Returns a copy of a job's record, with its position in the queue if it is queued, or None.
+        """
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+            if job["status"] == "queued":
+                queued = [entry[2] for entry in sorted(self._heap) if self.jobs[entry[2]]["status"] == "queued"]
+                job["position"] = queued.index(job_id) + 1
+            return job
+
+    def summary(self):
+        """
+        Returns the number of jobs in each status.
+        """
+        with self._condition:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return counts
+
+    def list(self):
+        """
+        Returns copies of all job records, most recently submitted first.
+        """
+        with self._condition:
+            return [dict(job) for job in reversed(list(self.jobs.values()))]
+
+    def close(self):
+        """
+        Stops handing out jobs. Jobs still queued are not run.
+
+        Returns:
+        - Number of queued jobs that will not run.
+        """
+        with self._condition:
+            self._closed = True
+            self._heap = []
+            self._condition.notify_all()
+            return sum(1 for job in self.jobs.values() if job["status"] == "queued")
+
+def validate_job_options(options):
+    """
+    Checks the options of a submitted job, so that a bad option fails the request rather than the job.
+
+    Parameters:
+    - options: Dictionary of TranscriberApp options, as decoded from JSON.
+
+    Raises:
+    - ValueError: If an option is unknown or has a value of the wrong type or outside its choices.
+    """
+    if not isinstance(options, dict):
+        raise ValueError("The job options must be a JSON object.")
+    unknown = sorted(set(options) - set(JOB_OPTIONS))
+    if unknown:
+        raise ValueError(f"Unknown job option(s): {', '.join(unknown)}.")
+    for name, value in options.items():
+        if value is None and name in OPTIONAL_JOB_OPTIONS:
+            continue
+        expected = JOB_OPTIONS[name]
+        # JSON booleans are ints in Python, but not numbers here
+        if not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+            raise ValueError(f"Job option '{name}' has the wrong type: {type(value).__name__}.")
+        if expected is NUMBER and value < 0:
+            raise ValueError(f"Job option '{name}' must not be negative.")
+    if "output_ratio" in options and options["output_ratio"] <= 0:
+        raise ValueError("Job option 'output_ratio' must be positive.")
+    if "encoding" in options and options["encoding"] not in ENCODING_PROFILES:
+        raise ValueError(f"Unknown encoding '{options['encoding']}'; choose from {', '.join(sorted(ENCODING_PROFILES))}.")
+    for export_format in options.get("export_formats", ()):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format '{export_format}'; choose from {', '.join(EXPORT_FORMATS)}.")
+    if options.get("max_buffers") is not None and options["max_buffers"] < 1:
+        raise ValueError("Job option 'max_buffers' must be at least 1.")
+    if "prompt" in options:
+        get_prompt(options["prompt"])
+
+class TranscriptionService:
+    """
+    Runs submitted jobs on warm resources shared by all jobs.
+
+    The API client, with its connection pool and rate limiters, the response
+    cache, the tokenizer and its token length table, and the thread and process
+    pools are set up once when the service starts. A job then only pays for its
+    own work, instead of for interpreter startup, imports, client creation and
+    API key validation.
+    """
+
+    def __init__(self, client, workers=DEFAULT_FILE_WORKERS, api_workers=DEFAULT_API_WORKERS, split_processes=None,
+                 use_cache=True, cache_max_bytes=DEFAULT_CACHE_MAX_BYTES, **app_options):
+        self.client = client
+        self.workers = workers  # Jobs run at the same time
+        self.api_workers = api_workers
+        self.split_processes = split_processes
+        self.app_options = app_options
+        self.queue = JobQueue()
+        self.cache = ResponseCache(create_cache_directory(), cache_max_bytes) if use_cache else None
+        self.use_cache = use_cache
+        self._threads = []
+        self._api_executor = None
+        self._split_executor = None
+
+    def start(self):
+        """
+        Warms up the shared resources and starts the job workers.
+        """
+        # Load the tokenizer and build its token length table before the first job needs them
+        encoding = tiktoken.encoding_for_model(PROCESSING_MODEL)
+        get_token_byte_lengths(encoding)
+        get_prompt(self.app_options.get("prompt", DEFAULT_PROMPT)).prefix_tokens(encoding)
+        logging.info(f"Tokenizer '{encoding.name}' loaded.")
+
+        self._api_executor = ThreadPoolExecutor(max_workers=max(1, self.api_workers))
+        # Spawned rather than forked: the job and HTTP threads are already running, and a forked child could inherit a held lock
+        self._split_executor = ProcessPoolExecutor(max_workers=self.split_processes,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+        for number in range(max(1, self.workers)):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{number + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"Transcription service started with {len(self._threads)} job worker(s) and {self.api_workers} API worker(s).")
+
+    def stop(self):
+        """
+        Stops taking jobs, waits for the running jobs to finish and shuts down the pools.
+        """
+        dropped = self.queue.close()
+        if dropped:
+            logging.warning(f"{dropped} queued job(s) were not run.")
+        for thread in self._threads:
+            thread.join()
+        self._api_executor.shutdown()
+        self._split_executor.shutdown()
+        logging.info("Transcription service stopped.")
+
+    def submit(self, input_path, is_transcript=False, priority=0, options=None):
+        """
+        Validates and queues a job.
+
+        Parameters:
+        - input_path: Path of the audio or transcript file, as seen by the service.
+        - is_transcript: Indicates that the input file is a transcript.
+        - priority: Jobs with a higher priority run first.
+        - options: Optional dictionary of TranscriberApp options for this job; see JOB_OPTIONS.
+
+        Returns:
+        - Copy of the job's record.
+        """
+        if not isinstance(input_path, str) or not os.path.isfile(input_path):
+            raise ValueError(f"Input file '{input_path}' does not exist.")
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ValueError("The priority must be an integer.")
+        validate_job_options({} if options is None else options)
+        job = self.queue.submit(input_path, bool(is_transcript), priority, options)
+        logging.info(f"Queued job {job['id']} for '{input_path}' with priority {priority}.")
+        return job
+
+    def _work(self):
+        while True:
+            job = self.queue.next()
+            if job is None:
+                return
+            self.queue.finish(job["id"], self.run_job(job))
+
+    def run_job(self, job):
+        """
+        Runs a job with the service's options and the job's own options, on the shared resources.
+
+        Returns:
+        - The job's result dictionary.
+        """
+        logging.info(f"Starting job {job['id']} for '{job['input']}'.")
+        try:
+            app = TranscriberApp(
+                self.client,
+                api_executor=self._api_executor,
+                split_executor=self._split_executor,
+                use_cache=self.use_cache,
+                cache=self.cache,
+                **dict(self.app_options, **job["options"]),
+            )
+            result = app.run(job["input"], job["transcript"])
+        except Exception:
+            logging.exception(f"Job {job['id']} failed.")
+            return {"input": job["input"], "status": "failed", "output_path": None, "audio_seconds": None, "durations": {}}
+        logging.info(f"Job {job['id']} {result['status']} in {result['durations'].get('total', 0):.2f}s.")
+        return result
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of the transcription service.
+
+    - POST /jobs: Submit a job: {"input": path, "transcript": false, "priority": 0, "options": {...}}.
+    - GET /jobs: List all jobs.
+    - GET /jobs/<id>: Status of a job, with its result once it has finished.
+    - GET /jobs/<id>/result: The processed transcript of a succeeded job, as text.
+    - DELETE /jobs/<id>: Cancel a queued job.
+    - GET /health: Number of jobs in each status.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok", "jobs": service.queue.summary()})
+            return
+        if self.path == "/jobs":
+            self.send_json(200, {"jobs": service.queue.list()})
+            return
+        match = JOB_PATH_PATTERN.match(self.path)
+        job = service.queue.get(match.group(1)) if match else None
+        if job is None:
+            self.send_error_json(404, f"Unknown path or job '{self.path}'.")
+        elif not match.group(2):
+            self.send_json(200, job)
+        elif job["status"] != "succeeded":
+            self.send_error_json(409, f"Job {job['id']} is {job['status']}; it has no result.")
+        else:
+            try:
+                with open(job["result"]["output_path"], "rb") as f:
+                    text = f.read()
+            except OSError:
+                logging.exception(f"Failed to read the result of job {job['id']}.")
+                self.send_error_json(500, f"The result of job {job['id']} could not be read.")
+                return
+            self.send_body(200, text, "text/plain; charset=utf-8")
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self.send_error_json(404, f"Unknown path '{self.path}'.")
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("The request body must be a JSON object.")
+            job = self.server.service.submit(
+                request.get("input"),
+                request.get("transcript", False),
+                request.get("priority", 0),
+                request.get("options"),
+            )
+        except ValueError as e:
+            self.send_error_json(400, str(e))
+            return
+        except RuntimeError as e:
+            self.send_error_json(503, str(e))
+            return
+        self.send_json(202, job)
+
+    def do_DELETE(self):
+        match = JOB_PATH_PATTERN.match(self.path)
+        queue = self.server.service.queue
+        if not match or match.group(2) or queue.get(match.group(1)) is None:
+            self.send_error_json(404, f"Unknown path or job '{self.path}'.")
+        elif queue.cancel(match.group(1)):
+            self.send_json(200, queue.get(match.group(1)))
+        else:
+            self.send_error_json(409, f"Job {match.group(1)} has already started.")
+
+    def send_error_json(self, status, message):
+        self.send_json(status, {"error": message})
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def send_body(self, status, data, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # The default includes the client address, which a Unix socket does not have
+        logging.debug(f"{self.command} {self.path}: {format % args}")
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def create_server(service, host=DEFAULT_SERVICE_HOST, port=DEFAULT_SERVICE_PORT, socket_path=None):
+    """
+    Creates the HTTP server of the service on a TCP port, or on a Unix socket if `socket_path` is given.
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # Left behind by a previous run
+        server = ThreadingUnixHTTPServer(socket_path, ServiceRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+def serve(client, host=DEFAULT_SERVICE_HOST, port=DEFAULT_SERVICE_PORT, socket_path=None, **service_options):
+    """
+    Runs the transcription service until it is interrupted or terminated.
+
+    Running jobs are allowed to finish on shutdown; queued jobs are dropped.
+
+    Parameters:
+    - client: OpenAI client object, or a RateLimitedClient whose limits apply across all jobs.
+    - host, port: Address to listen on.
+    - socket_path: If set, listen on this Unix socket instead.
+    - service_options: Further keyword arguments for TranscriptionService.
+    """
+    service = TranscriptionService(client, **service_options)
+    service.start()
+    server = create_server(service, host, port, socket_path)
+    address = socket_path or f"http://{host}:{server.server_port}"
+    logging.info(f"Transcription service listening on {address}")
+
+    # serve_forever only returns when shutdown is called from another thread
+    def terminate(signum, frame):
+        threading.Thread(target=server.shutdown).start()
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+        service.stop()